@@ -0,0 +1,142 @@
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from .metrics import ANSWER_CACHE
+
+# Configuração do cache de respostas
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+
+
+def normalize_query(query):
+    """Minúsculas, sem acentos, sem pontuação (preserva códigos como 516-91)"""
+    text = unicodedata.normalize("NFKD", query.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s-]", " ", text)
+    return " ".join(text.split())
+
+
+class AnswerCache:
+    """
+    Cache de respostas do LLM, na frente da chamada ao GPT.
+      - acerto exato: query normalizada + ids dos chunks recuperados;
+      - acerto semântico: similaridade do embedding da query >= `similarity`
+        e o mesmo chunk mais relevante na recuperação.
+    Despejo LRU + TTL e invalidação total quando a coleção muda.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, similarity=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._collection_state = None
+
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(query, chunk_ids):
+        return normalize_query(query) + "|" + ",".join(chunk_ids)
+
+    @staticmethod
+    def _unit(embedding):
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def sync_collection(self, state):
+        """Limpa o cache se o estado da coleção (versão/contagem) mudou"""
+        with self._lock:
+            if self._collection_state is not None and state != self._collection_state:
+                self._entries.clear()
+                self.invalidations += 1
+            self._collection_state = state
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def _expire(self, now):
+        """Remove expiradas do início da fila LRU (as demais são ignoradas na busca)"""
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry["created"] <= self.ttl:
+                break
+            del self._entries[key]
+            self.evictions += 1
+
+    def get(self, query, chunk_ids, embedding=None):
+        now = time.time()
+        with self._lock:
+            key = self._key(query, chunk_ids)
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["created"] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits_exact += 1
+                ANSWER_CACHE.labels("hit_exact").inc()
+                return entry["answer"]
+
+            if embedding is not None and chunk_ids and self._entries:
+                vec = self._unit(embedding)
+                best_key, best_score = None, self.similarity
+                for k, e in self._entries.items():
+                    if e["embedding"] is None or now - e["created"] > self.ttl or e["top_id"] != chunk_ids[0]:
+                        continue
+                    score = float(np.dot(vec, e["embedding"]))
+                    if score >= best_score:
+                        best_key, best_score = k, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.hits_semantic += 1
+                    ANSWER_CACHE.labels("hit_semantic").inc()
+                    return self._entries[best_key]["answer"]
+
+            self.misses += 1
+            ANSWER_CACHE.labels("miss").inc()
+            return None
+
+    def put(self, query, chunk_ids, embedding, answer):
+        now = time.time()
+        with self._lock:
+            key = self._key(query, chunk_ids)
+            self._entries[key] = {
+                "answer": answer,
+                "embedding": self._unit(embedding) if embedding is not None else None,
+                "top_id": chunk_ids[0] if chunk_ids else None,
+                "created": now,
+            }
+            self._entries.move_to_end(key)
+            self._expire(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits_exact + self.hits_semantic + self.misses
+        hits = self.hits_exact + self.hits_semantic
+        return {
+            "entries": len(self._entries),
+            "hits_exact": self.hits_exact,
+            "hits_semantic": self.hits_semantic,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,140 @@
+import os
+import re
+import json
+import threading
+
+from .deps import CHROMA_DIR
+
+CODE_INDEX_PATH = os.getenv("CODE_INDEX_PATH", os.path.join(CHROMA_DIR, "code_index.json"))
+# Quantos chunks com o código de infração bastam para pular a busca vetorial (artigos nunca
+# bastam: "Art. 5" começa chunks do CTB e de cada resolução)
+CODE_INDEX_MIN_HITS = int(os.getenv("CODE_INDEX_MIN_HITS", "3"))
+
+# Padrões estritos (o extract_codes do chat é mais permissivo para enriquecer a query)
+CODE_RE = re.compile(r"\b\d{3}-\d{2}\b")
+ARTICLE_RE = re.compile(r"\bart(?:igo)?s?\.?\s*(\d{1,3})\b", re.IGNORECASE)
+ARTICLE_DEF_RE = re.compile(r"^\s*art(?:igo)?\.?\s*(\d{1,3})\b", re.IGNORECASE | re.MULTILINE)
+
+
+def extract_entities(text):
+    """Códigos de infração (516-91) e números de artigo citados no texto"""
+    return {
+        "codes": list(dict.fromkeys(CODE_RE.findall(text))),
+        "articles": list(dict.fromkeys(str(int(a)) for a in ARTICLE_RE.findall(text))),
+    }
+
+
+class CodeIndex:
+    """
+    Índice invertido construído na ingestão: código de infração / número de artigo → ids de chunks.
+    Artigos têm dois níveis: `article_defs` (chunk onde o artigo começa, "Art. 165. ...")
+    e `article_refs` (chunks que só citam o artigo).
+    """
+
+    TIERS = ("codes", "article_defs", "article_refs")
+
+    def __init__(self, path=CODE_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._data = {tier: {} for tier in self.TIERS}
+        self._reload_if_changed()
+
+    def retarget(self, path):
+        """Passa a ler/gravar outro arquivo (troca de geração do índice)"""
+        with self._lock:
+            if path != self.path:
+                self.path = path
+                self._mtime = None
+                self._data = {tier: {} for tier in self.TIERS}
+                self._reload_if_changed()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _reload_if_changed(self):
+        """Recarrega do disco se outro processo (ingestão) gravou uma versão nova"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                raw = json.load(fh)
+            self._data = {tier: {k: list(v) for k, v in raw.get(tier, {}).items()} for tier in self.TIERS}
+            self._mtime = mtime
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Índice de códigos ilegível em {self.path}: {e}")
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(self._data, fh)
+            os.replace(tmp, self.path)
+            self._mtime = os.stat(self.path).st_mtime_ns
+
+    def add(self, ids, texts):
+        with self._lock:
+            for chunk_id, text in zip(ids, texts):
+                entities = extract_entities(text)
+                defs = {str(int(a)) for a in ARTICLE_DEF_RE.findall(text)}
+                for code in entities["codes"]:
+                    self._append("codes", code, chunk_id)
+                for art in entities["articles"]:
+                    self._append("article_defs" if art in defs else "article_refs", art, chunk_id)
+
+    def _append(self, tier, key, chunk_id):
+        bucket = self._data[tier].setdefault(key, [])
+        if chunk_id not in bucket:
+            bucket.append(chunk_id)
+
+    def remove(self, ids):
+        ids = set(ids)
+        if not ids:
+            return
+        with self._lock:
+            for tier in self.TIERS:
+                for key in list(self._data[tier]):
+                    bucket = [i for i in self._data[tier][key] if i not in ids]
+                    if bucket:
+                        self._data[tier][key] = bucket
+                    else:
+                        del self._data[tier][key]
+
+    def lookup(self, codes=(), articles=()):
+        """
+        Retorna (fortes, fracos): ids de chunks com o código/caput do artigo
+        e ids de chunks que apenas citam o artigo, sem repetição e em ordem.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            strong, weak = [], []
+            for code in codes:
+                strong.extend(self._data["codes"].get(code, []))
+            for art in articles:
+                strong.extend(self._data["article_defs"].get(str(int(art)), []))
+            for art in articles:
+                weak.extend(self._data["article_refs"].get(str(int(art)), []))
+
+        strong = list(dict.fromkeys(strong))
+        seen = set(strong)
+        weak = [i for i in dict.fromkeys(weak) if i not in seen]
+        return strong, weak
+
+    def rebuild(self, store, page_size=1000):
+        """Reconstrói o índice a partir da coleção inteira (migração de índices antigos)"""
+        with self._lock:
+            self._data = {tier: {} for tier in self.TIERS}
+        total = 0
+        for page in store.iter_pages(page_size, include=("documents",)):
+            self.add(page["ids"], page["documents"])
+            total += len(page["ids"])
+        self.save()
+        return total
+
+
+code_index = CodeIndex()
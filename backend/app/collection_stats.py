@@ -0,0 +1,295 @@
+import os
+import time
+import sqlite3
+import threading
+
+from .deps import CHROMA_DIR, EMBEDDING_MODEL
+from .embedding_backends import EMBEDDING_BACKEND
+from .context_packer import estimated_tokens
+
+COLLECTION_STATS_PATH = os.getenv("COLLECTION_STATS_PATH", os.path.join(CHROMA_DIR, "collection_stats.sqlite3"))
+# Parâmetros por consulta `IN (...)` (o SQLite limita a 999 nas versões antigas)
+SQL_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    tokens INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    name TEXT,
+    kind TEXT NOT NULL,
+    mime TEXT,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    ingested_at REAL,
+    embedding_model TEXT
+);
+CREATE INDEX IF NOT EXISTS sources_kind ON sources (kind, source);
+
+-- agregados mantidos por gatilhos: o resumo não depende do tamanho da coleção
+CREATE TABLE IF NOT EXISTS totals (
+    kind TEXT PRIMARY KEY,
+    sources INTEGER NOT NULL DEFAULT 0,
+    chunk_refs INTEGER NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('chunks', 0), ('tokens', 0), ('built', 0), ('partitioned', 0);
+
+CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'chunks';
+    UPDATE counters SET value = value + NEW.tokens WHERE name = 'tokens';
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_au AFTER UPDATE ON chunks BEGIN
+    UPDATE counters SET value = value - OLD.tokens + NEW.tokens WHERE name = 'tokens';
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+    UPDATE counters SET value = value - 1 WHERE name = 'chunks';
+    UPDATE counters SET value = value - OLD.tokens WHERE name = 'tokens';
+END;
+
+CREATE TRIGGER IF NOT EXISTS sources_ai AFTER INSERT ON sources BEGIN
+    INSERT OR IGNORE INTO totals (kind) VALUES (NEW.kind);
+    UPDATE totals SET sources = sources + 1, chunk_refs = chunk_refs + NEW.chunks, tokens = tokens + NEW.tokens
+    WHERE kind = NEW.kind;
+END;
+-- disparado pelo upsert de record_source: o ON CONFLICT de fora anula um OR IGNORE aqui dentro,
+-- então a linha de totais só é criada se faltar (recriado para corrigir bancos antigos)
+DROP TRIGGER IF EXISTS sources_au;
+CREATE TRIGGER sources_au AFTER UPDATE ON sources BEGIN
+    UPDATE totals SET sources = sources - 1, chunk_refs = chunk_refs - OLD.chunks, tokens = tokens - OLD.tokens
+    WHERE kind = OLD.kind;
+    INSERT INTO totals (kind) SELECT NEW.kind WHERE NOT EXISTS (SELECT 1 FROM totals WHERE kind = NEW.kind);
+    UPDATE totals SET sources = sources + 1, chunk_refs = chunk_refs + NEW.chunks, tokens = tokens + NEW.tokens
+    WHERE kind = NEW.kind;
+END;
+CREATE TRIGGER IF NOT EXISTS sources_ad AFTER DELETE ON sources BEGIN
+    UPDATE totals SET sources = sources - 1, chunk_refs = chunk_refs - OLD.chunks, tokens = tokens - OLD.tokens
+    WHERE kind = OLD.kind;
+END;
+"""
+
+SOURCE_COLUMNS = ("source", "name", "kind", "mime", "chunks", "pages", "tokens", "ingested_at", "embedding_model")
+
+
+def source_kind(source):
+    """Origem de uma fonte pelo identificador: URL (crawler) ou id de arquivo do Drive"""
+    return "web" if source.startswith(("http://", "https://")) else "drive"
+
+
+def _batches(items, size=SQL_BATCH):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class CollectionStats:
+    """
+    Estatísticas da coleção mantidas na ingestão, num SQLite ao lado do Chroma:
+    tokens de cada chunk gravado e, por fonte (arquivo do Drive / URL), chunks,
+    páginas, tokens, quando foi indexada e com qual modelo. Totais por tipo de
+    fonte são atualizados por gatilhos, então o resumo e a listagem paginada
+    (por cursor) não leem a coleção.
+    """
+
+    def __init__(self, path=COLLECTION_STATS_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def retarget(self, path):
+        """Passa a usar o SQLite de outra geração do índice"""
+        with self._lock:
+            if path != self.path:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                self.path = path
+
+    # ---- escrita (ingestão) ----
+
+    def add_chunks(self, ids, tokens):
+        """Registra os chunks gravados no vector store (com a contagem de tokens)"""
+        rows = [(chunk_id, int(t or 0)) for chunk_id, t in zip(ids, tokens)]
+        if not rows:
+            return
+        with self._lock, self._db() as db:
+            db.executemany(
+                "INSERT INTO chunks (id, tokens) VALUES (?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET tokens = excluded.tokens WHERE tokens != excluded.tokens",
+                rows,
+            )
+
+    def remove_chunks(self, ids):
+        with self._lock, self._db() as db:
+            for batch in _batches(dict.fromkeys(ids)):
+                db.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+
+    def record_source(self, source, name, chunk_ids, kind=None, mime=None, pages=None, ingested_at=None,
+                      embedding_model=None):
+        """Grava/atualiza a linha da fonte; os tokens vêm da soma dos seus chunks"""
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        with self._lock, self._db() as db:
+            tokens = 0
+            for batch in _batches(chunk_ids):
+                row = db.execute(
+                    f"SELECT COALESCE(SUM(tokens), 0) FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchone()
+                tokens += row[0]
+            db.execute(
+                "INSERT INTO sources (source, name, kind, mime, chunks, pages, tokens, ingested_at, embedding_model) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (source) DO UPDATE SET name = excluded.name, kind = excluded.kind, "
+                "mime = excluded.mime, chunks = excluded.chunks, pages = excluded.pages, tokens = excluded.tokens, "
+                "ingested_at = excluded.ingested_at, embedding_model = excluded.embedding_model",
+                (
+                    source, name, kind or source_kind(source), mime, len(chunk_ids), pages, tokens,
+                    ingested_at or time.time(), embedding_model or f"{EMBEDDING_MODEL} ({EMBEDDING_BACKEND})",
+                ),
+            )
+
+    def forget_source(self, source):
+        with self._lock, self._db() as db:
+            db.execute("DELETE FROM sources WHERE source = ?", (source,))
+
+    # ---- leitura (debug) ----
+
+    def is_built(self):
+        """False numa coleção indexada antes deste índice (falta a reconstrução)"""
+        with self._lock:
+            row = self._db().execute("SELECT value FROM counters WHERE name = 'built'").fetchone()
+        return bool(row[0])
+
+    def mark_built(self):
+        with self._lock, self._db() as db:
+            db.execute("UPDATE counters SET value = 1 WHERE name = 'built'")
+
+    def is_partitioned(self):
+        """False numa coleção indexada antes do metadado `source_type` (falta preencher)"""
+        with self._lock:
+            row = self._db().execute("SELECT value FROM counters WHERE name = 'partitioned'").fetchone()
+        return bool(row[0])
+
+    def mark_partitioned(self):
+        with self._lock, self._db() as db:
+            db.execute("UPDATE counters SET value = 1 WHERE name = 'partitioned'")
+
+    def summary(self):
+        """Totais gerais e por tipo de fonte (lidos dos agregados, tempo constante)"""
+        with self._lock:
+            db = self._db()
+            counters = {r["name"]: r["value"] for r in db.execute("SELECT name, value FROM counters")}
+            kinds = {
+                r["kind"]: {"sources": r["sources"], "chunk_refs": r["chunk_refs"], "tokens": r["tokens"]}
+                for r in db.execute("SELECT kind, sources, chunk_refs, tokens FROM totals WHERE sources > 0")
+            }
+        return {
+            "chunks": counters.get("chunks", 0),
+            "tokens": counters.get("tokens", 0),
+            "sources": sum(k["sources"] for k in kinds.values()),
+            "by_kind": kinds,
+            "complete": bool(counters.get("built")),
+        }
+
+    def list_sources(self, cursor=None, limit=50, kind=None):
+        """
+        Página de fontes em ordem de identificador, a partir de `cursor` (o último
+        identificador da página anterior). Retorna (linhas, próximo cursor ou None).
+        """
+        sql = f"SELECT {', '.join(SOURCE_COLUMNS)} FROM sources WHERE source > ?"
+        params = [cursor or ""]
+        if kind:
+            sql += " AND kind = ?"
+            params.append(kind)
+        sql += " ORDER BY source LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = [dict(r) for r in self._db().execute(sql, params)]
+        next_cursor = rows[-1]["source"] if len(rows) == limit else None
+        return rows, next_cursor
+
+    def get_source(self, source):
+        with self._lock:
+            row = self._db().execute(
+                f"SELECT {', '.join(SOURCE_COLUMNS)} FROM sources WHERE source = ?", (source,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def has_name_like(self, fragment):
+        with self._lock:
+            row = self._db().execute(
+                "SELECT 1 FROM sources WHERE name LIKE ? LIMIT 1", (f"%{fragment}%",)
+            ).fetchone()
+        return row is not None
+
+    # ---- migração ----
+
+    def rebuild(self, store, registry):
+        """
+        Reconstrói tudo a partir da coleção (uma passada paginada) e do registro de
+        chunks (fontes de cada chunk). Data de ingestão e modelo ficam desconhecidos.
+        """
+        sources = {}
+        with self._lock, self._db() as db:
+            db.execute("DELETE FROM sources")
+            db.execute("DELETE FROM chunks")
+            db.execute("DELETE FROM totals")
+            db.execute("UPDATE counters SET value = 0 WHERE name IN ('chunks', 'tokens', 'built')")
+            for page in store.iter_pages(include=("documents", "metadatas")):
+                rows = []
+                for chunk_id, doc, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+                    meta = meta or {}
+                    tokens = estimated_tokens(doc or "", meta)
+                    rows.append((chunk_id, tokens))
+                    with registry.lock:
+                        owners = dict(registry.refs.get(chunk_id) or {})
+                    if not owners:
+                        legacy = meta.get("file_id") or meta.get("url") or meta.get("name") or "desconhecido"
+                        owners = {legacy: meta.get("name")}
+                    for source, name in owners.items():
+                        entry = sources.setdefault(source, {
+                            "name": name, "mime": meta.get("mime"), "chunks": 0, "tokens": 0, "pages": set(),
+                        })
+                        entry["chunks"] += 1
+                        entry["tokens"] += tokens
+                        if meta.get("page") is not None:
+                            entry["pages"].add(meta["page"])
+                db.executemany("INSERT INTO chunks (id, tokens) VALUES (?, ?) ON CONFLICT (id) DO NOTHING", rows)
+
+            db.executemany(
+                "INSERT INTO sources (source, name, kind, mime, chunks, pages, tokens) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (source, e["name"], source_kind(source), e["mime"], e["chunks"], len(e["pages"]) or None,
+                     e["tokens"])
+                    for source, e in sources.items()
+                ],
+            )
+            db.execute("UPDATE counters SET value = 1 WHERE name = 'built'")
+        print(f"📇 Estatísticas da coleção reconstruídas: {len(sources)} fontes")
+
+
+collection_stats = CollectionStats()
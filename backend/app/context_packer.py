@@ -0,0 +1,97 @@
+import os
+import re
+
+# Orçamento de tokens do contexto enviado ao LLM (menor desde o rerank: os trechos
+# chegam sem sobreposição entre vizinhos e sem quase-repetidos)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MAX_TOKENS_PER_DOC = int(os.getenv("CONTEXT_MAX_TOKENS_PER_DOC", "600"))
+# Estimativa para chunks antigos, indexados antes de guardarmos a contagem
+CHARS_PER_TOKEN = 4.0
+# Trechos menores que isso não valem a pena no prompt
+MIN_TRIMMED_TOKENS = 40
+
+SEPARATOR = "\n\n─────────────────────────\n\n"
+
+_encoding = None
+_separator_tokens = None
+
+_SENTENCE_END = re.compile(r"[.!?;:]\s|\n")
+
+
+def get_encoding():
+    """
+    Tokenizer (usado na ingestão; o caminho do chat lê a contagem dos metadados).
+    Carregado no primeiro uso: baixar/ler o BPE não entra no tempo de import do app.
+    """
+    global _encoding, _separator_tokens
+    if _encoding is None:
+        import tiktoken
+        encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+        _separator_tokens = len(encoding.encode(SEPARATOR))
+        _encoding = encoding
+    return _encoding
+
+
+def separator_tokens():
+    get_encoding()
+    return _separator_tokens
+
+
+def count_tokens_batch(texts):
+    """Conta tokens de vários textos de uma vez (na ingestão)"""
+    return [len(t) for t in get_encoding().encode_batch(list(texts), disallowed_special=())]
+
+
+def estimated_tokens(text, meta):
+    tokens = (meta or {}).get("tokens")
+    if isinstance(tokens, int) and tokens > 0:
+        return tokens
+    return max(1, int(len(text) / CHARS_PER_TOKEN))
+
+
+def trim_to_tokens(text, tokens, max_tokens):
+    """
+    Corta o texto para ~max_tokens usando a razão caracteres/token do próprio chunk,
+    terminando no último fim de frase antes do limite.
+    """
+    char_limit = int(len(text) * max_tokens / tokens * 0.95)
+    head = text[:char_limit]
+
+    cut = None
+    for m in _SENTENCE_END.finditer(head):
+        cut = m.start() + 1
+    if cut is None or cut < char_limit * 0.5:
+        space = head.rfind(" ")
+        cut = space if space > char_limit * 0.5 else char_limit
+    return head[:cut].rstrip() + " [...]"
+
+
+def pack_context(documents, metadatas, budget=None, max_tokens_per_doc=None):
+    """
+    Monta o contexto em uma única passada, na ordem do ranking, sem re-tokenizar:
+    usa a contagem de tokens guardada nos metadados, corta em fim de frase
+    o documento que não cabe inteiro e pula o que não cabe mais.
+    Retorna (contexto, tokens estimados, índices dos documentos usados).
+    """
+    budget = budget or CONTEXT_TOKEN_BUDGET
+    max_tokens_per_doc = max_tokens_per_doc or CONTEXT_MAX_TOKENS_PER_DOC
+
+    parts, used = [], []
+    total = 0
+    for idx, doc in enumerate(documents):
+        meta = metadatas[idx] if idx < len(metadatas) else None
+        tokens = estimated_tokens(doc, meta)
+        overhead = separator_tokens() if parts else 0
+        room = min(budget - total - overhead, max_tokens_per_doc)
+
+        if tokens <= room:
+            parts.append(doc)
+            total += tokens + overhead
+        elif room >= MIN_TRIMMED_TOKENS:
+            parts.append(trim_to_tokens(doc, tokens, room))
+            total += room + overhead
+        else:
+            continue
+        used.append(idx)
+
+    return SEPARATOR.join(parts), total, used
@@ -0,0 +1,230 @@
+import os
+import re
+import json
+import base64
+import hashlib
+import threading
+import zlib
+
+import numpy as np
+
+from .deps import CHROMA_DIR
+from .partitions import classify_source
+from .code_index import extract_entities
+
+DEDUP_PATH = os.getenv("DEDUP_PATH", os.path.join(CHROMA_DIR, "chunk_dedup.json"))
+# Similaridade (Jaccard estimado por MinHash) a partir da qual dois chunks são o mesmo texto
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+# 0 desliga a detecção de quase-duplicatas (ids por conteúdo continuam valendo)
+DEDUP_NEAR = os.getenv("DEDUP_NEAR", "1") != "0"
+
+SHINGLE_WORDS = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = np.uint64((1 << 31) - 1)
+
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def content_id(text):
+    """Id do chunk derivado do conteúdo (mesmo texto → mesmo id, em qualquer arquivo)"""
+    return "c" + hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=12).hexdigest()
+
+
+def entity_key(text):
+    """Códigos de infração e artigos citados: quase-duplicatas só se citam exatamente os mesmos"""
+    entities = extract_entities(text)
+    return ",".join(sorted(entities["codes"])) + "|" + ",".join(sorted(entities["articles"]))
+
+
+def minhash(text):
+    """Assinatura MinHash dos shingles de palavras do texto (None se não houver palavras)"""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    n = min(SHINGLE_WORDS, len(words))
+    shingles = {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    hashes %= _PRIME
+    perms = (hashes[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) % _PRIME
+    return perms.min(axis=0).astype(np.uint32)
+
+
+class ChunkRegistry:
+    """
+    Registro dos chunks gravados: de quais fontes (arquivo do Drive, URL) cada chunk veio
+    e a assinatura MinHash para achar quase-duplicatas (LSH em bandas).
+    Um chunk repetido em várias fontes é gravado uma vez e só é apagado quando
+    a última fonte o solta. Quase-duplicatas só são unidas entre fontes diferentes
+    e com os mesmos códigos/artigos (fichas do MBFT que só mudam o código ficam separadas).
+    """
+
+    def __init__(self, path=DEDUP_PATH, threshold=DEDUP_THRESHOLD, near=DEDUP_NEAR):
+        self.path = path
+        self.threshold = threshold
+        self.near = near
+        self.lock = threading.RLock()
+        self.refs = {}   # chunk_id -> {fonte: nome}
+        self.sigs = {}   # chunk_id -> assinatura
+        self.keys = {}   # chunk_id -> códigos/artigos citados (entity_key)
+        self.buckets = {}
+        self._load()
+
+    def retarget(self, path):
+        """Passa a usar o registro de outro arquivo (troca de geração do índice)"""
+        with self.lock:
+            if path != self.path:
+                self.path = path
+                self.refs, self.sigs, self.keys, self.buckets = {}, {}, {}, {}
+                self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                raw = json.load(fh)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Registro de chunks ilegível em {self.path}: {e}")
+            return
+        self.refs = raw.get("refs", {})
+        # registros antigos não têm as entidades: esses chunks nunca são alvo de quase-duplicata
+        keys = raw.get("keys", {})
+        for chunk_id, encoded in raw.get("sigs", {}).items():
+            self._index(chunk_id, np.frombuffer(base64.b64decode(encoded), dtype=np.uint32), keys.get(chunk_id))
+
+    def save(self):
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            data = {
+                "refs": self.refs,
+                "sigs": {cid: base64.b64encode(sig.tobytes()).decode("ascii") for cid, sig in self.sigs.items()},
+                "keys": self.keys,
+            }
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(data, fh, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+    def _bands(self, sig):
+        return [(b, sig[b * ROWS:(b + 1) * ROWS].tobytes()) for b in range(BANDS)]
+
+    def _index(self, chunk_id, sig, key=None):
+        self.sigs[chunk_id] = sig
+        if key is not None:
+            self.keys[chunk_id] = key
+        for band in self._bands(sig):
+            self.buckets.setdefault(band, set()).add(chunk_id)
+
+    def _unindex(self, chunk_id):
+        sig = self.sigs.pop(chunk_id, None)
+        self.keys.pop(chunk_id, None)
+        if sig is None:
+            return
+        for band in self._bands(sig):
+            bucket = self.buckets.get(band)
+            if bucket is not None:
+                bucket.discard(chunk_id)
+                if not bucket:
+                    del self.buckets[band]
+
+    def _near_duplicate(self, sig, source, key):
+        """Chunk parecido de outra fonte, citando os mesmos códigos/artigos (None se não houver)"""
+        candidates = set()
+        for band in self._bands(sig):
+            candidates |= self.buckets.get(band, set())
+        best, best_sim = None, self.threshold
+        for cid in candidates:
+            if self.keys.get(cid) != key or source in self.refs.get(cid, {}):
+                continue
+            sim = float(np.mean(self.sigs[cid] == sig))
+            if sim >= best_sim:
+                best, best_sim = cid, sim
+        return best
+
+    def resolve(self, text, source, name):
+        """
+        Id canônico do chunk para `text` vindo de `source`, registrando a referência.
+        Retorna (chunk_id, situação): "new" (gravar), "linked" (já existe em outra
+        fonte, que ganhou esta) ou "known" (esta fonte já tinha o chunk).
+        """
+        chunk_id = content_id(text)
+        with self.lock:
+            if chunk_id not in self.refs and self.near:
+                sig = minhash(text)
+                key = entity_key(text) if sig is not None else None
+                match = self._near_duplicate(sig, source, key) if sig is not None else None
+                if match is not None:
+                    chunk_id = match
+                elif sig is not None:
+                    self._index(chunk_id, sig, key)
+
+            owners = self.refs.get(chunk_id)
+            if owners is None:
+                status = "new"
+            elif source in owners:
+                status = "known"
+            else:
+                status = "linked"
+            self.refs.setdefault(chunk_id, {})[source] = name
+            return chunk_id, status
+
+    def release(self, source, chunk_ids):
+        """
+        Tira `source` dos chunks. Retorna (apagar, atualizar): chunks sem nenhuma fonte
+        (ou desconhecidos, de antes do registro) e chunks que ainda têm outras fontes.
+        """
+        to_delete, to_update = [], []
+        with self.lock:
+            for chunk_id in dict.fromkeys(chunk_ids):
+                owners = self.refs.get(chunk_id)
+                if owners is None:
+                    to_delete.append(chunk_id)
+                    continue
+                owners.pop(source, None)
+                if owners:
+                    to_update.append(chunk_id)
+                else:
+                    del self.refs[chunk_id]
+                    self._unindex(chunk_id)
+                    to_delete.append(chunk_id)
+        return to_delete, to_update
+
+    def forget(self, chunk_ids):
+        """Esquece chunks que não chegaram a ser gravados (lote que falhou)"""
+        with self.lock:
+            for chunk_id in chunk_ids:
+                self.refs.pop(chunk_id, None)
+                self._unindex(chunk_id)
+
+    def source_fields(self, chunk_id):
+        """
+        Metadados de origem do chunk: `sources` (nomes de todas as fontes; o Chroma
+        só aceita escalares, então vai como lista em JSON), `name` e `source_type`
+        (partição da busca), ambos da primeira fonte
+        """
+        with self.lock:
+            owners = list(self.refs.get(chunk_id, {}).items())
+        names = list(dict.fromkeys(name for _, name in owners))
+        fields = {"sources": json.dumps(names, ensure_ascii=False)}
+        if owners:
+            fields["name"] = names[0]
+            fields["source_type"] = classify_source(*owners[0])
+        return fields
+
+    def stats(self):
+        with self.lock:
+            shared = sum(1 for owners in self.refs.values() if len(owners) > 1)
+            return {"chunks": len(self.refs), "shared_chunks": shared, "signatures": len(self.sigs)}
+
+
+chunk_registry = ChunkRegistry()
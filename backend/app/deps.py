@@ -1,7 +1,9 @@
 import os
+import time
+import threading
 from dotenv import load_dotenv
-from openai import OpenAI
-import chromadb
+
+from .embedding_backends import EMBEDDING_BACKEND, load_embedder
 
 # carrega variáveis do .env local (se existir)
 load_dotenv()
@@ -9,13 +11,183 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
-if not OPENAI_API_KEY:
-    raise RuntimeError("Defina OPENAI_API_KEY no ambiente (Railway ou .env)")
-
-client = OpenAI(api_key=OPENAI_API_KEY)
-
 CHROMA_DIR = os.getenv("CHROMA_DIR", "./dados/chroma")
-chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
-collection = chroma_client.get_or_create_collection(name="babix_knowledge")
+COLLECTION_NAME = os.getenv("CHROMA_COLLECTION", "babix_docs")
+INDEX_VERSION_FILE = os.path.join(CHROMA_DIR, ".index_version")
 
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# Papel do processo: "chat" não carrega as rotas/módulos de ingestão (Drive, web),
+# "ingest" não carrega o chat; "all" (padrão) serve tudo num processo só
+BABIX_ROLE = os.getenv("BABIX_ROLE", "all").lower()
+ROLES = ("all", "chat", "ingest")
+if BABIX_ROLE not in ROLES:
+    raise ValueError(f"BABIX_ROLE inválido: {BABIX_ROLE!r} (use {', '.join(ROLES)})")
+
+# Pool de conexões HTTP para a OpenAI (reaproveitado por todas as requisições)
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+# 🔹 Registro único de recursos pesados (um por processo)
+_lock = threading.Lock()
+_embedder = None
+_async_openai_client = None
+
+_ready = threading.Event()
+_warmup_error = None
+_warmup_seconds = {}  # etapa do aquecimento -> segundos
+
+
+def get_embedder():
+    """Modelo de embedding compartilhado (carregado uma única vez)"""
+    global _embedder
+    if _embedder is None:
+        with _lock:
+            if _embedder is None:
+                print(f"🧠 Carregando modelo de embedding: {EMBEDDING_MODEL} ({EMBEDDING_BACKEND})")
+                _embedder = load_embedder(EMBEDDING_MODEL, EMBEDDING_BACKEND)
+    return _embedder
+
+
+def mark_collection_changed():
+    """Sinaliza (entre processos) que a coleção foi alterada por uma ingestão"""
+    os.makedirs(CHROMA_DIR, exist_ok=True)
+    with open(INDEX_VERSION_FILE, "a"):
+        os.utime(INDEX_VERSION_FILE, None)
+
+
+def collection_version():
+    """Marca de versão da coleção (mtime do arquivo de versão; 0 se nunca escrita)"""
+    try:
+        return os.stat(INDEX_VERSION_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def get_async_openai_client():
+    """Cliente AsyncOpenAI compartilhado, com conexões HTTP keep-alive em pool"""
+    global _async_openai_client
+    if _async_openai_client is None:
+        if not OPENAI_API_KEY:
+            raise RuntimeError("Defina OPENAI_API_KEY no ambiente (Railway ou .env)")
+        with _lock:
+            if _async_openai_client is None:
+                import httpx
+                from openai import AsyncOpenAI
+                http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                    ),
+                    timeout=OPENAI_TIMEOUT,
+                )
+                _async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+    return _async_openai_client
+
+
+async def aclose():
+    """Fecha os clientes assíncronos no shutdown"""
+    global _async_openai_client
+    if _async_openai_client is not None:
+        await _async_openai_client.close()
+        _async_openai_client = None
+
+
+def warmup():
+    """
+    Carrega embedder, Chroma e OpenAI antes de receber tráfego (é aqui, numa
+    thread, que torch/chromadb/openai são importados, não no import do app).
+    Chamado pelo lifespan do FastAPI; marca o processo como pronto ao final.
+    Worker só de ingestão (BABIX_ROLE=ingest) pula o cliente da OpenAI e o tokenizer;
+    worker só de chat com snapshot publicado (SNAPSHOT_SERVING) nem abre o Chroma.
+    """
+    global _warmup_error
+
+    def step(name, started):
+        _warmup_seconds[name] = round(time.perf_counter() - started, 3)
+        return time.perf_counter()
+
+    try:
+        t = time.perf_counter()
+        from .vector_store import vector_store
+        from .code_index import code_index
+        from .collection_stats import collection_stats
+        from .dedup import chunk_registry
+        from .context_packer import get_encoding
+        from .snapshot import SNAPSHOT_SERVING, snapshot_index, publish_snapshot
+        from .generations import generations
+
+        # coleção e arquivos auxiliares da geração viva (blue/green das reconstruções)
+        generations.sync()
+        get_embedder().encode(["aquecimento"])
+        t = step("embedder", t)
+
+        snapshot = snapshot_index.current() if SNAPSHOT_SERVING else None
+        if snapshot is not None and BABIX_ROLE == "chat":
+            # migrações e publicação ficam com o worker de ingestão
+            t = step("snapshot", t)
+        else:
+            count = vector_store.count()
+            t = step("chroma", t)
+
+            # Migração: coleções indexadas antes do índice de códigos
+            if not code_index.exists() and count > 0:
+                print("🔢 Construindo índice de códigos/artigos a partir da coleção...")
+                code_index.rebuild(vector_store)
+            # Migração: estatísticas por arquivo/URL para o /api/debug
+            if not collection_stats.is_built():
+                if count > 0:
+                    print("📇 Construindo estatísticas da coleção...")
+                    collection_stats.rebuild(vector_store, chunk_registry)
+                else:
+                    collection_stats.mark_built()
+            # Migração: partição (`source_type`) dos chunks para o roteamento da busca
+            if not collection_stats.is_partitioned():
+                if count > 0:
+                    from .partitions import backfill_source_types
+                    print("🗂️ Preenchendo partições da coleção...")
+                    backfill_source_types(vector_store, chunk_registry)
+                collection_stats.mark_partitioned()
+            # Snapshot inicial (ou atrasado em relação à coleção) para os workers de chat
+            if count > 0 and BABIX_ROLE != "chat":
+                publish_snapshot(vector_store)
+            t = step("indexes", t)
+
+        if BABIX_ROLE != "ingest":
+            get_encoding()
+            if OPENAI_API_KEY:
+                get_async_openai_client()
+            else:
+                print("⚠️ OPENAI_API_KEY não definida: chat indisponível até configurar.")
+            t = step("openai", t)
+        _warmup_error = None
+        _ready.set()
+        print(f"✅ Recursos carregados, worker pronto ({sum(_warmup_seconds.values()):.1f}s).")
+    except Exception as e:
+        _warmup_error = str(e)
+        print(f"❌ Erro no aquecimento: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def readiness():
+    """Estado do aquecimento para o probe de prontidão"""
+    from .vector_store import vector_store
+    from .snapshot import snapshot_index
+    from .generations import generations
+    return {
+        "ready": is_ready(),
+        "role": BABIX_ROLE,
+        "generation": generations.live(),
+        "embedder": _embedder is not None,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "chroma": vector_store.is_open(),
+        "snapshot": snapshot_index.stats()["current"],
+        "openai": _async_openai_client is not None,
+        "warmup_seconds": dict(_warmup_seconds),
+        "error": _warmup_error,
+    }
@@ -0,0 +1,72 @@
+import os
+import logging
+import json
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SyncManifest:
+    """
+    Manifesto persistido da sincronização do Drive.
+    Guarda, por file_id, a versão indexada (modifiedTime/md5) e os ids dos chunks gravados,
+    para reprocessar só arquivos novos/alterados e apagar chunks de arquivos removidos.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as fh:
+                    self.files = json.load(fh).get("files", {})
+            except (OSError, ValueError) as e:
+                logger.warning("⚠️ Manifesto inválido em %s, recomeçando do zero: %s", self.path, e)
+                self.files = {}
+        return self
+
+    def save(self):
+        """Grava de forma atômica (arquivo temporário + rename)"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"updated_at": time.time(), "files": self.files}, fh, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def version_of(f):
+        """Identidade de versão de um arquivo do Drive (md5 quando existir)"""
+        return {"modifiedTime": f.get("modifiedTime"), "md5": f.get("md5Checksum")}
+
+    def is_current(self, f):
+        entry = self.files.get(f["id"])
+        if not entry:
+            return False
+        if f.get("md5Checksum") and entry.get("md5"):
+            return entry["md5"] == f["md5Checksum"]
+        return entry.get("modifiedTime") == f.get("modifiedTime")
+
+    def diff(self, files):
+        """Retorna (arquivos novos/alterados, file_ids removidos do Drive)"""
+        current_ids = {f["id"] for f in files}
+        changed = [f for f in files if not self.is_current(f)]
+        removed = [file_id for file_id in self.files if file_id not in current_ids]
+        return changed, removed
+
+    def chunk_ids(self, file_id):
+        return list(self.files.get(file_id, {}).get("chunk_ids", []))
+
+    def record(self, f, chunk_ids):
+        self.files[f["id"]] = {
+            "name": f.get("name"),
+            "mime": f.get("mimeType"),
+            **self.version_of(f),
+            "chunk_ids": list(chunk_ids),
+            "indexed_at": time.time(),
+        }
+
+    def forget(self, file_id):
+        self.files.pop(file_id, None)
@@ -1,22 +1,22 @@
-import os, io, json
+import os, json
+import logging
 from googleapiclient.discovery import build
 from google.oauth2 import service_account
-from googleapiclient.http import MediaIoBaseDownload
 
-from sentence_transformers import SentenceTransformer
-import chromadb
-from .pdf_chunker import chunk_pdf
+from .deps import CHROMA_DIR
+from .indexing import BatchIndexer, remover_chunks
+from .drive_manifest import SyncManifest
+from .generations import live_generation
+from .ingest_pipeline import SUPPORTED_MIMES, run_pipeline
+from .metrics import span
+from .snapshot import publish_snapshot
 
-# Use pasta de persistência configurável
-CHROMA_DIR = os.getenv("CHROMA_DIR", "./dados/chroma")
 DRIVE_FOLDER_ID = os.getenv("DRIVE_FOLDER_ID", "1ZTrb0HdZ4yaRV4En77XzQ7izuqv-Xe38")
+MANIFEST_PATH = os.getenv("DRIVE_MANIFEST", os.path.join(CHROMA_DIR, "drive_manifest.json"))
 
-_embedder = None
-def get_embedder():
-    global _embedder
-    if _embedder is None:
-        _embedder = SentenceTransformer("all-MiniLM-L6-v2")
-    return _embedder
+FOLDER_MIME = "application/vnd.google-apps.folder"
+
+logger = logging.getLogger(__name__)
 
 def get_drive_service():
     creds_json = os.getenv("GOOGLE_CREDENTIALS")
@@ -28,120 +28,150 @@ def get_drive_service():
     )
     return build("drive", "v3", credentials=creds)
 
-def get_chroma():
-    os.makedirs(CHROMA_DIR, exist_ok=True)
-    client = chromadb.PersistentClient(path=CHROMA_DIR)
-    return client.get_or_create_collection("babix_docs")
+def listar_arquivos_recursivo(svc, folder_id):
+    """Lista todos os arquivos da pasta e de suas subpastas, percorrendo todas as páginas"""
+    files = {}
+    pending = [folder_id]
+    visited = set()
 
-def baixar_arquivos_drive():
-    """Função que indexa arquivos do Google Drive com chunking inteligente"""
-    try:
-        svc = get_drive_service()
-
-        results = svc.files().list(
-            q=f"'{DRIVE_FOLDER_ID}' in parents and trashed=false",
-            fields="files(id,name,mimeType,modifiedTime)"
-        ).execute()
-
-        files = results.get("files", [])
-        print(f"📂 {len(files)} arquivos encontrados no Drive.")
-
-        if not files:
-            print("⚠️ Nenhum arquivo encontrado. Verifique se DRIVE_FOLDER_ID está correto.")
-            return
-
-        col = get_chroma()
-        embedder = get_embedder()
-
-        for f in files:
-            file_id = f["id"]
-            name = f["name"]
-            mime = f["mimeType"]
-            print(f"⬇️ Baixando: {name} ({mime})")
-
-            try:
-                # Baixar arquivo
-                request = svc.files().get_media(fileId=file_id)
-                buf = io.BytesIO()
-                downloader = MediaIoBaseDownload(buf, request)
-                done = False
-                while not done:
-                    _, done = downloader.next_chunk()
-                buf.seek(0)
-
-                tmp = f"/tmp/{name}"
-                with open(tmp, "wb") as out:
-                    out.write(buf.read())
-
-                # Processar PDFs com chunking
-                if mime == "application/pdf":
-                    print(f"📄 Processando PDF com chunking...")
-                    texts, metadatas = chunk_pdf(tmp, chunk_size=1000, chunk_overlap=200)
-                    
-                    if not texts:
-                        print(f"⚠️ Falha ao processar: {name}")
-                        continue
-                    
-                    print(f"✂️ PDF dividido em {len(texts)} chunks")
-                    
-                    # Indexar cada chunk
-                    for i, (text, meta) in enumerate(zip(texts, metadatas)):
-                        if not text.strip():
-                            continue
-                        
-                        print(f"🔄 Gerando embedding para chunk {i+1}/{len(texts)}")
-                        embedding = embedder.encode([text])[0]
-                        
-                        chunk_id = f"{file_id}_chunk_{i}"
-                        metadata = {
-                            "name": name,
-                            "mime": mime,
-                            "chunk_id": i,
-                            "page": meta.get("page", 0),
-                            "total_chunks": len(texts)
-                        }
-                        
-                        col.add(
-                            documents=[text],
-                            embeddings=[embedding],
-                            metadatas=[metadata],
-                            ids=[chunk_id]
-                        )
-                        
-                    print(f"✅ Indexado: {name} ({len(texts)} chunks)")
-                    
-                # Processar DOCX (sem chunking, já são menores)
-                elif mime == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-                    import docx
-                    doc = docx.Document(tmp)
-                    text = "\n".join([p.text for p in doc.paragraphs]).strip()
-                    
-                    if not text:
-                        print(f"⚠️ Documento vazio: {name}")
-                        continue
-                    
-                    print(f"🔄 Gerando embedding para: {name}")
-                    embedding = embedder.encode([text])[0]
-                    
-                    col.add(
-                        documents=[text],
-                        embeddings=[embedding],
-                        metadatas=[{"name": name, "mime": mime}],
-                        ids=[file_id]
-                    )
-                    print(f"✅ Indexado: {name}")
+    while pending:
+        parent = pending.pop()
+        if parent in visited:
+            continue
+        visited.add(parent)
+
+        page_token = None
+        while True:
+            results = svc.files().list(
+                q=f"'{parent}' in parents and trashed=false",
+                fields="nextPageToken, files(id,name,mimeType,modifiedTime,md5Checksum)",
+                pageSize=1000,
+                pageToken=page_token
+            ).execute()
+
+            for f in results.get("files", []):
+                if f["mimeType"] == FOLDER_MIME:
+                    pending.append(f["id"])
                 else:
-                    print(f"⚠️ Tipo não suportado: {mime}")
-                    
-            except Exception as e:
-                print(f"❌ Erro ao processar {name}: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
-
-        print("✅ Ingestão concluída e persistida em", CHROMA_DIR)
-        
+                    # o mesmo arquivo pode aparecer em mais de uma pasta
+                    files[f["id"]] = f
+
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                break
+
+    return list(files.values())
+
+def baixar_arquivos_drive(svc=None, store=None, embedder=None, manifest=None, folder_id=None, force=False, job=None,
+                          generation=None, allow_empty=False):
+    """
+    Sincroniza a pasta do Drive (e subpastas) com a coleção de forma incremental.
+    Só baixa/reindexa arquivos novos ou alterados segundo o manifesto e apaga
+    os chunks de arquivos removidos. `force=True` reprocessa tudo.
+    Com `job` (jobs.Job), reporta o progresso e atende a pedidos de cancelamento:
+    os arquivos já concluídos ficam registrados no manifesto.
+    Grava na geração viva do índice, ou em `generation` (sombra da reconstrução completa).
+    Listagem vazia com o manifesto preenchido (pasta errada, compartilhamento revogado,
+    resposta vazia transitória) não apaga nada, a não ser com `force` ou `allow_empty`.
+    """
+    indexer = None
+    try:
+        # cada thread de download cria seu próprio serviço (httplib2 não é thread-safe)
+        svc_factory = get_drive_service if svc is None else (lambda: svc)
+        svc = svc or get_drive_service()
+        folder_id = folder_id or DRIVE_FOLDER_ID
+
+        with span("drive", "list"):
+            listed = listar_arquivos_recursivo(svc, folder_id)
+        logger.info("📂 %d arquivos encontrados no Drive.", len(listed))
+
+        if not listed:
+            logger.warning("⚠️ Nenhum arquivo encontrado. Verifique se DRIVE_FOLDER_ID está correto.")
+
+        files = [f for f in listed if f["mimeType"] in SUPPORTED_MIMES]
+        for f in listed:
+            if f["mimeType"] not in SUPPORTED_MIMES:
+                logger.warning("⚠️ Tipo não suportado: %s (%s)", f["name"], f["mimeType"])
+
+        generation = generation or live_generation()
+        store = store or generation.store
+        manifest = manifest or SyncManifest(generation.sidecar(MANIFEST_PATH))
+
+        changed, removed = manifest.diff(files)
+        if force:
+            changed = files
+        skipped_removals = 0
+        if not listed and removed and not (force or allow_empty):
+            # pasta vazia com índice preenchido: não apaga o índice inteiro sem confirmação
+            skipped_removals, removed = len(removed), []
+            logger.warning("⚠️ Listagem vazia: %d arquivos do manifesto mantidos no índice "
+                        "(use force ou allow_empty para removê-los).", skipped_removals)
+        logger.info("🔁 %d novos/alterados, %d removidos, %d inalterados",
+                 len(changed), len(removed), len(files) - len(changed))
+
+        # 🗑️ Arquivos que sumiram do Drive
+        for file_id in removed:
+            entry = manifest.files.get(file_id, {})
+            remover_chunks(store, manifest.chunk_ids(file_id), file_id, generation.registry, generation.code_index,
+                           generation.stats, save=False)
+            manifest.forget(file_id)
+            generation.stats.forget_source(file_id)
+            logger.info("🗑️ Removido do índice: %s", entry.get("name", file_id))
+
+        on_file, cancel = None, None
+        if job is not None:
+            job.update(files_total=len(changed))
+            on_file = lambda f, ids: job.update(files_done=1, chunks_done=len(ids or []))
+            cancel = job.cancel_event
+
+        indexer = BatchIndexer(store, embedder, reembed=force, pipeline="drive", registry=generation.registry,
+                               index=generation.code_index, inventory=generation.stats) if changed else None
+
+        # ⚙️ download → parsing → embedding em estágios concorrentes
+        processed = run_pipeline(changed, svc_factory, indexer, on_file=on_file, cancel=cancel)
+
+        stats = {"chunks": 0, "duplicates": 0, "seconds": 0.0, "chunks_per_sec": 0.0}
+        if indexer:
+            indexer.flush()
+            stats = indexer.stats()
+
+        # Só depois do flush: apaga chunks antigos que não existem mais e registra no manifesto
+        with span("drive", "finalize"):
+            for f, ids in processed:
+                stale = set(manifest.chunk_ids(f["id"])) - set(ids)
+                remover_chunks(store, stale, f["id"], generation.registry, generation.code_index, generation.stats,
+                               save=False)
+                manifest.record(f, ids)
+                generation.stats.record_source(f["id"], f["name"], ids, kind="drive", mime=f["mimeType"],
+                                               pages=f.get("pages"))
+            # registro e índice de códigos gravados uma vez por sincronização, antes do manifesto
+            if changed or removed:
+                generation.code_index.save()
+                generation.registry.save()
+            manifest.save()
+
+        stats.update({
+            "files_listed": len(listed),
+            "files_changed": len(processed),
+            "files_removed": len(removed),
+            "files_unchanged": len(files) - len(changed),
+            "removals_skipped": skipped_removals,
+            "cancelled": bool(cancel is not None and cancel.is_set()),
+        })
+        logger.info("📊 %d chunks em %ss (%s chunks/s)", stats["chunks"], stats["seconds"], stats["chunks_per_sec"])
+        logger.info("✅ Ingestão concluída e persistida em %s", CHROMA_DIR)
+        return stats
+
     except Exception as e:
-        print(f"❌ Erro na ingestão: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        if indexer is not None:
+            indexer.abort()
+            indexer.save()
+        logger.exception("❌ Erro na ingestão: %s", e)
+        raise
+
+
+def sync_drive_job(job, force=False, allow_empty=False):
+    """Ponto de entrada do job de ingestão do Drive (roda numa thread do JobManager)"""
+    stats = baixar_arquivos_drive(force=force, job=job, allow_empty=allow_empty)
+    publish_snapshot()
+    return stats
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+
+import numpy as np
+
+# Backend do modelo de embedding (EMBEDDING_MODEL continua escolhendo o modelo):
+#   torch → SentenceTransformer em float32 (padrão)
+#   int8  → SentenceTransformer com as camadas Linear quantizadas (torch.quantize_dynamic)
+#   onnx  → ONNX Runtime + tokenizers, sem torch no processo
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# Arquivo dentro do repositório do modelo; ex.: onnx/model_qint8_avx2.onnx para ONNX quantizado
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model.onnx")
+# Threads do backend (0 = padrão da biblioteca)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+def hub_model_id(model_name):
+    """Mesma regra do SentenceTransformer: nomes curtos ficam em sentence-transformers/"""
+    if os.path.isdir(model_name) or "/" in model_name:
+        return model_name
+    return f"sentence-transformers/{model_name}"
+
+
+class OnnxEmbedder:
+    """
+    Embedder com ONNX Runtime compatível com o `encode` do SentenceTransformer:
+    tokeniza com `tokenizers`, roda o transformer exportado e aplica o pooling
+    e a normalização definidos nos arquivos de configuração do modelo.
+    """
+
+    def __init__(self, model_name, onnx_file=EMBEDDING_ONNX_FILE, threads=EMBEDDING_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.repo = hub_model_id(model_name)
+
+        config = self._json("sentence_bert_config.json", {})
+        pooling = self._json("1_Pooling/config.json", {})
+        modules = self._json("modules.json", [])
+        self.max_seq_length = int(config.get("max_seq_length", 256))
+        self.pooling = "cls" if pooling.get("pooling_mode_cls_token") else "mean"
+        self.normalize = any(m.get("type", "").endswith("Normalize") for m in modules)
+
+        self.tokenizer = Tokenizer.from_file(self._file("tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        if self.tokenizer.padding is None:
+            self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            self._file(onnx_file), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _file(self, filename):
+        if os.path.isdir(self.repo):
+            return os.path.join(self.repo, filename)
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(self.repo, filename)
+
+    def _json(self, filename, default):
+        try:
+            with open(self._file(filename), "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except Exception:
+            return default
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+        output = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+
+        if output.ndim == 2:  # modelo exportado já com pooling
+            return output.astype(np.float32)
+        if self.pooling == "cls":
+            return output[:, 0].astype(np.float32)
+        weights = mask[..., None].astype(np.float32)
+        summed = (output * weights).sum(axis=1)
+        return (summed / np.clip(weights.sum(axis=1), 1e-9, None)).astype(np.float32)
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, show_progress_bar=False,
+               normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # ordena por tamanho (menos padding por lote) e devolve na ordem original
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        batches = [
+            self._encode_batch([texts[k] for k in order[i:i + batch_size]])
+            for i in range(0, len(texts), batch_size)
+        ]
+        vectors = np.empty((len(texts), batches[0].shape[1]), dtype=np.float32)
+        vectors[order] = np.concatenate(batches)
+
+        if self.normalize or normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors[0] if single else vectors
+
+
+def load_embedder(model_name, backend=EMBEDDING_BACKEND):
+    """Cria o embedder do backend pedido (todos expõem `encode` como o SentenceTransformer)"""
+    if backend not in BACKENDS:
+        raise ValueError(f"EMBEDDING_BACKEND inválido: {backend!r} (use {', '.join(BACKENDS)})")
+
+    if backend == "onnx":
+        return OnnxEmbedder(model_name)
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if EMBEDDING_THREADS > 0:
+        torch.set_num_threads(EMBEDDING_THREADS)
+    if backend == "int8":
+        # quantização dinâmica só existe em CPU
+        model = SentenceTransformer(model_name, device="cpu")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return SentenceTransformer(model_name)
+
+
+SAMPLE_QUERIES = [
+    "Qual a multa por dirigir sem habilitação?",
+    "Art. 165 embriaguez ao volante",
+    "código 516-91",
+    "Avançar o sinal vermelho do semáforo",
+    "Estacionar em vaga de deficiente sem credencial",
+    "Qual o prazo para transferir o veículo após a compra?",
+    "Uso de celular ao dirigir",
+    "Excesso de velocidade acima de 50%",
+]
+
+
+def parity_check(candidate, baseline="torch", model_name=None, queries=None, k=5,
+                 min_cosine=0.99, min_overlap=0.8):
+    """
+    Compara um backend com o de referência: cosseno entre os embeddings das mesmas
+    queries, sobreposição dos top-k na coleção real e latência por query.
+    Retorna o relatório; `ok` indica se ficou dentro da tolerância.
+    """
+    from .deps import EMBEDDING_MODEL
+    from .vector_store import vector_store
+
+    model_name = model_name or EMBEDDING_MODEL
+    queries = queries or SAMPLE_QUERIES
+    report = {"model": model_name, "baseline": baseline, "candidate": candidate, "k": k}
+
+    vectors = {}
+    for backend in (baseline, candidate):
+        t0 = time.perf_counter()
+        embedder = load_embedder(model_name, backend)
+        load_seconds = time.perf_counter() - t0
+        embedder.encode(["aquecimento"])
+
+        latencies = []
+        for q in queries:
+            t0 = time.perf_counter()
+            embedder.encode([q])
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+        t0 = time.perf_counter()
+        vectors[backend] = np.asarray(embedder.encode(queries, batch_size=len(queries)), dtype=np.float32)
+        batch_seconds = time.perf_counter() - t0
+
+        report[backend] = {
+            "load_seconds": round(load_seconds, 3),
+            "query_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "query_p99_ms": round(float(np.percentile(latencies, 99)), 2),
+            "batch_texts_per_sec": round(len(queries) / batch_seconds, 1) if batch_seconds > 0 else 0.0,
+        }
+        del embedder
+
+    a, b = vectors[baseline], vectors[candidate]
+    cosines = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    report["cosine_min"] = round(float(cosines.min()), 5)
+    report["cosine_mean"] = round(float(cosines.mean()), 5)
+
+    overlaps = []
+    if vector_store.count() > 0:
+        for va, vb in zip(a, b):
+            ids_a = vector_store.query(va, n_results=k, include=())["ids"][0]
+            ids_b = vector_store.query(vb, n_results=k, include=())["ids"][0]
+            overlaps.append(len(set(ids_a) & set(ids_b)) / max(1, len(ids_a)))
+        report["topk_overlap_min"] = round(min(overlaps), 3)
+        report["topk_overlap_mean"] = round(float(np.mean(overlaps)), 3)
+
+    report["ok"] = bool(report["cosine_min"] >= min_cosine and (not overlaps or min(overlaps) >= min_overlap))
+    return report
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Confere se um backend de embedding mantém os resultados do torch")
+    parser.add_argument("--backend", default="onnx", choices=BACKENDS, help="backend avaliado")
+    parser.add_argument("--baseline", default="torch", choices=BACKENDS, help="backend de referência")
+    parser.add_argument("--model", default=None, help="modelo (padrão: EMBEDDING_MODEL)")
+    parser.add_argument("--queries", default=None, help="arquivo com uma query por linha")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--min-overlap", type=float, default=0.8)
+    args = parser.parse_args(argv)
+
+    queries = None
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as fh:
+            queries = [line.strip() for line in fh if line.strip()]
+
+    report = parity_check(args.backend, args.baseline, args.model, queries, args.k, args.min_cosine, args.min_overlap)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import os
+import time
+import asyncio
+from collections import deque
+
+import numpy as np
+
+from .deps import get_embedder
+
+# Micro-batching das queries: espera até EMBED_MAX_WAIT_MS ou EMBED_MAX_BATCH itens
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
+
+class EmbeddingBatcher:
+    """
+    Serviço de embedding do processo: junta as queries de chats concorrentes
+    por alguns milissegundos e roda um único `encode` em lote numa thread.
+    Cada chamador recebe o próprio vetor de volta através de um future.
+    """
+
+    def __init__(self, embedder_factory=get_embedder, max_batch=EMBED_MAX_BATCH, max_wait_ms=EMBED_MAX_WAIT_MS):
+        self.embedder_factory = embedder_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = None
+        self._task = None
+        self._waits = deque(maxlen=4096)
+        self.batches = 0
+        self.items = 0
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def encode(self, text):
+        """Embedding de uma query (entra no próximo lote)"""
+        await self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, fut, time.perf_counter()))
+        return await fut
+
+    def _encode_batch(self, texts):
+        return self.embedder_factory().encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self._waits.append(started - enqueued)
+
+            try:
+                vectors = await asyncio.to_thread(self._encode_batch, [text for text, _, _ in batch])
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for (_, fut, _), vec in zip(batch, vectors):
+                if not fut.done():
+                    fut.set_result(vec)
+
+    def stats(self):
+        waits = np.array(self._waits, dtype=np.float64) * 1000.0
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "queue_wait_p50_ms": round(float(np.percentile(waits, 50)), 3) if waits.size else 0.0,
+            "queue_wait_p99_ms": round(float(np.percentile(waits, 99)), 3) if waits.size else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
+
+
+embedding_batcher = EmbeddingBatcher()
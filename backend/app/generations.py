@@ -0,0 +1,397 @@
+import os
+import logging
+import json
+import time
+import shutil
+import asyncio
+import threading
+
+from .deps import CHROMA_DIR, COLLECTION_NAME, get_embedder, mark_collection_changed
+from .jobs import job_manager, JobsBusy
+
+logger = logging.getLogger(__name__)
+
+# Blue/green do índice: a reconstrução completa grava numa coleção nova (sombra), com seus
+# próprios arquivos auxiliares; validada, vira a viva trocando o apelido em GENERATIONS_FILE.
+# A coleção original (CHROMA_COLLECTION) é a primeira geração, com os arquivos em CHROMA_DIR
+GENERATIONS_FILE = os.getenv("GENERATIONS_FILE", os.path.join(CHROMA_DIR, "generations.json"))
+GENERATIONS_DIR = os.getenv("GENERATIONS_DIR", os.path.join(CHROMA_DIR, "generations"))
+# Gerações aposentadas mantidas (a mais recente é o alvo do rollback)
+GENERATIONS_KEEP = int(os.getenv("GENERATIONS_KEEP", "1"))
+# De quanto em quanto tempo cada processo confere o apelido
+GENERATION_CHECK_SECONDS = float(os.getenv("GENERATION_CHECK_SECONDS", "2"))
+
+# Validação da sombra antes da troca: fração mínima dos chunks da viva (0 desliga),
+# perguntas que precisam achar resultados e chunks amostrados que precisam achar a si mesmos
+REBUILD_MIN_RATIO = float(os.getenv("REBUILD_MIN_RATIO", "0.9"))
+REBUILD_SMOKE_QUERIES = [
+    q.strip()
+    for q in os.getenv("REBUILD_SMOKE_QUERIES", "multa por dirigir sem habilitação|estacionar em local proibido").split("|")
+    if q.strip()
+]
+REBUILD_SMOKE_SAMPLES = int(os.getenv("REBUILD_SMOKE_SAMPLES", "20"))
+REBUILD_MIN_RECALL = float(os.getenv("REBUILD_MIN_RECALL", "0.8"))
+
+
+def sidecar(name, default_path):
+    """Arquivo auxiliar (índice de códigos, registro, manifesto...) da geração `name`"""
+    if name == COLLECTION_NAME:
+        return default_path
+    return os.path.join(GENERATIONS_DIR, name, os.path.basename(default_path))
+
+
+def _initial_state():
+    return {
+        "live": COLLECTION_NAME,
+        "previous": None,
+        "next": 1,
+        "generations": {COLLECTION_NAME: {"status": "live", "created_at": None}},
+    }
+
+
+class Generations:
+    """
+    Apelido da geração viva, gravado de forma atômica (arquivo temporário + rename)
+    e conferido por todos os processos a cada `check_seconds`. `sync()` aponta os
+    singletons do processo (coleção, índice de códigos, registro de chunks,
+    estatísticas) para a geração viva; consultas em andamento terminam na anterior.
+    Quem troca o apelido é só o worker de ingestão (um por vez), e sem jobs de ingestão
+    ativos: `promote`, `rollback` e `gc` levantam JobsBusy (o job que chama passa em `job`).
+    """
+
+    def __init__(self, path=GENERATIONS_FILE, check_seconds=GENERATION_CHECK_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self._lock = threading.RLock()
+        self._state = None
+        self._mtime = None
+        self._checked = 0.0
+        self._bound = None
+        self.switches = 0
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            if self._state is None:
+                self._state = _initial_state()
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                self._state = json.load(fh)
+            self._mtime = mtime
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ Apelidos das gerações ilegíveis em %s, mantendo o atual: %s", self.path, e)
+            if self._state is None:
+                self._state = _initial_state()
+
+    def state(self):
+        now = time.monotonic()
+        if self._state is None or now - self._checked >= self.check_seconds:
+            with self._lock:
+                self._checked = now
+                self._reload()
+        return self._state
+
+    def _fresh(self):
+        """Estado relido do disco agora (antes de qualquer alteração), como cópia editável"""
+        self._checked = time.monotonic()
+        self._reload()
+        return json.loads(json.dumps(self._state))
+
+    def _write(self, state):
+        state["updated_at"] = time.time()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(state, fh, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+        self._state = state
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def live(self):
+        return self.state()["live"]
+
+    def sync(self):
+        """Aponta os singletons do processo para a geração viva (se o apelido mudou); retorna o nome dela"""
+        live = self.live()
+        if live != self._bound:
+            with self._lock:
+                if live != self._bound:
+                    from .vector_store import vector_store
+                    from .code_index import code_index, CODE_INDEX_PATH
+                    from .dedup import chunk_registry, DEDUP_PATH
+                    from .collection_stats import collection_stats, COLLECTION_STATS_PATH
+                    vector_store.retarget(live)
+                    code_index.retarget(sidecar(live, CODE_INDEX_PATH))
+                    chunk_registry.retarget(sidecar(live, DEDUP_PATH))
+                    collection_stats.retarget(sidecar(live, COLLECTION_STATS_PATH))
+                    if self._bound is not None:
+                        self.switches += 1
+                        logger.info("🔀 Geração viva: %s", live)
+                    self._bound = live
+        return live
+
+    # ---- alterações (worker de ingestão) ----
+
+    def begin(self):
+        """Reserva a próxima geração (sombra) e retorna o nome"""
+        with self._lock:
+            state = self._fresh()
+            n = state.get("next", 1)
+            name = f"{COLLECTION_NAME}__g{n}"
+            state["next"] = n + 1
+            state["generations"][name] = {"status": "building", "created_at": time.time()}
+            self._write(state)
+        return name
+
+    def record(self, name, **fields):
+        """Atualiza o registro da geração (status, validação, contagem...)"""
+        with self._lock:
+            state = self._fresh()
+            state["generations"].setdefault(name, {}).update(fields)
+            self._write(state)
+
+    def promote(self, name, job=None):
+        """
+        Troca o apelido: `name` vira a viva e a atual fica como anterior (rollback).
+        Marca a coleção como alterada (cache de respostas); publicar o snapshot da
+        nova geração fica com quem chama (job em background). Retorna a geração que saiu.
+        """
+        with job_manager.exclusive(allow=job), self._lock:
+            state = self._fresh()
+            entry = state["generations"].get(name)
+            if entry is None:
+                raise KeyError(name)
+            if name == state["live"]:
+                raise ValueError(f"A geração {name} já é a viva.")
+            if entry.get("status") not in ("validated", "retired"):
+                raise ValueError(f"A geração {name} não pode ir ao ar (status: {entry.get('status')}).")
+            now = time.time()
+            old = state["live"]
+            state["generations"].setdefault(old, {}).update({"status": "retired", "retired_at": now})
+            entry.update({"status": "live", "promoted_at": now})
+            state["live"], state["previous"] = name, old
+            self._write(state)
+            mark_collection_changed()
+            self.sync()
+        logger.info("🟢 Geração %s no ar (anterior: %s)", name, old)
+        return old
+
+    def rollback(self, job=None):
+        """Volta instantaneamente para a geração anterior (que ainda está inteira no disco)"""
+        previous = self.state().get("previous")
+        if not previous:
+            raise ValueError("Não há geração anterior para voltar.")
+        self.promote(previous, job)
+        return previous
+
+    def gc(self, keep=GENERATIONS_KEEP, job=None):
+        """
+        Apaga gerações reprovadas e as aposentadas além das `keep` mais recentes
+        (a anterior nunca é apagada). Retorna os nomes apagados.
+        """
+        with job_manager.exclusive(allow=job), self._lock:
+            state = self._fresh()
+            spared = {state["live"], state.get("previous")}
+            retired = sorted(
+                (n for n, e in state["generations"].items() if e.get("status") == "retired" and n not in spared),
+                key=lambda n: state["generations"][n].get("retired_at") or 0, reverse=True,
+            )
+            kept = max(0, keep - (1 if state.get("previous") else 0))
+            failed = [n for n, e in state["generations"].items() if e.get("status") == "failed" and n not in spared]
+            doomed = retired[kept:] + failed
+            for name in doomed:
+                _drop(name)
+                del state["generations"][name]
+            if doomed:
+                self._write(state)
+        for name in doomed:
+            logger.info("🗑️ Geração apagada: %s", name)
+        return doomed
+
+    def describe(self):
+        state = self.state()
+        return {
+            "live": state["live"],
+            "previous": state.get("previous"),
+            "bound": self._bound,
+            "switches": self.switches,
+            "generations": [
+                {"name": name, **entry}
+                for name, entry in sorted(state["generations"].items(), key=lambda kv: kv[1].get("created_at") or 0)
+            ],
+        }
+
+
+generations = Generations()
+
+
+class Generation:
+    """Recursos de uma geração: coleção do Chroma e seus arquivos auxiliares"""
+
+    def __init__(self, name, store, registry, code_index, stats):
+        self.name = name
+        self.store = store
+        self.registry = registry
+        self.code_index = code_index
+        self.stats = stats
+
+    def sidecar(self, default_path):
+        return sidecar(self.name, default_path)
+
+
+def live_generation():
+    """A geração viva com os singletons do processo (ingestão incremental, chat, debug)"""
+    from .vector_store import vector_store
+    from .code_index import code_index
+    from .dedup import chunk_registry
+    from .collection_stats import collection_stats
+    name = generations.sync()
+    return Generation(name, vector_store, chunk_registry, code_index, collection_stats)
+
+
+def open_generation(name):
+    """Uma geração fora do ar (sombra em construção): instâncias próprias, sem mexer na versão da viva"""
+    from .vector_store import VectorStore
+    from .code_index import CodeIndex, CODE_INDEX_PATH
+    from .dedup import ChunkRegistry, DEDUP_PATH
+    from .collection_stats import CollectionStats, COLLECTION_STATS_PATH
+    return Generation(
+        name,
+        VectorStore(name=name, track_version=False),
+        ChunkRegistry(sidecar(name, DEDUP_PATH)),
+        CodeIndex(sidecar(name, CODE_INDEX_PATH)),
+        CollectionStats(sidecar(name, COLLECTION_STATS_PATH)),
+    )
+
+
+def _drop(name):
+    """Apaga a coleção da geração e os seus arquivos auxiliares"""
+    from .vector_store import VectorStore
+    try:
+        VectorStore(name=name, track_version=False).drop()
+    except Exception as e:
+        logger.warning("⚠️ Coleção %s não apagada: %s", name, e)
+    if name != COLLECTION_NAME:
+        shutil.rmtree(os.path.join(GENERATIONS_DIR, name), ignore_errors=True)
+        return
+    # primeira geração: arquivos soltos em CHROMA_DIR
+    from .code_index import CODE_INDEX_PATH
+    from .dedup import DEDUP_PATH
+    from .collection_stats import COLLECTION_STATS_PATH
+    from .drive_sync import MANIFEST_PATH
+    from .web_crawler import CRAWL_STATE_PATH
+    for path in (CODE_INDEX_PATH, DEDUP_PATH, MANIFEST_PATH, CRAWL_STATE_PATH,
+                 COLLECTION_STATS_PATH, f"{COLLECTION_STATS_PATH}-wal", f"{COLLECTION_STATS_PATH}-shm"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def validate(generation, live=None, embedder=None):
+    """
+    Confere a sombra antes da troca: não vazia, com pelo menos REBUILD_MIN_RATIO dos
+    chunks da viva, perguntas de fumaça com resultados e chunks amostrados achando
+    a si mesmos no top 3 (embeddings e HNSW íntegros). Retorna o relatório com `ok`.
+    """
+    embedder = embedder or get_embedder()
+    store = generation.store
+    count = store.count()
+    live_count = live.store.count() if live is not None else 0
+    report = {"count": count, "live_count": live_count, "errors": []}
+    errors = report["errors"]
+
+    if count == 0:
+        errors.append("coleção vazia")
+    elif live_count and count < REBUILD_MIN_RATIO * live_count:
+        errors.append(f"{count} chunks, menos de {REBUILD_MIN_RATIO:.0%} dos {live_count} da geração viva")
+
+    if not errors:
+        try:
+            if REBUILD_SMOKE_QUERIES:
+                vectors = embedder.encode(REBUILD_SMOKE_QUERIES, convert_to_numpy=True, show_progress_bar=False)
+                found = store.query(vectors, n_results=3, include=("distances",))["ids"]
+                for query, ids in zip(REBUILD_SMOKE_QUERIES, found):
+                    if not ids:
+                        errors.append(f"busca de fumaça sem resultados: {query!r}")
+
+            sample = store.get(limit=REBUILD_SMOKE_SAMPLES, include=("documents",))
+            if sample["ids"]:
+                vectors = embedder.encode(sample["documents"], convert_to_numpy=True, show_progress_bar=False)
+                found = store.query(vectors, n_results=3, include=("distances",))["ids"]
+                hits = sum(chunk_id in ids for chunk_id, ids in zip(sample["ids"], found))
+                report["self_recall"] = round(hits / len(sample["ids"]), 3)
+                if report["self_recall"] < REBUILD_MIN_RECALL:
+                    errors.append(f"chunks amostrados não se acham na busca (recall {report['self_recall']})")
+        except Exception as e:
+            errors.append(f"erro na busca de fumaça: {e}")
+
+    report["ok"] = not errors
+    return report
+
+
+def rebuild_job(job, web=True, promote=True):
+    """
+    Reconstrução completa sem derrubar o chat (roda numa thread do JobManager): reingere
+    o Drive e, com `web`, as páginas já indexadas numa geração sombra; o chat continua
+    lendo a viva (ou o snapshot) enquanto isso. Validada, a sombra vai ao ar com
+    `promote` (senão fica esperando /api/index/generations/{nome}/promote) e as
+    gerações antigas além de GENERATIONS_KEEP são apagadas.
+    """
+    from .drive_sync import baixar_arquivos_drive
+    from .web_crawler import CrawlState, CRAWL_STATE_PATH, crawl_and_index
+    from .snapshot import publish_snapshot
+
+    live = live_generation()
+    name = generations.begin()
+    shadow = open_generation(name)
+    logger.info("🟦 Reconstruindo o índice na geração %s (viva: %s)", name, live.name)
+    stats = {"generation": name, "live": live.name, "promoted": False}
+    try:
+        stats["drive"] = baixar_arquivos_drive(force=True, job=job, generation=shadow)
+
+        seeds = [url for url, entry in CrawlState(live.sidecar(CRAWL_STATE_PATH)).pages.items()
+                 if entry.get("chunk_ids")]
+        if web and seeds and not job.cancelled():
+            stats["web"] = asyncio.run(crawl_and_index(
+                seeds, depth=0, max_pages=len(seeds), state=CrawlState(shadow.sidecar(CRAWL_STATE_PATH)),
+                job=job, generation=shadow,
+            ))
+
+        if job.cancelled():
+            generations.record(name, status="failed", error="cancelado")
+            return stats
+
+        # a sombra já nasce com estatísticas e partições completas (sem migração no aquecimento)
+        shadow.stats.mark_built()
+        shadow.stats.mark_partitioned()
+        report = validate(shadow, live)
+        stats["validation"] = report
+        generations.record(name, status="validated" if report["ok"] else "failed", count=report["count"],
+                           validation=report)
+        if not report["ok"]:
+            raise RuntimeError(f"Geração {name} reprovada na validação: {'; '.join(report['errors'])}")
+        logger.info("✅ Geração %s validada: %d chunks", name, report["count"])
+
+        if promote:
+            try:
+                generations.promote(name, job)
+            except JobsBusy as e:
+                # um crawl rodando agora gravaria metade em cada geração: a troca fica para depois
+                logger.info("⏸️ Geração %s validada, mas não foi ao ar: %s", name, e)
+                stats["pending"] = f"/api/index/generations/{name}/promote"
+                return stats
+            stats["promoted"] = True
+            publish_snapshot()
+            stats["removed"] = generations.gc(job=job)
+        return stats
+    except Exception as e:
+        if generations.state()["generations"].get(name, {}).get("status") == "building":
+            generations.record(name, status="failed", error=str(e))
+        raise
+    finally:
+        shadow.stats.close()
@@ -0,0 +1,214 @@
+import os
+import logging
+import time
+
+from .deps import get_embedder
+from .vector_store import vector_store, UPSERT_BATCH_SIZE
+from .code_index import code_index
+from .dedup import chunk_registry
+from .collection_stats import collection_stats
+from .context_packer import count_tokens_batch
+from .metrics import observe, CHUNKS_INDEXED, CHUNKS_DEDUPLICATED
+
+# Tamanho de lote do modelo (CPU-only: lotes maiores amortizam o custo do modelo)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Intervalo mínimo entre gravações do registro de chunks e do índice de códigos durante a
+# ingestão (cada gravação reescreve o arquivo inteiro); o fim da sincronização/crawl sempre grava
+INDEX_SAVE_SECONDS = float(os.getenv("INDEX_SAVE_SECONDS", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+class BatchIndexer:
+    """
+    Acumula chunks e grava no vector store em lotes:
+    um `encode` por lote de embeddings e um `upsert` por lote de escrita.
+    Os ids vêm do conteúdo: texto repetido (ou quase igual) em outra fonte não é
+    gravado de novo, só ganha a fonte no metadado `sources`; chunks que a fonte
+    já tinha (arquivo reindexado) também não são recalculados, a menos que
+    `reembed=True` (ex.: reindexação forçada após trocar o modelo).
+    `pipeline` (drive, web...) rotula as métricas de tempo e de chunks gravados.
+    `registry`, `index` e `inventory` (registro de chunks, índice de códigos e estatísticas)
+    são os da geração viva, a menos que se passe os de uma geração sombra.
+    Registro e índice de códigos vão ao disco no máximo a cada INDEX_SAVE_SECONDS;
+    quem usa o indexer chama `save()` ao terminar.
+    """
+
+    def __init__(self, store=None, embedder=None, embed_batch_size=None, upsert_batch_size=None, registry=None,
+                 reembed=False, pipeline="ingest", index=None, inventory=None):
+        self.store = store or vector_store
+        self.registry = registry or chunk_registry
+        self.index = index or code_index
+        self.inventory = inventory or collection_stats
+        self.embedder = embedder or get_embedder()
+        self.embed_batch_size = embed_batch_size or EMBED_BATCH_SIZE
+        self.upsert_batch_size = upsert_batch_size or UPSERT_BATCH_SIZE
+        self.reembed = reembed
+        self.pipeline = pipeline
+
+        self._ids = []
+        self._texts = []
+        self._metas = []
+        self._touched = set()  # chunks já gravados que ganharam uma fonte
+        self._new = set()      # chunks do lote pendente que ainda não existem no store
+        self._queued = set()   # chunks já enfileirados por este indexer (reembed)
+
+        self.chunks = 0
+        self.duplicates = 0
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+        self._started = time.perf_counter()
+        self._dirty = False
+        self._saved = self._started
+
+    def add(self, texts, metadatas, source, name=None):
+        """
+        Enfileira os chunks de uma fonte (id do arquivo, URL) e retorna os ids
+        canônicos na mesma ordem (textos vazios são pulados); grava quando o lote enche
+        """
+        ids = []
+        for text, meta in zip(texts, metadatas):
+            if not text or not text.strip():
+                continue
+            chunk_id, status = self.registry.resolve(text, source, name or source)
+            ids.append(chunk_id)
+            if status == "linked":
+                self.duplicates += 1
+                CHUNKS_DEDUPLICATED.labels(self.pipeline).inc()
+                self._touched.add(chunk_id)
+            if status != "new" and (not self.reembed or chunk_id in self._queued):
+                continue
+            if status == "new":
+                self._new.add(chunk_id)
+            self._queued.add(chunk_id)
+            self._ids.append(chunk_id)
+            self._texts.append(text)
+            self._metas.append(meta)
+
+            if len(self._ids) >= self.upsert_batch_size:
+                self.flush()
+        return ids
+
+    def flush(self):
+        """Gera embeddings e faz upsert de tudo que está pendente"""
+        touched = self._touched - set(self._ids)
+        self._touched = set()
+        if touched:
+            update_sources(self.store, self.registry, touched)
+            self._dirty = True
+        if not self._ids:
+            self.save(force=False)
+            return
+
+        ids, texts, metas, new = self._ids, self._texts, self._metas, self._new
+        self._ids, self._texts, self._metas, self._new = [], [], [], set()
+
+        t0 = time.perf_counter()
+        try:
+            embeddings = self.embedder.encode(
+                texts,
+                batch_size=self.embed_batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+            t_embed = time.perf_counter()
+            # contagem de tokens feita uma vez aqui; o chat só lê dos metadados
+            for chunk_id, meta, tokens in zip(ids, metas, count_tokens_batch(texts)):
+                meta["tokens"] = tokens
+                meta.update(self.registry.source_fields(chunk_id))
+            t1 = time.perf_counter()
+
+            self.store.upsert(ids, texts, embeddings, metas, batch_size=self.upsert_batch_size)
+        except Exception:
+            self.registry.forget(new)
+            raise
+        t2 = time.perf_counter()
+        self.index.add(ids, texts)
+        self.inventory.add_chunks(ids, [meta["tokens"] for meta in metas])
+        self._dirty = True
+        self.save(force=False)
+        t3 = time.perf_counter()
+
+        observe(self.pipeline, "embed", t_embed - t0)
+        observe(self.pipeline, "tokenize", t1 - t_embed)
+        observe(self.pipeline, "upsert", t2 - t1)
+        observe(self.pipeline, "code_index", t3 - t2)
+        CHUNKS_INDEXED.labels(self.pipeline).inc(len(ids))
+        self.chunks += len(ids)
+        self.embed_seconds += t1 - t0
+        self.write_seconds += t2 - t1
+        logger.info("💾 Lote gravado: %d chunks (%.1f chunks/s)", len(ids), len(ids) / max(t2 - t0, 1e-9))
+
+    def discard(self, source, ids):
+        """Desfaz os chunks de uma fonte interrompida no meio (grava o lote e solta a fonte)"""
+        if not ids:
+            return
+        self.flush()
+        remover_chunks(self.store, ids, source, self.registry, self.index, self.inventory, save=False)
+        self._dirty = True
+
+    def save(self, force=True):
+        """Grava registro e índice de códigos se mudaram (sem `force`, só se passou INDEX_SAVE_SECONDS)"""
+        now = time.perf_counter()
+        if not self._dirty or (not force and now - self._saved < INDEX_SAVE_SECONDS):
+            return
+        self.index.save()
+        self.registry.save()
+        self._dirty = False
+        self._saved = now
+
+    def abort(self):
+        """Descarta o lote pendente após um erro (os chunks nunca gravados saem do registro)"""
+        self.registry.forget(self._new)
+        self._ids, self._texts, self._metas, self._new = [], [], [], set()
+        self._touched = set()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self._started
+        return {
+            "chunks": self.chunks,
+            "duplicates": self.duplicates,
+            "seconds": round(elapsed, 3),
+            "embed_seconds": round(self.embed_seconds, 3),
+            "write_seconds": round(self.write_seconds, 3),
+            "chunks_per_sec": round(self.chunks / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+def update_sources(store, registry, chunk_ids):
+    """Regrava `sources`/`name` dos chunks compartilhados (só metadados, sem embedding)"""
+    chunk_ids = list(chunk_ids)
+    store.update_metadata(chunk_ids, [registry.source_fields(c) for c in chunk_ids])
+
+
+def remover_chunks(store, chunk_ids, source, registry=None, index=None, inventory=None, save=True):
+    """
+    Solta os chunks de uma fonte: apaga (em lotes, também do índice de códigos) os que
+    ficaram sem nenhuma fonte e atualiza `sources` dos que ainda são usados por outras.
+    Com `save=False` (várias fontes seguidas) quem chama grava registro e índice no fim.
+    """
+    store = store or vector_store
+    registry = registry or chunk_registry
+    index = index or code_index
+    inventory = inventory or collection_stats
+    to_delete, to_update = registry.release(source, chunk_ids)
+    if not to_delete and not to_update:
+        return
+    store.delete(to_delete)
+    if to_update:
+        update_sources(store, registry, to_update)
+    if to_delete:
+        index.remove(to_delete)
+        inventory.remove_chunks(to_delete)
+    if save:
+        index.save()
+        registry.save()
+
+
+def index_chunks(store, embedder, texts, metadatas, source, name=None, embed_batch_size=None, upsert_batch_size=None):
+    """Indexa os chunks de uma fonte em lotes e retorna as estatísticas de throughput"""
+    indexer = BatchIndexer(store, embedder, embed_batch_size, upsert_batch_size)
+    indexer.add(texts, metadatas, source, name)
+    indexer.flush()
+    indexer.save()
+    return indexer.stats()
@@ -0,0 +1,283 @@
+import os
+import logging
+import time
+import queue
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+
+from googleapiclient.http import MediaIoBaseDownload
+
+from .pdf_chunker import count_pages, extract_page_range, page_ranges
+from .metrics import span, observe, request_id_var
+
+logger = logging.getLogger(__name__)
+
+PDF_MIME = "application/pdf"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+SUPPORTED_MIMES = {PDF_MIME, DOCX_MIME}
+
+# Configuração dos estágios
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+PIPELINE_MAX_PENDING = int(os.getenv("PIPELINE_MAX_PENDING", "8"))
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+
+
+def download_to_tempfile(svc, f, chunksize=None):
+    """
+    Baixa um arquivo do Drive direto para um arquivo temporário único,
+    em blocos de `chunksize` (sem manter o arquivo inteiro em memória)
+    """
+    suffix = os.path.splitext(f.get("name", ""))[1]
+    fd, path = tempfile.mkstemp(prefix="babix_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            request = svc.files().get_media(fileId=f["id"])
+            downloader = MediaIoBaseDownload(out, request, chunksize=chunksize or DOWNLOAD_CHUNK_SIZE)
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def parse_docx(path):
+    """Texto de um DOCX (sem chunking, já são menores)"""
+    import docx
+    doc = docx.Document(path)
+    text = "\n".join([p.text for p in doc.paragraphs]).strip()
+    return [(text, {})] if text else []
+
+
+def _timed(fn, *args):
+    """Roda `fn` (no processo do pool) e devolve (resultado, segundos gastos)"""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def _done_future(fn, *args):
+    """Executa na hora e embrulha o resultado num Future (modo sem pool de processos)"""
+    fut = Future()
+    try:
+        fut.set_result(fn(*args))
+    except Exception as e:
+        fut.set_exception(e)
+    return fut
+
+
+def run_pipeline(files, svc_factory, indexer, download_workers=None, parse_workers=None, max_pending=None,
+                 on_file=None, cancel=None):
+    """
+    Pipeline em estágios com filas limitadas para a ingestão:
+      1. pool de threads baixa os arquivos em streaming para temporários únicos;
+      2. um despachante divide cada PDF em intervalos de páginas e os extrai num
+         pool de processos (DOCX vai inteiro);
+      3. a thread chamadora consome os intervalos em ordem, gera embeddings e grava
+         em lote (BatchIndexer).
+    No máximo `max_pending` arquivos baixados e `2 × parse_workers` intervalos ficam
+    em trânsito, então o throughput é limitado pelo estágio mais lento e a memória
+    não cresce com o tamanho do PDF.
+
+    `svc_factory` cria um serviço do Drive por thread (o cliente não é thread-safe).
+    `on_file(arquivo, ids)` é chamado ao fim de cada arquivo (ids=None se falhou).
+    Nos PDFs, o arquivo devolvido ganha `pages` (número de páginas).
+    Se o Event `cancel` for acionado, para no próximo item, descarta os chunks dos
+    arquivos pela metade e retorna só os concluídos.
+    Retorna a lista [(arquivo, ids_indexados)] dos arquivos processados com sucesso.
+    """
+    download_workers = download_workers or DOWNLOAD_WORKERS
+    parse_workers = PARSE_WORKERS if parse_workers is None else parse_workers
+    max_pending = max_pending or PIPELINE_MAX_PENDING
+
+    if not files:
+        return []
+
+    local = threading.local()
+    file_slots = threading.BoundedSemaphore(max_pending)
+    downloaded = queue.Queue()
+    parsed = queue.Queue(maxsize=max(2, parse_workers * 2))
+    stop = threading.Event()
+    temp_paths = set()  # temporários ainda não apagados (limpeza no finally)
+
+    def get_svc():
+        if not hasattr(local, "svc"):
+            local.svc = svc_factory()
+        return local.svc
+
+    def put(q, item):
+        # put que desiste se o pipeline foi interrompido (evita travar no shutdown)
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    # 1️⃣ Download
+    def download(f):
+        while not file_slots.acquire(timeout=0.5):
+            if stop.is_set():
+                return
+        try:
+            logger.info("⬇️ Baixando: %s (%s)", f["name"], f["mimeType"])
+            with span("drive", "download"):
+                path = download_to_tempfile(get_svc(), f)
+            temp_paths.add(path)
+        except Exception as e:
+            file_slots.release()
+            downloaded.put((f, None, e))
+            return
+        downloaded.put((f, path, None))
+
+    parse_pool = None
+    if parse_workers > 0:
+        parse_pool = ProcessPoolExecutor(
+            max_workers=parse_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def submit(fn, *args):
+        # o parsing roda em outro processo: o tempo volta junto com o resultado
+        if parse_pool is None:
+            return _done_future(_timed, fn, *args)
+        return parse_pool.submit(_timed, fn, *args)
+
+    # 2️⃣ Despacho para o parsing (ordem de chegada dos downloads)
+    def dispatch():
+        for _ in range(len(files)):
+            item = None
+            while item is None and not stop.is_set():
+                try:
+                    item = downloaded.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            if item is None:
+                return
+            f, path, error = item
+            if error is not None:
+                put(parsed, ("error", f, path, error))
+                continue
+            try:
+                if f["mimeType"] == PDF_MIME:
+                    with span("drive", "count_pages"):
+                        pages = count_pages(path)
+                    ranges = page_ranges(pages)
+                    if not ranges:
+                        put(parsed, ("end", f, path, pages))
+                        continue
+                    for start, end in ranges:
+                        fut = submit(extract_page_range, path, start, end, CHUNK_SIZE, CHUNK_OVERLAP)
+                        if not put(parsed, ("range", f, path, fut)):
+                            return
+                    put(parsed, ("end", f, path, pages))
+                elif f["mimeType"] == DOCX_MIME:
+                    put(parsed, ("range", f, path, submit(parse_docx, path)))
+                    put(parsed, ("end", f, path, None))
+                else:
+                    put(parsed, ("end", f, path, None))
+            except Exception as e:
+                put(parsed, ("error", f, path, e))
+
+    def finish_file(path):
+        if path is None:
+            return  # falha no download: a vaga já foi devolvida
+        file_slots.release()
+        temp_paths.discard(path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def to_records(f, chunks, state):
+        texts, metas = [], []
+        for text, meta in chunks:
+            i = state["next"]
+            state["next"] += 1
+            if not text.strip():
+                continue
+            base = {"name": f["name"], "mime": f["mimeType"], "file_id": f["id"]}
+            if f["mimeType"] == PDF_MIME:
+                metas.append({**base, "chunk_id": i, "page": meta.get("page", 0)})
+            else:
+                metas.append(base)
+            texts.append(text)
+        return texts, metas
+
+    processed = []
+    # threads do download herdam o id do job/requisição para as linhas de log
+    download_pool = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="drive-dl",
+                                       initializer=request_id_var.set, initargs=(request_id_var.get(),))
+    dispatcher = threading.Thread(target=dispatch, name="drive-parse-dispatch", daemon=True)
+    try:
+        for f in files:
+            download_pool.submit(download, f)
+        dispatcher.start()
+
+        # 3️⃣ Embedding/escrita (thread atual), intervalo a intervalo
+        finished = 0
+        current = {}  # file_id -> estado do arquivo em andamento
+        while finished < len(files):
+            if cancel is not None and cancel.is_set():
+                for file_id, st in current.items():
+                    indexer.discard(file_id, st["ids"])
+                logger.info("⏹️ Ingestão cancelada: %d/%d arquivos concluídos", finished, len(files))
+                break
+            try:
+                kind, f, path, payload = parsed.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            state = current.setdefault(f["id"], {"ids": [], "next": 0, "failed": None})
+
+            if kind == "range":
+                if state["failed"] is None:
+                    try:
+                        waiting = time.perf_counter()
+                        chunks, parse_seconds = payload.result()
+                        observe("drive", "parse_wait", time.perf_counter() - waiting)
+                        observe("drive", "parse", parse_seconds)
+                        texts, metas = to_records(f, chunks, state)
+                    except Exception as e:
+                        state["failed"] = e
+                    else:
+                        # ids por conteúdo: trechos repetidos viram referência ao chunk existente
+                        state["ids"].extend(indexer.add(texts, metas, f["id"], f["name"]))
+                continue
+
+            # "end" (com o nº de páginas do PDF) ou "error": último item do arquivo
+            if kind == "error":
+                state["failed"] = payload
+            elif payload is not None:
+                f = {**f, "pages": payload}
+            current.pop(f["id"], None)
+            finish_file(path)
+            finished += 1
+
+            if state["failed"] is not None:
+                logger.error("❌ Erro ao processar %s: %s", f["name"], state["failed"])
+            elif not state["ids"]:
+                logger.warning("⚠️ Falha ao processar ou documento vazio: %s", f["name"])
+            else:
+                processed.append((f, list(dict.fromkeys(state["ids"]))))
+                logger.info("✅ Enfileirado: %s (%d chunks)", f["name"], len(state["ids"]))
+            if on_file is not None:
+                on_file(f, state["ids"] if state["failed"] is None and state["ids"] else None)
+    finally:
+        stop.set()
+        download_pool.shutdown(wait=True, cancel_futures=True)
+        dispatcher.join(timeout=5)
+        if parse_pool is not None:
+            parse_pool.shutdown(wait=True, cancel_futures=True)
+        # remove temporários que ficaram no meio do caminho (erro/interrupção)
+        for path in list(temp_paths):
+            if os.path.exists(path):
+                os.remove(path)
+
+    return processed
@@ -0,0 +1,198 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import logger, request_context, format_timings
+
+# Jobs de ingestão rodam fora do event loop, em poucas threads (não competem com o chat)
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "1"))
+# Quantos jobs terminados ficam guardados para consulta
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "50"))
+
+ACTIVE = ("queued", "running")
+
+
+class JobsBusy(RuntimeError):
+    """Há jobs ativos e a operação precisa do índice parado (troca de geração, coleta)"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        super().__init__("Há jobs em andamento: " + ", ".join(f"{j.source} ({j.id})" for j in jobs))
+
+
+class Job:
+    """
+    Um job de ingestão: estado, progresso (arquivos/chunks) e pedido de cancelamento.
+    O trabalho recebe o próprio job e chama `update()`; deve checar `cancelled()`
+    entre etapas e parar deixando o índice consistente.
+    """
+
+    def __init__(self, source, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.source = source
+        self.params = params
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        self.files_total = None
+        self.files_done = 0
+        self.chunks_done = 0
+
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def update(self, files_total=None, files_done=None, chunks_done=None):
+        """Atualiza o progresso; `files_done`/`chunks_done` são incrementos"""
+        with self._lock:
+            if files_total is not None:
+                self.files_total = files_total
+            if files_done:
+                self.files_done += files_done
+            if chunks_done:
+                self.chunks_done += chunks_done
+
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def wait(self, timeout=None):
+        """Bloqueia até o job terminar (quem precisa de resposta síncrona); False se estourar o `timeout`"""
+        return self.done_event.wait(timeout)
+
+    def to_dict(self):
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            files_rate = self.files_done / elapsed if elapsed > 0 else 0.0
+            eta = None
+            if self.status == "running" and self.files_total is not None and files_rate > 0:
+                eta = round(max(0, self.files_total - self.files_done) / files_rate, 1)
+            return {
+                "job_id": self.id,
+                "source": self.source,
+                "params": self.params,
+                "status": self.status,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed_seconds": round(elapsed, 3),
+                "files_total": self.files_total,
+                "files_done": self.files_done,
+                "chunks_done": self.chunks_done,
+                "chunks_per_sec": round(self.chunks_done / elapsed, 2) if elapsed > 0 else 0.0,
+                "eta_seconds": eta,
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """
+    Executa jobs de ingestão num pool limitado de threads, com no máximo um job
+    ativo por fonte (single-flight): pedir de novo devolve o job em andamento.
+    """
+
+    def __init__(self, max_workers=INGEST_JOB_WORKERS, history=INGEST_JOB_HISTORY):
+        self.max_workers = max_workers
+        self.history = history
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active = {}  # fonte -> job ativo
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ingest-job")
+        return self._executor
+
+    def submit(self, source, fn, **params):
+        """
+        Agenda `fn(job, **params)`. Retorna (job, criado); se a fonte já tem um job
+        ativo, devolve esse job e `criado=False`.
+        """
+        with self._lock:
+            running = self._active.get(source)
+            if running is not None and running.status in ACTIVE:
+                return running, False
+
+            job = Job(source, params)
+            self._jobs[job.id] = job
+            self._active[source] = job
+            self._trim()
+            self._pool().submit(self._run, job, fn)
+            return job, True
+
+    @contextmanager
+    def exclusive(self, allow=None):
+        """
+        Roda o bloco sem nenhum job ativo além de `allow` (o job que está chamando) e
+        sem deixar agendar outros enquanto isso. Levanta JobsBusy se houver jobs ativos.
+        Não agende jobs de dentro do bloco.
+        """
+        with self._lock:
+            busy = [j for j in self._active.values() if j.status in ACTIVE and j is not allow]
+            if busy:
+                raise JobsBusy(busy)
+            yield
+
+    def _run(self, job, fn):
+        # o id do job faz o papel do id de requisição nos logs da ingestão
+        with request_context(job.id) as timings:
+            job.started_at = time.time()
+            job.status = "running"
+            try:
+                if job.cancelled():
+                    job.status = "cancelled"
+                    return
+                job.result = fn(job, **job.params)
+                job.status = "cancelled" if job.cancelled() else "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+                logger.exception("❌ Job %s (%s) falhou: %s", job.id, job.source, e)
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    if self._active.get(job.source) is job:
+                        del self._active[job.source]
+                job.done_event.set()
+                logger.info("job %s %s %.1fs %s", job.source, job.status, job.finished_at - job.started_at,
+                            format_timings(timings))
+
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if j.status not in ACTIVE]
+        for job in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    def cancel(self, job_id):
+        """Pede o cancelamento; o job para na próxima checagem. Retorna o job ou None"""
+        job = self._jobs.get(job_id)
+        if job is not None and job.status in ACTIVE:
+            job.cancel_event.set()
+        return job
+
+    def shutdown(self):
+        """Cancela os jobs ativos e libera o pool sem esperar (shutdown do servidor)"""
+        with self._lock:
+            for job in self._active.values():
+                job.cancel_event.set()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+job_manager = JobManager()
@@ -0,0 +1,51 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+
+# Máximo de chamadas simultâneas ao LLM por worker e quanto tempo esperar por uma vaga
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_ACQUIRE_TIMEOUT = float(os.getenv("LLM_ACQUIRE_TIMEOUT", "1.0"))
+
+
+class LLMBusyError(Exception):
+    """Todas as vagas de chamada ao LLM estão ocupadas"""
+
+
+class LLMGate:
+    """
+    Limita as chamadas concorrentes ao LLM. Quem não consegue vaga dentro de
+    `acquire_timeout` recebe LLMBusyError (vira 503) em vez de enfileirar sem limite.
+    """
+
+    def __init__(self, limit, acquire_timeout):
+        self.limit = limit
+        self.acquire_timeout = acquire_timeout
+        self._sem = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        try:
+            if self.acquire_timeout > 0:
+                await asyncio.wait_for(self._sem.acquire(), timeout=self.acquire_timeout)
+            elif self._sem.locked():
+                raise asyncio.TimeoutError()
+            else:
+                await self._sem.acquire()
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise LLMBusyError()
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._sem.release()
+
+    def stats(self):
+        return {"limit": self.limit, "in_flight": self.in_flight, "rejected": self.rejected}
+
+
+llm_gate = LLMGate(LLM_MAX_CONCURRENCY, LLM_ACQUIRE_TIMEOUT)
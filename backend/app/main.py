@@ -1,23 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from .routers import health, ingest, chat, debug, drive_ingest, web_ingest
 import os
 
-# 🔹 Importa todas as rotas
-from .routers import health, ingest, chat, debug, drive_ingest
+# 🔹 Importa todas as rotas (leves: Drive/web/torch/chromadb/openai só carregam no uso ou no aquecimento)
+from .routers import health, ingest, chat, debug, drive_ingest, web_ingest, jobs, metrics, index
+from . import deps
+from .embedding_service import embedding_batcher
+from .jobs import job_manager
+from .metrics import RequestMetricsMiddleware, setup_logging
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 🔹 Aquece embedder/Chroma/OpenAI em background; /api/ready responde 503 até terminar
+    warmup_task = asyncio.create_task(asyncio.to_thread(deps.warmup))
+    await embedding_batcher.start()
+    yield
+    job_manager.shutdown()
+    await embedding_batcher.stop()
+    if not warmup_task.done():
+        warmup_task.cancel()
+    await deps.aclose()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="Babix API", version="0.3.0")
+    setup_logging()
+    app = FastAPI(title="Babix API", version="0.3.0", lifespan=lifespan)
+
+    # 🔹 Id por requisição + histogramas de latência (exportados em /api/metrics)
+    app.add_middleware(RequestMetricsMiddleware)
 
-    # 🔹 Rotas principais
+    # 🔹 Rotas principais (BABIX_ROLE separa workers de chat e de ingestão)
+    serves_chat = deps.BABIX_ROLE in ("all", "chat")
+    serves_ingest = deps.BABIX_ROLE in ("all", "ingest")
     app.include_router(health.router, prefix="/api", tags=["health"])
-    app.include_router(ingest.router, prefix="/api", tags=["ingest"])
-    app.include_router(chat.router, prefix="/api", tags=["chat"])
+    if serves_ingest:
+        app.include_router(ingest.router, prefix="/api", tags=["ingest"])
+    if serves_chat:
+        app.include_router(chat.router, prefix="/api", tags=["chat"])
     app.include_router(debug.router, prefix="/api", tags=["debug"])
-    app.include_router(drive_ingest.router, prefix="/api", tags=["drive_ingest"])
-    app.include_router(web_ingest.router, prefix="/api", tags=["web_ingest"])
+    if serves_ingest:
+        app.include_router(drive_ingest.router, prefix="/api", tags=["drive_ingest"])
+        app.include_router(web_ingest.router, prefix="/api", tags=["web_ingest"])
+        app.include_router(jobs.router, prefix="/api", tags=["jobs"])
+        app.include_router(index.router, prefix="/api", tags=["index"])
+    app.include_router(metrics.router, prefix="/api", tags=["metrics"])
 
     # 🔹 Servir arquivos estáticos da pasta frontend
     frontend_path = os.path.join(os.path.dirname(__file__), "../../frontend")
@@ -0,0 +1,175 @@
+import os
+import re
+import time
+import uuid
+import logging
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+
+# Com vários workers do uvicorn, aponte PROMETHEUS_MULTIPROC_DIR para um diretório
+# compartilhado (vazio a cada deploy) e /api/metrics agrega todos os processos
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Requisições acima disso são logadas com o detalhamento por etapa mesmo em rotas silenciosas
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "2000"))
+
+# De 1 ms (lookup no índice exato) a 2 min (lote grande de embeddings na ingestão)
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Rotas de probe/scrape: não poluem o log a cada poucos segundos
+QUIET_PATHS = {"/api/health", "/api/live", "/api/ready", "/api/metrics"}
+
+STAGE_SECONDS = Histogram(
+    "babix_stage_seconds", "Duração de cada etapa do chat e da ingestão",
+    ["pipeline", "stage"], buckets=STAGE_BUCKETS,
+)
+HTTP_SECONDS = Histogram(
+    "babix_http_request_seconds", "Duração das requisições HTTP (até o fim do corpo da resposta)",
+    ["method", "route", "status"], buckets=HTTP_BUCKETS,
+)
+LLM_TOKENS = Counter("babix_llm_tokens", "Tokens enviados (prompt) e recebidos (resposta) do LLM", ["direction"])
+LLM_REQUESTS = Counter("babix_llm_requests", "Chamadas ao LLM por modo e resultado", ["mode", "outcome"])
+ANSWER_CACHE = Counter("babix_answer_cache_lookups", "Consultas ao cache de respostas", ["result"])
+QUERY_ROUTES = Counter(
+    "babix_query_routes", "Buscas vetoriais por partição e se precisaram completar com a global", ["route", "outcome"]
+)
+CHUNKS_INDEXED = Counter("babix_chunks_indexed", "Chunks gravados (embedding + upsert) por origem", ["pipeline"])
+CHUNKS_DEDUPLICATED = Counter(
+    "babix_chunks_deduplicated", "Chunks repetidos que viraram referência a um já gravado", ["pipeline"]
+)
+
+# Id da requisição/job atual; asyncio.to_thread copia o contexto, então chega às threads
+request_id_var = contextvars.ContextVar("request_id", default="-")
+# Tempo acumulado por etapa na requisição atual (para a linha de log do fim da requisição)
+_timings = contextvars.ContextVar("stage_timings", default=None)
+
+_REQUEST_ID = re.compile(r"^[\w.:-]{1,64}$")
+
+logger = logging.getLogger("babix")
+# Pacote do app: os módulos logam com logging.getLogger(__name__) e herdam o handler daqui
+APP_LOGGER = __name__.rpartition(".")[0]
+
+
+class RequestIdFilter(logging.Filter):
+    """Acrescenta `request_id` a todo registro de log"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+def setup_logging():
+    """Handler dos loggers `babix` e dos módulos do app com o id da requisição em cada linha (idempotente)"""
+    if any(isinstance(f, RequestIdFilter) for h in logger.handlers for f in h.filters):
+        return
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+    for target in (logger, logging.getLogger(APP_LOGGER)):
+        target.addHandler(handler)
+        target.setLevel(LOG_LEVEL)
+        target.propagate = False
+
+
+def observe(pipeline, stage, seconds):
+    """Registra a duração de uma etapa já medida"""
+    STAGE_SECONDS.labels(pipeline, stage).observe(seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(pipeline, stage):
+    """Mede o bloco como uma etapa (histograma + detalhamento da requisição atual)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(pipeline, stage, time.perf_counter() - started)
+
+
+@contextmanager
+def request_context(request_id=None):
+    """Define o id (requisição ou job) e zera o detalhamento por etapa; devolve o dict de tempos"""
+    timings = {}
+    rid_token = request_id_var.set(request_id or uuid.uuid4().hex[:12])
+    timings_token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(timings_token)
+        request_id_var.reset(rid_token)
+
+
+def format_timings(timings):
+    return " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+
+
+class RequestMetricsMiddleware:
+    """
+    Middleware ASGI: id por requisição (reaproveita `X-Request-ID` do cliente/proxy
+    e devolve no cabeçalho), histograma de duração por rota e uma linha de log por
+    requisição com o tempo de cada etapa. Mede até o último pedaço do corpo, então
+    o streaming SSE entra com a duração inteira.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode("latin-1")
+        request_id = incoming if _REQUEST_ID.match(incoming) else None
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        with request_context(request_id) as timings:
+            rid = request_id_var.get().encode("latin-1")
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    status["code"] = message["status"]
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", rid)]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                self._finish(scope, status["code"], time.perf_counter() - started, timings)
+
+    @staticmethod
+    def _finish(scope, status, elapsed, timings):
+        route = scope.get("route")
+        # template da rota (/api/jobs/{job_id}) para não explodir a cardinalidade
+        label = getattr(route, "path", None) or ("static" if scope["path"].startswith("/frontend") else "unmatched")
+        HTTP_SECONDS.labels(scope["method"], label, str(status)).observe(elapsed)
+
+        quiet = scope["path"] in QUIET_PATHS or label == "static"
+        level = logging.DEBUG if quiet and elapsed * 1000 < SLOW_REQUEST_MS else logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(level, "%s %s %s %.1fms %s", scope["method"], scope["path"], status, elapsed * 1000,
+                       format_timings(timings))
+
+
+def render():
+    """Texto no formato de exposição do Prometheus (agregado entre workers se multiprocesso)"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
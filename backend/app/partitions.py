@@ -0,0 +1,97 @@
+import os
+import re
+import unicodedata
+
+# Partições da coleção: metadado `source_type` de cada chunk (indexado pelo Chroma),
+# usado como filtro `where` na busca vetorial
+SOURCE_TYPES = ("ctb", "mbft", "resolucao", "web", "docx", "outros")
+
+# 0 desliga o roteamento (toda pergunta busca a coleção inteira)
+QUERY_ROUTING = os.getenv("QUERY_ROUTING", "1") != "0"
+# Se a partição devolver menos candidatos que isso, completa com a busca global
+ROUTE_MIN_RESULTS = int(os.getenv("ROUTE_MIN_RESULTS", "5"))
+
+# Nome do arquivo → tipo (na ordem: o MBFT cita o CTB e resoluções, então vem primeiro)
+_NAME_RULES = (
+    ("mbft", re.compile(r"mbft|manual brasileiro de fiscalizacao|fiscalizacao de transito")),
+    ("resolucao", re.compile(r"\bresolu|contran|deliberacao")),
+    ("ctb", re.compile(r"\bctb\b|codigo de transito|9\.?503")),
+)
+
+# Pergunta → partições. Códigos de infração (516-91) só existem nas fichas do MBFT
+_CODE = re.compile(r"\b\d{3}-\d{2}\b")
+_QUERY_RULES = (
+    ("mbft", re.compile(r"\bmbft\b|\bmanual\b|enquadramento|\bficha|amparo legal")),
+    ("resolucao", re.compile(r"resolu|contran|deliberacao")),
+    ("ctb", re.compile(r"\bctb\b|codigo de transito")),
+)
+
+
+def _normalize(text):
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def classify_source(source, name=None):
+    """Partição de uma fonte (URL do crawler ou arquivo do Drive) pelo identificador e nome"""
+    if str(source).startswith(("http://", "https://")):
+        return "web"
+    normalized = _normalize(name or source)
+    for source_type, pattern in _NAME_RULES:
+        if pattern.search(normalized):
+            return source_type
+    if normalized.endswith(".docx"):
+        return "docx"
+    return "outros"
+
+
+def route_query(query, entities=None):
+    """
+    Partições onde procurar a pergunta (tupla vazia = coleção inteira).
+    Códigos de infração → MBFT; artigos → CTB (ou resolução, se ela for citada);
+    menções explícitas ao manual, a resoluções ou ao CTB somam a partição.
+    `entities` é o resultado de `extract_entities` (padrões estritos do índice de códigos).
+    """
+    if not QUERY_ROUTING:
+        return ()
+    normalized = _normalize(query)
+    types = []
+    if (entities or {}).get("codes") or _CODE.search(normalized):
+        types.append("mbft")
+    for source_type, pattern in _QUERY_RULES:
+        if pattern.search(normalized):
+            types.append(source_type)
+    if (entities or {}).get("articles") and "resolucao" not in types:
+        types.append("ctb")
+    return tuple(dict.fromkeys(types))
+
+
+def where_clause(types):
+    """Filtro do Chroma para as partições (None = sem filtro)"""
+    if not types:
+        return None
+    if len(types) == 1:
+        return {"source_type": types[0]}
+    return {"source_type": {"$in": list(types)}}
+
+
+def backfill_source_types(store, registry, batch_size=1000):
+    """
+    Migração: grava `source_type` nos chunks indexados antes das partições
+    (pela primeira fonte no registro de chunks ou, sem registro, pelo próprio metadado)
+    """
+    updated = 0
+    for page in store.iter_pages(page_size=batch_size, include=("metadatas",)):
+        ids, metas = [], []
+        for chunk_id, meta in zip(page["ids"], page["metadatas"]):
+            meta = meta or {}
+            source_type = registry.source_fields(chunk_id).get("source_type") or classify_source(
+                meta.get("url") or meta.get("file_id") or meta.get("name") or "", meta.get("name")
+            )
+            if meta.get("source_type") != source_type:
+                ids.append(chunk_id)
+                metas.append({"source_type": source_type})
+        store.update_metadata(ids, metas)
+        updated += len(ids)
+    print(f"🗂️ Partições preenchidas: {updated} chunks")
+    return updated
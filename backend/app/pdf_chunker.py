@@ -1,48 +1,94 @@
-from langchain_community.document_loaders import PyPDFLoader
+from pypdf import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import multiprocessing
 import os
 
+# Páginas por tarefa quando o PDF é extraído em paralelo
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+
+def make_splitter(chunk_size=1000, chunk_overlap=200):
+    """Configurar divisor de texto"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", ".", "!", "?", " ", ""]
+    )
+
+
+def count_pages(pdf_path):
+    """Número de páginas (lê só a árvore de páginas, não o conteúdo)"""
+    return len(PdfReader(pdf_path).pages)
+
+
+def iter_page_chunks(pdf_path, start=0, end=None, chunk_size=1000, chunk_overlap=200):
+    """
+    Gera (texto, metadados) página a página no intervalo [start, end),
+    sem carregar o PDF inteiro em memória
+    """
+    reader = PdfReader(pdf_path)
+    splitter = make_splitter(chunk_size, chunk_overlap)
+    end = len(reader.pages) if end is None else min(end, len(reader.pages))
+
+    for page_no in range(start, end):
+        text = reader.pages[page_no].extract_text() or ""
+        for chunk in splitter.split_text(text):
+            yield chunk, {"page": page_no, "source": pdf_path}
+
+
+def extract_page_range(pdf_path, start, end, chunk_size=1000, chunk_overlap=200):
+    """Chunks de um intervalo de páginas (função de módulo, roda no pool de processos)"""
+    return list(iter_page_chunks(pdf_path, start, end, chunk_size, chunk_overlap))
+
+
+def page_ranges(num_pages, pages_per_task=None):
+    step = pages_per_task or PDF_PAGES_PER_TASK
+    return [(start, min(start + step, num_pages)) for start in range(0, num_pages, step)]
+
+
+def iter_pdf_chunks(pdf_path, chunk_size=1000, chunk_overlap=200, workers=0, pages_per_task=None):
+    """
+    Divide um PDF em chunks mantendo contexto, como um gerador.
+    Com `workers` > 1 os intervalos de páginas são extraídos num pool de processos,
+    com no máximo 2 intervalos por worker em memória, e entregues em ordem.
+    """
+    if workers <= 1:
+        yield from iter_page_chunks(pdf_path, 0, None, chunk_size, chunk_overlap)
+        return
+
+    ranges = deque(page_ranges(count_pages(pdf_path), pages_per_task))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        in_flight = deque()
+        while ranges or in_flight:
+            while ranges and len(in_flight) < workers * 2:
+                start, end = ranges.popleft()
+                in_flight.append(pool.submit(extract_page_range, pdf_path, start, end, chunk_size, chunk_overlap))
+            yield from in_flight.popleft().result()
+
+
 def chunk_pdf(pdf_path, chunk_size=1000, chunk_overlap=200):
     """
     Divide um PDF em chunks menores mantendo contexto
+    (versão em lista, mantida por compatibilidade; prefira iter_pdf_chunks)
     """
     try:
         print(f"📖 Carregando PDF: {pdf_path}")
-        
-        # Carregar PDF
-        loader = PyPDFLoader(pdf_path)
-        pages = loader.load()
-        
-        print(f"📄 Total de páginas: {len(pages)}")
-        
-        # Configurar divisor de texto
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", ".", "!", "?", " ", ""]
-        )
-        
-        # Dividir em chunks
-        chunks = text_splitter.split_documents(pages)
-        
-        print(f"✂️ PDF dividido em {len(chunks)} chunks")
-        
-        # Extrair texto e metadados
+
         texts = []
         metadatas = []
-        
-        for i, chunk in enumerate(chunks):
-            texts.append(chunk.page_content)
-            metadatas.append({
-                "chunk_id": i,
-                "page": chunk.metadata.get("page", 0),
-                "source": chunk.metadata.get("source", ""),
-                "total_chunks": len(chunks)
-            })
-        
+        for i, (text, meta) in enumerate(iter_pdf_chunks(pdf_path, chunk_size, chunk_overlap)):
+            texts.append(text)
+            metadatas.append({"chunk_id": i, **meta})
+
+        for meta in metadatas:
+            meta["total_chunks"] = len(texts)
+
+        print(f"✂️ PDF dividido em {len(texts)} chunks")
         return texts, metadatas
-        
+
     except Exception as e:
         print(f"❌ Erro ao dividir PDF: {e}")
         import traceback
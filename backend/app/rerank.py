@@ -0,0 +1,258 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .answer_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Busca mais candidatos do que vão para o prompt; o rerank escolhe os que entram
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+# Peso da relevância contra a redundância no MMR (1.0 = só relevância)
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Cross-encoder opcional (ex.: cross-encoder/mmarco-mMiniLMv2-L12-H384-v1); vazio = desligado
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+# Sobreposição do splitter (chunk_overlap=200): procura até esse tamanho ao juntar vizinhos
+MERGE_MAX_OVERLAP = int(os.getenv("MERGE_MAX_OVERLAP", "400"))
+MIN_OVERLAP = 20
+CHARS_PER_TOKEN = 4.0
+
+CANDIDATE_FIELDS = ("documents", "metadatas", "embeddings")
+
+
+def _column(res, key, nested):
+    """Coluna de um resultado do Chroma (query aninha por consulta; get não); None se ausente"""
+    value = res.get(key)
+    if value is None or len(value) == 0:
+        return None
+    return list(value[0] if nested else value)
+
+
+def from_results(res, pinned=False):
+    """
+    Converte um resultado do Chroma (de query ou get) em candidatos do rerank.
+    `pinned` (acertos do índice exato de códigos) ficam sempre na frente.
+    """
+    nested = bool(res["ids"]) and isinstance(res["ids"][0], list)
+    ids = res["ids"][0] if nested else res["ids"]
+    documents = _column(res, "documents", nested) or [""] * len(ids)
+    metadatas = _column(res, "metadatas", nested) or [{}] * len(ids)
+    embeddings = _column(res, "embeddings", nested) or [None] * len(ids)
+    return [
+        {
+            "ids": [i],
+            "document": d or "",
+            "metadata": dict(m or {}),
+            "embedding": None if e is None else np.asarray(e, dtype=np.float32),
+            "pinned": pinned,
+        }
+        for i, d, m, e in zip(ids, documents, metadatas, embeddings)
+    ]
+
+
+def _unit(vec):
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+def _overlap(a, b, max_chars=None):
+    """Tamanho do maior sufixo de `a` que é prefixo de `b` (a sobreposição do splitter)"""
+    tail = a[-(max_chars or MERGE_MAX_OVERLAP):]
+    for k in range(min(len(tail), len(b)), MIN_OVERLAP - 1, -1):
+        if tail.endswith(b[:k]):
+            return k
+    return 0
+
+
+def _position(meta):
+    """(arquivo/url, página, chunk) de um candidato; None se não dá para saber a vizinhança"""
+    source = meta.get("file_id") or meta.get("url") or meta.get("name")
+    chunk = meta.get("chunk_id")
+    if source is None or not isinstance(chunk, int):
+        return None
+    return source, meta.get("page"), chunk
+
+
+def merge_adjacent(candidates):
+    """
+    Junta chunks consecutivos do mesmo arquivo e página num só trecho, sem repetir
+    a sobreposição entre eles. O trecho fica na posição do melhor colocado.
+    """
+    groups = {}
+    for rank, cand in enumerate(candidates):
+        pos = _position(cand["metadata"])
+        if pos is not None:
+            groups.setdefault(pos[:2], []).append((pos[2], rank))
+
+    absorbed = {}  # rank do chunk -> rank do trecho que o recebeu
+    runs = []
+    for members in groups.values():
+        members.sort()
+        run = [members[0]]
+        for chunk, rank in members[1:]:
+            if chunk == run[-1][0] + 1:
+                run.append((chunk, rank))
+            else:
+                runs.append(run)
+                run = [(chunk, rank)]
+        runs.append(run)
+
+    merged = {}
+    for run in runs:
+        if len(run) < 2:
+            continue
+        head = min(rank for _, rank in run)
+        parts = [candidates[rank] for _, rank in run]
+        text, tokens = parts[0]["document"], parts[0]["metadata"].get("tokens")
+        for part in parts[1:]:
+            cut = _overlap(text, part["document"])
+            text += ("" if cut else "\n") + part["document"][cut:]
+            if isinstance(tokens, int) and isinstance(part["metadata"].get("tokens"), int):
+                tokens += part["metadata"]["tokens"] - int(cut / CHARS_PER_TOKEN)
+            else:
+                tokens = None
+        meta = dict(parts[0]["metadata"])
+        meta["chunk_id"] = f"{run[0][0]}-{run[-1][0]}"
+        if tokens is not None:
+            meta["tokens"] = tokens
+        else:
+            meta.pop("tokens", None)
+        embeddings = [p["embedding"] for p in parts if p["embedding"] is not None]
+        merged[head] = {
+            "ids": [i for p in parts for i in p["ids"]],
+            "document": text,
+            "metadata": meta,
+            "embedding": _unit(np.mean(embeddings, axis=0)) if embeddings else None,
+            "pinned": any(p["pinned"] for p in parts),
+        }
+        for _, rank in run:
+            absorbed[rank] = head
+
+    out = []
+    for rank, cand in enumerate(candidates):
+        head = absorbed.get(rank)
+        if head is None:
+            out.append(cand)
+        elif head == rank:
+            out.append(merged[head])
+    return out
+
+
+class CrossEncoderScorer:
+    """
+    Cross-encoder em CPU (sentence-transformers), carregado na primeira chamada,
+    com cache LRU de pontuações por (query normalizada, chunk)
+    """
+
+    def __init__(self, model_name=RERANK_MODEL, cache_size=RERANK_CACHE_SIZE):
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self._model = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def enabled(self):
+        return bool(self.model_name)
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                logger.info("🔁 Carregando cross-encoder %s", self.model_name)
+                self._model = CrossEncoder(self.model_name, device="cpu")
+            return self._model
+
+    def score(self, query, candidates):
+        """Relevância em [0, 1] (sigmoide do logit) de cada candidato para a query"""
+        norm = normalize_query(query)
+        keys = [(norm, ",".join(c["ids"])) for c in candidates]
+        scores = [None] * len(candidates)
+        with self._lock:
+            for idx, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[idx] = self._cache[key]
+
+        missing = [idx for idx, s in enumerate(scores) if s is None]
+        if missing:
+            logits = self._load().predict(
+                [(query, candidates[idx]["document"]) for idx in missing],
+                show_progress_bar=False,
+            )
+            with self._lock:
+                for idx, logit in zip(missing, np.atleast_1d(logits)):
+                    scores[idx] = float(1.0 / (1.0 + np.exp(-logit)))
+                    self._cache[keys[idx]] = scores[idx]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return scores
+
+
+def mmr(candidates, relevance, k, lam=None):
+    """
+    Maximal marginal relevance: escolhe, um a um, o candidato com maior
+    `lam * relevância - (1 - lam) * similaridade com os já escolhidos`.
+    Fixados vêm primeiro, na ordem dada. Sem embeddings, vale só a relevância.
+    """
+    lam = MMR_LAMBDA if lam is None else lam
+    selected = [i for i, c in enumerate(candidates) if c["pinned"]][:k]
+    remaining = [i for i, c in enumerate(candidates) if not c["pinned"]]
+
+    while remaining and len(selected) < k:
+        best, best_score = None, -np.inf
+        for i in remaining:
+            redundancy = 0.0
+            emb = candidates[i]["embedding"]
+            if emb is not None:
+                for j in selected:
+                    other = candidates[j]["embedding"]
+                    if other is not None:
+                        redundancy = max(redundancy, float(np.dot(emb, other)))
+            score = lam * relevance[i] - (1.0 - lam) * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+        remaining.remove(best)
+    return [candidates[i] for i in selected]
+
+
+def rerank(query, query_embedding, candidates, k, scorer=None):
+    """
+    Etapa pós-busca: remove repetidos, junta vizinhos do mesmo arquivo/página,
+    pontua (cosseno com a query ou cross-encoder) e diversifica com MMR.
+    Retorna até `k` trechos em ordem de prioridade para o prompt.
+    """
+    scorer = scorer or cross_encoder
+    seen, unique = set(), []
+    for cand in candidates:
+        if cand["ids"][0] in seen:
+            continue
+        seen.add(cand["ids"][0])
+        if cand["embedding"] is not None:
+            cand["embedding"] = _unit(cand["embedding"])
+        unique.append(cand)
+
+    merged = merge_adjacent(unique)
+
+    if query and scorer.enabled() and merged:
+        relevance = scorer.score(query, merged)
+    elif query_embedding is not None:
+        q = _unit(np.asarray(query_embedding, dtype=np.float32))
+        n = len(merged)
+        relevance = [
+            float(np.dot(q, c["embedding"])) if c["embedding"] is not None else 1.0 - idx / max(n, 1)
+            for idx, c in enumerate(merged)
+        ]
+    else:
+        relevance = [1.0 - idx / max(len(merged), 1) for idx in range(len(merged))]
+
+    selected = mmr(merged, relevance, k)
+    logger.info("🧮 Rerank: %d candidatos → %d trechos → %d escolhidos", len(unique), len(merged), len(selected))
+    return selected
+
+
+cross_encoder = CrossEncoderScorer()
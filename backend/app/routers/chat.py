@@ -1,127 +1,36 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
-import chromadb
-import os
+from typing import Optional
+import asyncio
+import json
+import logging
 import re
-from openai import OpenAI
-import tiktoken
+import time
+from ..deps import get_async_openai_client
+from ..vector_store import vector_store
+from ..llm_gate import llm_gate, LLMBusyError
+from ..answer_cache import answer_cache
+from ..embedding_service import embedding_batcher
+from ..code_index import code_index, extract_entities, CODE_INDEX_MIN_HITS
+from ..context_packer import pack_context, count_tokens_batch
+from ..metrics import span, observe, LLM_TOKENS, LLM_REQUESTS, QUERY_ROUTES
+from ..partitions import ROUTE_MIN_RESULTS, route_query, where_clause
+from ..snapshot import read_store
+from ..generations import generations
+from ..rerank import RERANK_CANDIDATES, CANDIDATE_FIELDS, from_results, rerank
+from ..sessions import (
+    Session, session_store, new_session_id, valid_session_id, fallback_summary, SESSION_SUMMARY_TOKENS,
+)
 
 router = APIRouter()
 
-# Configurações principais
-CHROMA_DIR = os.getenv("CHROMA_DIR", "./dados/chroma")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+logger = logging.getLogger(__name__)
 
-# Cliente OpenAI
-client = OpenAI(api_key=OPENAI_API_KEY)
+N_RESULTS = 5  # Trechos que vão para o prompt (após juntar vizinhos e MMR)
 
-# Token counter
-encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-
-def get_chroma_client():
-    """Conecta ao ChromaDB persistente"""
-    return chromadb.PersistentClient(path=CHROMA_DIR)
-
-def get_embedder():
-    """Carrega modelo de embedding"""
-    return SentenceTransformer("all-MiniLM-L6-v2")
-
-def truncate_text(text, max_tokens=800):
-    """Trunca texto para não exceder max_tokens"""
-    tokens = encoding.encode(text)
-    if len(tokens) > max_tokens:
-        truncated = encoding.decode(tokens[:max_tokens])
-        return truncated + "..."
-    return text
-
-def extract_codes(query):
-    """Extrai códigos/números da query (ex: 516-91, art 165)"""
-    codes = re.findall(r'\d{3}-\d{2}', query)
-    articles = re.findall(r'(?:art(?:igo)?\.?\s*)?(\d{1,3})', query, re.IGNORECASE)
-    return {"codes": codes, "articles": articles}
-
-class ChatRequest(BaseModel):
-    message: str
-
-@router.post("/chat")
-async def chat(req: ChatRequest):
-    """
-    Endpoint de chat com RAG melhorado
-    Sistema de prompt profissional para respostas como um professor
-    """
-    try:
-        query = req.message.strip()
-        
-        if not query:
-            raise HTTPException(status_code=400, detail="Mensagem vazia.")
-        
-        # 🔍 Conectar ao ChromaDB
-        chroma_client = get_chroma_client()
-        
-        # Tentar obter a coleção existente
-        try:
-            collection = chroma_client.get_collection("babix_docs")
-        except Exception as e:
-            print(f"❌ Coleção não encontrada: {e}")
-            return {
-                "response": "⚠️ Nenhum documento foi indexado ainda. Clique em 'Fazer Ingestão' primeiro."
-            }
-        
-        # Verificar quantos documentos estão indexados
-        count = collection.count()
-        print(f"📚 Documentos na coleção: {count}")
-        
-        if count == 0:
-            return {
-                "response": "⚠️ Coleção vazia. Faça a ingestão de PDFs primeiro."
-            }
-        
-        # 🔍 Detectar códigos/artigos
-        entities = extract_codes(query)
-        print(f"🔢 Entidades detectadas: {entities}")
-        
-        # Enriquecer query com termos relacionados
-        query_enriched = query
-        if entities["codes"]:
-            query_enriched += " " + " ".join([f"código {code} infração" for code in entities["codes"]])
-        if entities["articles"]:
-            query_enriched += " " + " ".join([f"artigo {art} CTB" for art in entities["articles"]])
-        
-        # 🔍 Buscar documentos similares (aumentado para 5 para melhor contexto)
-        embedder = get_embedder()
-        query_embedding = embedder.encode(query_enriched)
-        
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=5  # Aumentado de 3 para 5
-        )
-        
-        # Verificar se encontrou resultados
-        if not results or not results.get("documents") or len(results["documents"][0]) == 0:
-            print("⚠️ Nenhum documento similar encontrado")
-            return {
-                "response": "Desculpe, não encontrei informações específicas sobre sua pergunta nos documentos indexados. Você poderia reformular ou ser mais específico?"
-            }
-        
-        # 📄 Extrair contextos e truncar
-        documents = results["documents"][0]
-        metadatas = results["metadatas"][0] if results.get("metadatas") else []
-        
-        # Truncar cada documento
-        truncated_docs = [truncate_text(doc, max_tokens=600) for doc in documents]
-        context = "\n\n─────────────────────────\n\n".join(truncated_docs)
-        
-        # Verificar tamanho do contexto
-        context_tokens = len(encoding.encode(context))
-        print(f"📊 Tokens do contexto: {context_tokens}")
-        
-        if context_tokens > 3000:
-            context = truncate_text(context, max_tokens=2500)
-            print("⚠️ Contexto truncado para 2500 tokens")
-        
-        # 🎓 PROMPT MELHORADO - Como um Professor
-        system_message = """Você é a Babix, uma especialista em legislação de trânsito brasileiro com mais de 10 anos de experiência.
+# 🎓 PROMPT MELHORADO - Como um Professor
+SYSTEM_MESSAGE = """Você é a Babix, uma especialista em legislação de trânsito brasileiro com mais de 10 anos de experiência.
 
 # SUA PERSONALIDADE:
 - Você é uma PROFESSORA dedicada, não apenas um buscador de textos
@@ -163,7 +72,13 @@ async def chat(req: ChatRequest):
 
 Lembre-se: Você é uma PROFESSORA, não uma copiadora de textos!"""
 
-        user_message = f"""# DOCUMENTOS RELEVANTES:
+SUMMARY_MESSAGE = f"""Você resume conversas entre um usuário e a Babix, especialista em legislação de trânsito.
+Atualize o resumo com os novos turnos em no máximo {int(SESSION_SUMMARY_TOKENS * 0.6)} palavras, em português.
+Mantenha o assunto, os artigos, códigos de infração, valores e situações citados e o que o usuário já sabe.
+Responda só com o resumo."""
+
+def build_user_message(context, query):
+    return f"""# DOCUMENTOS RELEVANTES:
 
 {context}
 
@@ -182,47 +97,468 @@ Agora, como uma professora especialista em trânsito:
 4. Se os documentos NÃO responderem à pergunta, diga claramente
 
 Sua resposta:"""
-        
-        # 🤖 Chamar GPT com prompt melhorado
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.3,  # Baixo para mais precisão
-            max_tokens=600,  # Aumentado para respostas mais completas
-            top_p=0.9
-        )
+
+def extract_codes(query):
+    """Extrai códigos/números da query (ex: 516-91, art 165)"""
+    codes = re.findall(r'\d{3}-\d{2}', query)
+    articles = re.findall(r'(?:art(?:igo)?\.?\s*)?(\d{1,3})', query, re.IGNORECASE)
+    return {"codes": codes, "articles": articles}
+
+def enrich_query(query, entities):
+    """Enriquecer query com termos relacionados"""
+    query_enriched = query
+    if entities["codes"]:
+        query_enriched += " " + " ".join([f"código {code} infração" for code in entities["codes"]])
+    if entities["articles"]:
+        query_enriched += " " + " ".join([f"artigo {art} CTB" for art in entities["articles"]])
+    return query_enriched
+
+async def retrieve_context(query):
+    """
+    Recuperação do RAG sem bloquear o event loop.
+    Códigos de infração/artigos vão primeiro ao índice exato (numa thread: confere o
+    arquivo no disco). Só códigos de infração, que são inequívocos, podem pular a busca
+    vetorial; senão o embedding da query entra no micro-batch do serviço de embeddings
+    e a busca no Chroma roda numa thread, restrita às partições da pergunta
+    (códigos → MBFT, artigos → CTB...), com os acertos do índice somados aos candidatos.
+    Retorna um dict com `context`/`metadatas` ou com `response` quando não há o que buscar.
+    """
+    # 🔀 Segue a geração viva do índice (troca blue/green feita pela ingestão)
+    generations.sync()
+
+    # 🔍 Detectar códigos/artigos
+    entities = extract_codes(query)
+    logger.info("🔢 Entidades detectadas: %s", entities)
+
+    # 🎯 Índice exato (O(1) por código/artigo)
+    exact = extract_entities(query)
+    with span("chat", "code_index"):
+        coded, articles = await asyncio.to_thread(exact_lookup, exact)
+    if len(coded) >= CODE_INDEX_MIN_HITS:
+        logger.info("🎯 %d chunks pelo código de infração, busca vetorial dispensada", len(coded))
+        return await asyncio.to_thread(search_context, None, coded[:N_RESULTS], query)
+
+    partitions = route_query(query, exact)
+    query_enriched = enrich_query(query, entities)
+    with span("chat", "embed"):
+        query_embedding = await embedding_batcher.encode(query_enriched)
+    return await asyncio.to_thread(search_context, query_embedding, coded, query, partitions, articles)
+
+def exact_lookup(exact):
+    """
+    Acertos do índice exato: (chunks com os códigos de infração, caput dos artigos citados).
+    Números de artigo se repetem entre o CTB e as resoluções, então o caput entra
+    como candidato comum do rerank, não fixado.
+    """
+    coded, _ = code_index.lookup(exact["codes"])
+    strong, _ = code_index.lookup(exact["codes"], exact["articles"])
+    seen = set(coded)
+    return coded, [i for i in strong if i not in seen]
+
+def fetch_by_ids(ids, store=None):
+    """Busca chunks por id mantendo a ordem pedida (formato igual ao do query, com embeddings)"""
+    if not ids:
+        return {"ids": [[]], "documents": [[]], "metadatas": [[]], "embeddings": [[]]}
+    got = (store or vector_store).get(ids=ids, include=CANDIDATE_FIELDS)
+    embeddings = got.get("embeddings")
+    if embeddings is None:
+        embeddings = [None] * len(got["ids"])
+    by_id = {i: (d, m, e) for i, d, m, e in zip(got["ids"], got["documents"], got["metadatas"], embeddings)}
+    ordered = [i for i in ids if i in by_id]
+    return {
+        "ids": [ordered],
+        "documents": [[by_id[i][0] for i in ordered]],
+        "metadatas": [[by_id[i][1] for i in ordered]],
+        "embeddings": [[by_id[i][2] for i in ordered]],
+    }
+
+def routed_query(query_embedding, partitions=(), store=None):
+    """
+    Busca vetorial só nas partições pedidas; se vierem menos de ROUTE_MIN_RESULTS
+    candidatos (partição vazia ou pergunta mal roteada), completa com a coleção inteira
+    """
+    store = store or vector_store
+    if not partitions:
+        with span("chat", "vector_query"):
+            return from_results(store.query(query_embedding, n_results=RERANK_CANDIDATES, include=CANDIDATE_FIELDS))
+
+    route = "+".join(partitions)
+    with span("chat", "vector_query"):
+        found = from_results(store.query(
+            query_embedding, n_results=RERANK_CANDIDATES, where=where_clause(partitions), include=CANDIDATE_FIELDS,
+        ))
+    if len(found) >= ROUTE_MIN_RESULTS:
+        QUERY_ROUTES.labels(route, "hit").inc()
+        logger.info("🧭 Busca na partição %s: %d candidatos", route, len(found))
+        return found
+
+    QUERY_ROUTES.labels(route, "fallback").inc()
+    logger.info("🧭 Partição %s com %d candidatos, completando com a busca global", route, len(found))
+    with span("chat", "vector_query_fallback"):
+        everything = from_results(store.query(
+            query_embedding, n_results=RERANK_CANDIDATES, include=CANDIDATE_FIELDS,
+        ))
+    return found + everything
+
+def search_context(query_embedding, exact_ids=(), query=None, partitions=(), related_ids=()):
+    """
+    Etapa síncrona (disco/CPU): busca RERANK_CANDIDATES candidatos no Chroma
+    (nas partições da pergunta, com busca global de reserva), junta vizinhos do
+    mesmo arquivo/página, rerankeia/diversifica (MMR) e monta o contexto com os
+    N_RESULTS melhores trechos dentro do orçamento de tokens.
+    `exact_ids` (códigos de infração) ficam fixados na frente; `related_ids`
+    (caput dos artigos) competem com os resultados da busca vetorial.
+    Lê do snapshot mapeado em memória quando publicado (SNAPSHOT_SERVING), senão do Chroma.
+    """
+    store = read_store()
+    # Verificar quantos documentos estão indexados
+    count = store.count()
+    logger.info("📚 Documentos na coleção: %d", count)
+
+    if count == 0:
+        return {"response": "⚠️ Coleção vazia. Faça a ingestão de PDFs primeiro."}
+
+    with span("chat", "fetch_ids"):
+        candidates = from_results(fetch_by_ids(list(exact_ids), store), pinned=True)
+        if related_ids:
+            candidates += from_results(fetch_by_ids(list(related_ids), store))
+    if query_embedding is not None:
+        # 🔍 Buscar documentos similares (mais candidatos do que cabem no prompt)
+        candidates += routed_query(query_embedding, partitions, store)
+
+    # Verificar se encontrou resultados
+    if not candidates:
+        logger.warning("⚠️ Nenhum documento similar encontrado")
+        return {
+            "response": "Desculpe, não encontrei informações específicas sobre sua pergunta nos documentos indexados. Você poderia reformular ou ser mais específico?"
+        }
+
+    # 🧮 Vizinhos juntados, rerank e MMR: menos trechos repetidos no prompt
+    with span("chat", "rerank"):
+        selected = rerank(query, query_embedding, candidates, N_RESULTS)
+
+    # 📄 Extrair contextos
+    documents = [c["document"] for c in selected]
+    metadatas = [c["metadata"] for c in selected]
+
+    # Montar o contexto dentro do orçamento de tokens (contagem vem da ingestão)
+    with span("chat", "pack_context"):
+        context, context_tokens, used = pack_context(documents, metadatas)
+    logger.info("📊 Tokens do contexto: ~%d (%d/%d documentos)", context_tokens, len(used), len(documents))
+
+    return {
+        "context": context,
+        "metadatas": [metadatas[i] for i in used if i < len(metadatas)],
+        "ids": [i for c in selected for i in c["ids"]],
+        "query_embedding": query_embedding,
+        "collection_state": (store.version(), count),
+    }
+
+def list_sources(metadatas):
+    """Fontes únicas (em ordem) dos documentos usados"""
+    sources = []
+    for meta in metadatas:
+        if meta:
+            name = meta.get("name", "Documento")
+            chunk = meta.get("chunk_id", "")
+            page = meta.get("page", "")
+
+            if chunk != "":
+                sources.append(f"{name} (chunk {chunk}, pág. {page})")
+            else:
+                sources.append(name)
+
+            # Mesmo trecho presente em outros arquivos/páginas (gravado uma vez só)
+            try:
+                sources.extend(n for n in json.loads(meta.get("sources") or "[]") if n != name)
+            except ValueError:
+                pass
+
+    # Remover duplicatas mantendo ordem
+    return list(dict.fromkeys(sources))[:3]
+
+def format_sources(metadatas):
+    """Adicionar fontes de forma mais clara"""
+    unique_sources = list_sources(metadatas)
+    return f"\n\n📚 **Fontes consultadas:** {', '.join(unique_sources)}" if unique_sources else ""
+
+def llm_request(retrieved, query, history=()):
+    """
+    Parâmetros da chamada ao GPT (compartilhados pelo chat normal e pelo streaming).
+    `history` são as mensagens da sessão (resumo + turnos recentes), de tamanho limitado.
+    """
+    return dict(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            *history,
+            {"role": "user", "content": build_user_message(retrieved["context"], query)}
+        ],
+        temperature=0.3,  # Baixo para mais precisão
+        max_tokens=600,  # Aumentado para respostas mais completas
+        top_p=0.9
+    )
+
+def record_llm_usage(mode, params, usage=None, answer=""):
+    """
+    Contadores de tokens do LLM: usa o `usage` da API; sem ele (stream sem
+    include_usage, proxies compatíveis) conta com o tokenizer
+    """
+    if usage is not None:
+        sent, received = usage.prompt_tokens, usage.completion_tokens
+    else:
+        counts = count_tokens_batch([m["content"] for m in params["messages"]] + [answer])
+        sent, received = sum(counts[:-1]), counts[-1]
+    LLM_TOKENS.labels("sent").inc(sent)
+    LLM_TOKENS.labels("received").inc(received)
+    LLM_REQUESTS.labels(mode, "ok").inc()
+
+def sse(event, data):
+    """Formata um evento server-sent events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None  # omitido: começa uma sessão nova (id volta na resposta)
+
+def open_session(session_id):
+    """Sessão pedida pelo cliente (nova se não existir ou tiver expirado)"""
+    if session_id is None:
+        return Session(new_session_id())
+    if not valid_session_id(session_id):
+        raise HTTPException(status_code=400, detail="session_id inválido.")
+    return session_store.get(session_id) or Session(session_id)
+
+async def summarize_turns(previous, turns):
+    """Novo resumo da sessão (LLM); sem vaga no LLM ou com erro, cai no resumo extrativo"""
+    lines = [f"Resumo anterior: {previous}"] if previous else []
+    for turn in turns:
+        lines.append(f"Usuário: {turn['user']}\nBabix: {turn['assistant']}")
+    params = dict(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": SUMMARY_MESSAGE},
+            {"role": "user", "content": "\n\n".join(lines)},
+        ],
+        temperature=0.0,
+        max_tokens=SESSION_SUMMARY_TOKENS,
+    )
+    try:
+        client = get_async_openai_client()
+        async with llm_gate.slot():
+            try:
+                with span("chat", "summarize"):
+                    response = await client.chat.completions.create(**params)
+            except Exception:
+                LLM_REQUESTS.labels("summary", "error").inc()
+                raise
+        summary = (response.choices[0].message.content or "").strip()
+        record_llm_usage("summary", params, response.usage, summary)
+        if summary:
+            return summary
+    except LLMBusyError:
+        LLM_REQUESTS.labels("summary", "rejected").inc()
+    except Exception as e:
+        logger.warning("⚠️ Resumo da sessão sem LLM: %s", e)
+    return fallback_summary(previous, turns)
+
+async def compact_session(session_id):
+    """Leva ao resumo os turnos que passaram do limite (depois da resposta, fora do caminho do usuário)"""
+    session = await asyncio.to_thread(session_store.get, session_id)
+    if session is None:
+        return
+    old = session.overflow()
+    if not old:
+        return
+    summary = await summarize_turns(session.summary, old)
+    # relê: outra pergunta da mesma sessão pode ter terminado enquanto o resumo era gerado
+    session = await asyncio.to_thread(session_store.get, session_id) or session
+    if session.turns[:len(old)] == old:
+        session.fold(len(old), summary)
+        await asyncio.to_thread(session_store.put, session)
+        logger.info("🗜️ Sessão %s: %d turnos resumidos, %d recentes", session_id, session.summarized, len(session.turns))
+
+async def record_turn(session, query, answer):
+    """Grava o turno (sessões em disco: I/O numa thread, fora do event loop)"""
+    session.add_turn(query, answer)
+    await asyncio.to_thread(session_store.put, session)
+
+async def start_turn(req):
+    """Valida a pergunta e abre a sessão (leitura do store numa thread)"""
+    query = req.message.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Mensagem vazia.")
+    return query, await asyncio.to_thread(open_session, req.session_id)
+
+def cache_lookup(query, session, retrieved):
+    """Cache de respostas só vale para perguntas sem histórico (a resposta depende da conversa)"""
+    if session.has_history():
+        return None
+    with span("chat", "cache_lookup"):
+        answer_cache.sync_collection(retrieved["collection_state"])
+        return answer_cache.get(query, retrieved["ids"], retrieved["query_embedding"])
+
+@router.post("/chat")
+async def chat(req: ChatRequest, background_tasks: BackgroundTasks):
+    """
+    Endpoint de chat com RAG melhorado
+    Sistema de prompt profissional para respostas como um professor.
+    Com `session_id`, a pergunta é respondida no contexto da conversa (resumo +
+    turnos recentes); a compactação do histórico roda depois da resposta.
+    """
+    try:
+        query, session = await start_turn(req)
+
+        # 🔍 Embedding (micro-batch) + Chroma fora do event loop; a busca considera as perguntas anteriores
+        retrieved = await retrieve_context(session.retrieval_query(query))
+        if "response" in retrieved:
+            return {"response": retrieved["response"], "session_id": session.id}
+
+        # ⚡ Cache de respostas (exato por query+chunks, ou semântico por embedding)
+        cacheable = not session.has_history()
+        cached = cache_lookup(query, session, retrieved)
+        if cached is not None:
+            logger.info("⚡ Resposta servida do cache")
+            await record_turn(session, query, cached)
+            return {"response": cached + format_sources(retrieved["metadatas"]), "session_id": session.id}
+
+        # 🤖 Chamar GPT com prompt melhorado (limite de chamadas simultâneas)
+        client = get_async_openai_client()
+        params = llm_request(retrieved, query, session.prompt_messages())
+        waiting = time.perf_counter()
+        async with llm_gate.slot():
+            observe("chat", "llm_wait", time.perf_counter() - waiting)
+            try:
+                with span("chat", "llm"):
+                    response = await client.chat.completions.create(**params)
+            except Exception:
+                LLM_REQUESTS.labels("chat", "error").inc()
+                raise
         
         answer = response.choices[0].message.content
-        
-        # Adicionar fontes de forma mais clara
-        sources = []
-        for meta in metadatas:
-            if meta:
-                name = meta.get("name", "Documento")
-                chunk = meta.get("chunk_id", "")
-                page = meta.get("page", "")
-                
-                if chunk != "":
-                    sources.append(f"{name} (chunk {chunk}, pág. {page})")
-                else:
-                    sources.append(name)
-        
-        # Remover duplicatas mantendo ordem
-        unique_sources = list(dict.fromkeys(sources))
-        sources_text = f"\n\n📚 **Fontes consultadas:** {', '.join(unique_sources[:3])}" if unique_sources else ""
+        record_llm_usage("chat", params, response.usage, answer or "")
+        if cacheable:
+            answer_cache.put(query, retrieved["ids"], retrieved["query_embedding"], answer)
+        await record_turn(session, query, answer or "")
+        background_tasks.add_task(compact_session, session.id)
         
         return {
-            "response": answer + sources_text
+            "response": answer + format_sources(retrieved["metadatas"]),
+            "session_id": session.id,
         }
-        
+
+    except LLMBusyError:
+        LLM_REQUESTS.labels("chat", "rejected").inc()
+        raise HTTPException(
+            status_code=503,
+            detail="Muitas perguntas ao mesmo tempo. Tente novamente em instantes.",
+            headers={"Retry-After": "2"}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Erro no chat: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Erro no chat: %s", e)
         
         return {
             "response": "Desculpe, tivemos um erro ao processar sua pergunta. Por favor, tente novamente ou reformule sua pergunta."
         }
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Variante em streaming (SSE) do chat: envia primeiro a sessão (`session`), os
+    metadados da recuperação e as fontes (evento `meta`), depois os tokens do GPT
+    conforme chegam (`token`) e por fim `done`. Erros chegam como evento `error`.
+    """
+    query, session = await start_turn(req)
+
+    async def events():
+        try:
+            yield sse("session", {"session_id": session.id})
+            retrieved = await retrieve_context(session.retrieval_query(query))
+            if "response" in retrieved:
+                yield sse("token", {"text": retrieved["response"]})
+                yield sse("done", {})
+                return
+
+            cacheable = not session.has_history()
+            cached = cache_lookup(query, session, retrieved)
+
+            yield sse("meta", {
+                "sources": list_sources(retrieved["metadatas"]),
+                "sources_text": format_sources(retrieved["metadatas"]),
+                "documents": len(retrieved["metadatas"]),
+                "cached": cached is not None,
+                "session_id": session.id,
+            })
+
+            if cached is not None:
+                logger.info("⚡ Resposta servida do cache")
+                await record_turn(session, query, cached)
+                yield sse("token", {"text": cached})
+                yield sse("done", {})
+                return
+
+            # 🤖 Tokens do GPT repassados conforme chegam
+            client = get_async_openai_client()
+            params = llm_request(retrieved, query, session.prompt_messages())
+            parts, usage = [], None
+            waiting = time.perf_counter()
+            async with llm_gate.slot():
+                started = time.perf_counter()
+                observe("chat", "llm_wait", started - waiting)
+                try:
+                    stream = await client.chat.completions.create(
+                        **params, stream=True, stream_options={"include_usage": True}
+                    )
+                    async for chunk in stream:
+                        usage = chunk.usage or usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if not parts:
+                                observe("chat", "llm_first_token", time.perf_counter() - started)
+                            parts.append(delta)
+                            yield sse("token", {"text": delta})
+                except Exception:
+                    LLM_REQUESTS.labels("stream", "error").inc()
+                    raise
+                observe("chat", "llm", time.perf_counter() - started)
+
+            answer = "".join(parts)
+            record_llm_usage("stream", params, usage, answer)
+            if cacheable:
+                answer_cache.put(query, retrieved["ids"], retrieved["query_embedding"], answer)
+            await record_turn(session, query, answer)
+            yield sse("done", {})
+            # cliente já recebeu `done`: resumir o histórico não atrasa a resposta
+            await compact_session(session.id)
+
+        except LLMBusyError:
+            LLM_REQUESTS.labels("stream", "rejected").inc()
+            yield sse("error", {"status": 503, "message": "Muitas perguntas ao mesmo tempo. Tente novamente em instantes."})
+        except Exception as e:
+            logger.exception("❌ Erro no chat (stream): %s", e)
+            yield sse("error", {"status": 500, "message": "Desculpe, tivemos um erro ao processar sua pergunta. Por favor, tente novamente ou reformule sua pergunta."})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/chat/sessions/{session_id}")
+def get_session(session_id: str):
+    """Resumo e turnos recentes de uma sessão"""
+    session = session_store.get(session_id) if valid_session_id(session_id) else None
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada.")
+    return session.to_dict()
+
+@router.delete("/chat/sessions/{session_id}")
+def delete_session(session_id: str):
+    """Esquece a conversa (a próxima pergunta com esse id começa do zero)"""
+    if not valid_session_id(session_id) or not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Sessão não encontrada.")
+    return {"status": "ok"}
@@ -1,42 +1,43 @@
-from fastapi import APIRouter
-import chromadb
-import os
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from ..deps import CHROMA_DIR
+from ..vector_store import vector_store
+from ..dedup import chunk_registry
+from ..collection_stats import collection_stats
+from ..answer_cache import answer_cache
+from ..embedding_service import embedding_batcher
+from ..sessions import session_store
+from ..snapshot import snapshot_index
+from ..generations import generations
 
 router = APIRouter()
 
-CHROMA_DIR = os.getenv("CHROMA_DIR", "./dados/chroma")
-
 @router.get("/debug")
 def debug_collection():
     """
     Debug da coleção ChromaDB
     Mostra quantos documentos, de quais arquivos, etc.
+    Contagens por arquivo vêm das estatísticas mantidas na ingestão (lista completa
+    e paginada em /api/debug/files)
     """
     try:
-        client = chromadb.PersistentClient(path=CHROMA_DIR)
-        collection = client.get_collection("babix_docs")
-        
+        generations.sync()
         # Contar total
-        total = collection.count()
-        
-        # Pegar amostra de metadados
-        sample = collection.get(limit=100)
+        total = vector_store.count()
         
-        # Agrupar por arquivo
-        files_count = {}
-        for meta in sample["metadatas"]:
-            if meta:
-                filename = meta.get("name", "unknown")
-                files_count[filename] = files_count.get(filename, 0) + 1
+        # Primeira página de arquivos (chunks por arquivo)
+        files, _ = collection_stats.list_sources(limit=100)
+        files_count = {f["name"] or f["source"]: f["chunks"] for f in files}
         
-        # Verificar se tem MBFT
-        has_mbft = any("mbft" in f.lower() for f in files_count.keys())
+        # Pequena amostra de metadados
+        sample = vector_store.get(limit=5, include=("metadatas",))
         
         return {
             "total_documents": total,
+            "files_total": collection_stats.summary()["sources"],
             "files_indexed": files_count,
-            "has_mbft": has_mbft,
-            "sample_metadata": sample["metadatas"][:5]
+            "has_mbft": collection_stats.has_name_like("mbft"),
+            "sample_metadata": sample["metadatas"]
         }
         
     except Exception as e:
@@ -44,3 +45,65 @@ def debug_collection():
             "error": str(e),
             "chroma_dir": CHROMA_DIR
         }
+
+
+@router.get("/debug/store")
+def debug_store():
+    """Coleção em uso (geração viva), contagem, versão, parâmetros HNSW e deduplicação de chunks"""
+    generations.sync()
+    return {**vector_store.stats(), "dedup": chunk_registry.stats(), "inventory": collection_stats.summary()}
+
+
+@router.get("/debug/files")
+def debug_files(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    kind: Optional[str] = Query(None, pattern="^(drive|web)$"),
+):
+    """
+    Inventário paginado por cursor: chunks, páginas, tokens, data de ingestão e
+    modelo de cada arquivo/URL. Passe `next_cursor` da resposta para a próxima página.
+    """
+    items, next_cursor = collection_stats.list_sources(cursor, limit, kind)
+    return {"items": items, "next_cursor": next_cursor, "summary": collection_stats.summary()}
+
+
+@router.get("/debug/file")
+def debug_file(source: str):
+    """Estatísticas de uma fonte (id do arquivo no Drive ou URL)"""
+    entry = collection_stats.get_source(source)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Fonte não encontrada.")
+    return entry
+
+
+@router.get("/debug/cache")
+def debug_cache():
+    """Contadores do cache de respostas do chat"""
+    return answer_cache.stats()
+
+
+@router.get("/debug/sessions")
+def debug_sessions():
+    """Backend, quantidade e despejos das sessões de chat"""
+    return session_store.stats()
+
+
+@router.get("/debug/snapshot")
+def debug_snapshot():
+    """Snapshot mapeado em memória que este worker usa no chat (e quantas trocas já fez)"""
+    snapshot_index.current()
+    return snapshot_index.stats()
+
+
+@router.get("/debug/generations")
+def debug_generations():
+    """Gerações do índice (viva, anterior para rollback, sombras) e trocas vistas por este worker"""
+    generations.sync()
+    return generations.describe()
+
+
+@router.get("/debug/embeddings")
+def debug_embeddings():
+    """Métricas do micro-batching de embeddings das queries"""
+    return embedding_batcher.stats()
@@ -1,24 +1,14 @@
-from fastapi import APIRouter, BackgroundTasks
-from ..drive_sync import baixar_arquivos_drive
+from fastapi import APIRouter, Response
+from .ingest import submit_drive_job
 
 router = APIRouter()
 
 @router.post("/ingest_drive")
-def ingest_from_drive(background_tasks: BackgroundTasks):
+def ingest_from_drive(response: Response, force: bool = False, allow_empty: bool = False):
     """
     Faz o download e indexação dos arquivos do Google Drive.
-    Executa em background para não travar a API.
+    Executa como job em background para não travar a API.
+    Sincronização incremental; use ?force=true para reindexar tudo.
+    Se a pasta vier vazia, os arquivos já indexados só saem com ?allow_empty=true.
     """
-    try:
-        # Executa a ingestão em background (não bloqueia)
-        background_tasks.add_task(baixar_arquivos_drive)
-        
-        return {
-            "status": "processing",
-            "message": "Ingestão iniciada em background. Verifique os logs para progresso."
-        }
-    except Exception as e:
-        return {
-            "status": "error",
-            "detail": str(e)
-        }
+    return submit_drive_job(response, force, allow_empty)
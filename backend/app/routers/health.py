@@ -1,7 +1,19 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from .. import deps
 
 router = APIRouter()
 
 @router.get("/health")
+@router.get("/live")
 def health():
-    return {"status": "ok"}
+    """Probe de vida: responde assim que o processo sobe, sem esperar o aquecimento"""
+    return {"status": "ok", "role": deps.BABIX_ROLE}
+
+@router.get("/ready")
+def ready():
+    """Probe de prontidão: 503 até o aquecimento dos recursos terminar"""
+    state = deps.readiness()
+    if not state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **state})
+    return {"status": "ready", **state}
@@ -0,0 +1,77 @@
+from fastapi import APIRouter, HTTPException, Response
+from ..jobs import job_manager, JobsBusy
+from ..generations import generations
+from ..snapshot import SNAPSHOT_SERVING, publish_snapshot_job
+
+router = APIRouter()
+
+
+def schedule_snapshot():
+    """Publica o snapshot da geração que entrou no ar como job (fora da requisição); id do job ou None"""
+    if not SNAPSHOT_SERVING:
+        return None
+    job, _ = job_manager.submit("snapshot", publish_snapshot_job)
+    return job.id
+
+
+@router.post("/index/rebuild")
+def rebuild_index(response: Response, web: bool = True, promote: bool = True):
+    """
+    Reconstrução completa sem indisponibilidade: reingere o Drive (e, com `web`, as páginas
+    já indexadas) numa geração sombra, valida (contagem e buscas de fumaça) e, com `promote`,
+    troca o apelido para ela. O chat segue na geração viva até a troca.
+    Roda como job de ingestão do Drive (exclui a sincronização incremental); acompanhe em /api/jobs/{job_id}.
+    """
+    # googleapiclient/pypdf/langchain só entram no processo quando há ingestão
+    from ..generations import rebuild_job
+    job, created = job_manager.submit("drive", rebuild_job, web=web, promote=promote)
+    response.status_code = 202 if created else 200
+    return {
+        "status": job.status,
+        "job_id": job.id,
+        "created": created,
+        "message": "Reconstrução iniciada." if created else "Já existe uma ingestão do Drive em andamento.",
+        "status_url": f"/api/jobs/{job.id}",
+    }
+
+
+@router.get("/index/generations")
+def list_generations():
+    """Geração viva, anterior (alvo do rollback) e as demais, com o relatório de validação"""
+    return generations.describe()
+
+
+@router.post("/index/generations/{name}/promote")
+def promote_generation(name: str):
+    """
+    Põe no ar uma geração validada (reconstrução feita com promote=false) ou aposentada.
+    Recusada (409) com jobs de ingestão em andamento; o snapshot novo é publicado em background.
+    """
+    try:
+        previous = generations.promote(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Geração não encontrada.")
+    except (ValueError, JobsBusy) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "ok", "live": name, "previous": previous, "snapshot_job": schedule_snapshot()}
+
+
+@router.post("/index/rollback")
+def rollback_generation():
+    """Volta instantaneamente para a geração anterior (só troca o apelido); 409 com jobs em andamento"""
+    try:
+        live = generations.rollback()
+    except (ValueError, JobsBusy) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "ok", "live": live, "previous": generations.state().get("previous"),
+            "snapshot_job": schedule_snapshot()}
+
+
+@router.post("/index/gc")
+def gc_generations():
+    """Apaga gerações reprovadas e as aposentadas além de GENERATIONS_KEEP; 409 com jobs em andamento"""
+    try:
+        removed = generations.gc()
+    except JobsBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "ok", "removed": removed}
@@ -1,12 +1,28 @@
-from fastapi import APIRouter
-from ..drive_sync import baixar_arquivos_drive
+from fastapi import APIRouter, Response
+from ..jobs import job_manager
 
 router = APIRouter()
 
+
+def submit_drive_job(response: Response, force: bool, allow_empty: bool = False):
+    """Agenda a sincronização do Drive (um job por vez; repetir devolve o job em andamento)"""
+    # googleapiclient/pypdf/langchain só entram no processo quando há ingestão
+    from ..drive_sync import sync_drive_job
+    job, created = job_manager.submit("drive", sync_drive_job, force=force, allow_empty=allow_empty)
+    response.status_code = 202 if created else 200
+    return {
+        "status": job.status,
+        "job_id": job.id,
+        "created": created,
+        "message": "Ingestão iniciada." if created else "Já existe uma ingestão do Drive em andamento.",
+        "status_url": f"/api/jobs/{job.id}",
+    }
+
+
 @router.post("/ingest")
-async def ingest_from_drive():
-    try:
-        baixar_arquivos_drive()
-        return {"message": "ok", "source": "drive"}
-    except Exception as e:
-        return {"error": str(e)}
+def ingest_from_drive(response: Response, force: bool = False, allow_empty: bool = False):
+    """
+    Sincronização incremental do Drive como job; acompanhe em /api/jobs/{job_id}.
+    Listagem vazia não esvazia o índice sem ?allow_empty=true (ou force).
+    """
+    return submit_drive_job(response, force, allow_empty)
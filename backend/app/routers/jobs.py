@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException
+from ..jobs import job_manager
+
+router = APIRouter()
+
+
+@router.get("/jobs")
+def list_jobs():
+    """Jobs de ingestão recentes (mais novos primeiro)"""
+    return {"jobs": job_manager.list()}
+
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Estado, progresso (arquivos/chunks), throughput e ETA de um job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return job.to_dict()
+
+
+@router.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Pede o cancelamento; o job para no próximo arquivo/nível e mantém o que já concluiu"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return job.to_dict()
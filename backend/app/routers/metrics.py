@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Response
+from ..metrics import CONTENT_TYPE_LATEST, render
+
+router = APIRouter()
+
+@router.get("/metrics")
+def metrics():
+    """Histogramas por etapa e contadores (tokens, cache, chunks) no formato do Prometheus"""
+    return Response(content=render(), media_type=CONTENT_TYPE_LATEST)
@@ -1,33 +1,24 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import logging
+from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel
-from bs4 import BeautifulSoup
-import requests
-from sentence_transformers import SentenceTransformer
-from chromadb import Client
-from chromadb.config import Settings
-import os
+from typing import List, Optional
+from ..jobs import job_manager
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
 
-CHROMA_DIR = os.getenv("CHROMA_DIR", "./dados/chroma")
-_embedder = None
+router = APIRouter()
 
 
 class WebIngestRequest(BaseModel):
     url: str
 
 
-def get_embedder():
-    global _embedder
-    if _embedder is None:
-        _embedder = SentenceTransformer("all-MiniLM-L6-v2")
-    return _embedder
-
-
-def get_chroma():
-    os.makedirs(CHROMA_DIR, exist_ok=True)
-    client = Client(Settings(chroma_db_impl="duckdb+parquet", persist_directory=CHROMA_DIR))
-    return client.get_or_create_collection("babix_docs")
+class WebCrawlRequest(BaseModel):
+    seeds: List[str]
+    depth: int = 1
+    allowed_domains: Optional[List[str]] = None
+    max_pages: Optional[int] = None
 
 
 @router.post("/ingest_web")
@@ -36,52 +27,55 @@ async def ingest_web(req: WebIngestRequest):
     if not url.startswith("http"):
         raise HTTPException(status_code=400, detail="URL inválida.")
 
-    print(f"🌐 Iniciando ingestão de: {url}")
-
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36"
-        ),
-        "Accept-Language": "pt-BR,pt;q=0.9",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-    }
-
-    try:
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-        response.encoding = response.apparent_encoding  # garante leitura correta
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao acessar a página: {str(e)}")
-
-    soup = BeautifulSoup(response.text, "html.parser")
-
-    # Remove scripts, estilos e metadados
-    for tag in soup(["script", "style", "noscript", "meta", "iframe"]):
-        tag.decompose()
+    logger.info("🌐 Iniciando ingestão de: %s", url)
+    # bs4/langchain só entram no processo quando há ingestão
+    from ..web_crawler import crawl_job
+
+    # Página única = crawl de profundidade 0 (GET condicional: só reindexa se mudou), como job
+    # "web": nunca roda junto com um crawl (mesmo estado do crawler); a resposta espera o job
+    job, created = job_manager.submit("web", crawl_job, seeds=[url], depth=0, min_chars=200)
+    if not created:
+        raise HTTPException(status_code=409, detail="Já existe um crawl em andamento; tente quando terminar.")
+    await asyncio.to_thread(job.wait)
+    if job.status != "done":
+        raise HTTPException(status_code=500, detail=job.error or f"Ingestão {job.status}: {url}")
+    stats = job.result
+
+    if stats["errors"]:
+        raise HTTPException(status_code=500, detail=f"Erro ao acessar a página: {url}")
+    if stats["not_modified"]:
+        return {"status": "ok", "message": f"A página '{url}' não mudou desde a última indexação."}
+    if not stats["pages_indexed"]:
+        raise HTTPException(status_code=400, detail="Conteúdo insuficiente para indexação.")
 
-    # Extrai apenas o texto limpo
-    text = " ".join(soup.get_text(separator=" ").split())
+    logger.info("✅ Página indexada com sucesso: %s", url)
+    return {"status": "ok", "message": f"Página '{url}' indexada com sucesso!", "stats": stats}
 
-    if not text or len(text) < 200:
-        raise HTTPException(status_code=400, detail="Conteúdo insuficiente para indexação.")
 
-    chroma = get_chroma()
-    embedder = get_embedder()
+@router.post("/ingest_web/crawl")
+def ingest_web_crawl(req: WebCrawlRequest, response: Response):
+    """
+    Crawl a partir de URLs semente, seguindo links até `depth` níveis dentro dos
+    domínios permitidos (padrão: os das sementes). Páginas sem mudança (304) não são reindexadas.
+    Roda como job (um crawl por vez); acompanhe em /api/jobs/{job_id}.
+    """
+    seeds = [u.strip() for u in req.seeds if u.strip().startswith("http")]
+    if not seeds:
+        raise HTTPException(status_code=400, detail="Informe ao menos uma URL válida.")
+    if req.depth < 0 or req.depth > 5:
+        raise HTTPException(status_code=400, detail="Profundidade deve estar entre 0 e 5.")
 
-    # Evita duplicar documentos
-    existing_docs = chroma.get(ids=[url])
-    if existing_docs and len(existing_docs["ids"]) > 0:
-        return {"status": "ok", "message": f"A página '{url}' já está indexada."}
+    from ..web_crawler import crawl_job
 
-    embedding = embedder.encode([text])[0]
-    chroma.add(
-        documents=[text],
-        embeddings=[embedding],
-        metadatas=[{"url": url}],
-        ids=[url]
+    job, created = job_manager.submit(
+        "web", crawl_job,
+        seeds=seeds, depth=req.depth, allowed_domains=req.allowed_domains, max_pages=req.max_pages,
     )
-
-    print(f"✅ Página indexada com sucesso: {url}")
-    return {"status": "ok", "message": f"Página '{url}' indexada com sucesso!"}
+    response.status_code = 202 if created else 200
+    return {
+        "status": job.status,
+        "job_id": job.id,
+        "created": created,
+        "message": "Crawl iniciado." if created else "Já existe um crawl em andamento.",
+        "status_url": f"/api/jobs/{job.id}",
+    }
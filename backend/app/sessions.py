@@ -0,0 +1,277 @@
+import os
+import logging
+import re
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+from .deps import CHROMA_DIR
+from .context_packer import estimated_tokens, trim_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# memory: LRU no processo (some no restart, não é compartilhado entre workers);
+# disk: um JSON por sessão em SESSION_DIR (sobrevive a restart, compartilhado no mesmo disco)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_DIR = os.getenv("SESSION_DIR", os.path.join(CHROMA_DIR, "sessions"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(24 * 3600)))
+# Turnos recentes mandados literalmente ao LLM e o teto de tokens deles; o que sai vira resumo
+SESSION_RECENT_TURNS = int(os.getenv("SESSION_RECENT_TURNS", "3"))
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "1200"))
+SESSION_SUMMARY_TOKENS = int(os.getenv("SESSION_SUMMARY_TOKENS", "300"))
+# Perguntas anteriores somadas à atual na busca ("e se for reincidente?" herda o assunto)
+SESSION_RETRIEVAL_TURNS = int(os.getenv("SESSION_RETRIEVAL_TURNS", "2"))
+
+_SESSION_ID = re.compile(r"^[\w-]{8,64}$")
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def valid_session_id(session_id):
+    return bool(session_id) and bool(_SESSION_ID.match(session_id))
+
+
+def _turn_tokens(turn):
+    return estimated_tokens(turn["user"], None) + estimated_tokens(turn["assistant"], None)
+
+
+class Session:
+    """
+    Conversa do chat: resumo acumulado dos turnos antigos + turnos recentes literais.
+    O que vai ao prompt fica limitado a SESSION_SUMMARY_TOKENS + SESSION_HISTORY_TOKENS,
+    por mais longa que seja a conversa.
+    """
+
+    def __init__(self, session_id, summary="", turns=None, summarized=0, created=None, updated=None):
+        self.id = session_id
+        self.summary = summary
+        self.turns = list(turns or [])  # [{"user", "assistant"}], do mais antigo ao mais novo
+        self.summarized = summarized  # quantos turnos já foram para o resumo
+        self.created = created or time.time()
+        self.updated = updated or self.created
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["id"], data.get("summary", ""), data.get("turns"), data.get("summarized", 0),
+                   data.get("created"), data.get("updated"))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "summary": self.summary,
+            "turns": self.turns,
+            "summarized": self.summarized,
+            "created": self.created,
+            "updated": self.updated,
+        }
+
+    def has_history(self):
+        return bool(self.summary or self.turns)
+
+    def add_turn(self, user, assistant):
+        self.turns.append({"user": user, "assistant": assistant})
+        self.updated = time.time()
+
+    def retrieval_query(self, message):
+        """Pergunta usada na busca: as últimas perguntas do usuário + a atual (mais recente por último)"""
+        previous = [t["user"] for t in self.turns[-SESSION_RETRIEVAL_TURNS:]] if SESSION_RETRIEVAL_TURNS > 0 else []
+        return " ".join(previous + [message])
+
+    def overflow(self):
+        """Turnos mais antigos que excedem o limite de turnos/tokens e devem ir para o resumo"""
+        keep, tokens = 0, 0
+        for turn in reversed(self.turns):
+            cost = _turn_tokens(turn)
+            if keep >= SESSION_RECENT_TURNS or (keep and tokens + cost > SESSION_HISTORY_TOKENS):
+                break
+            keep += 1
+            tokens += cost
+        return self.turns[:len(self.turns) - keep]
+
+    def fold(self, count, summary):
+        """Troca os `count` turnos mais antigos pelo novo resumo"""
+        self.turns = self.turns[count:]
+        self.summarized += count
+        self.summary = summary
+        self.updated = time.time()
+
+    def prompt_messages(self):
+        """
+        Histórico para o LLM (entre o system e a pergunta atual): o resumo e os turnos
+        recentes que cabem no orçamento. Turnos ainda não resumidos que passam do
+        orçamento ficam de fora, então o tamanho não depende da compactação já ter rodado.
+        """
+        messages = []
+        if self.summary:
+            summary = self.summary
+            tokens = estimated_tokens(summary, None)
+            if tokens > SESSION_SUMMARY_TOKENS:
+                summary = trim_to_tokens(summary, tokens, SESSION_SUMMARY_TOKENS)
+            messages.append({"role": "system", "content": f"Resumo da conversa até aqui:\n{summary}"})
+
+        recent, budget = [], SESSION_HISTORY_TOKENS
+        for turn in reversed(self.turns[-SESSION_RECENT_TURNS:] if SESSION_RECENT_TURNS > 0 else []):
+            user, answer = turn["user"], turn["assistant"]
+            user_tokens, answer_tokens = estimated_tokens(user, None), estimated_tokens(answer, None)
+            if user_tokens + answer_tokens > budget:
+                if recent or budget - user_tokens < 40:
+                    break
+                # único turno maior que o orçamento: vai com a resposta cortada
+                answer = trim_to_tokens(answer, answer_tokens, budget - user_tokens)
+                answer_tokens = budget - user_tokens
+            budget -= user_tokens + answer_tokens
+            recent[:0] = [{"role": "user", "content": user}, {"role": "assistant", "content": answer}]
+        return messages + recent
+
+
+def fallback_summary(previous, turns, max_tokens=None):
+    """Resumo extrativo (sem LLM): perguntas e começo das respostas, mantendo o mais recente no limite"""
+    max_tokens = max_tokens or SESSION_SUMMARY_TOKENS
+    lines = [previous] if previous else []
+    for turn in turns:
+        answer = " ".join(turn["assistant"].split())[:200]
+        lines.append(f"- Usuário: {turn['user']} | Babix: {answer}")
+    text = "\n".join(lines)
+    limit = int(max_tokens * 4.0)  # mesma razão caracteres/token das estimativas
+    return text if len(text) <= limit else "[...] " + text[-limit:]
+
+
+class MemorySessionStore:
+    """Sessões num dict LRU do processo, com expiração por inatividade (TTL)"""
+
+    def __init__(self, max_entries=SESSION_MAX, ttl=SESSION_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, session_id):
+        with self._lock:
+            data = self._entries.get(session_id)
+            if data is None:
+                return None
+            if time.time() - data["updated"] > self.ttl:
+                del self._entries[session_id]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(session_id)
+            return Session.from_dict(data)
+
+    def put(self, session):
+        with self._lock:
+            self._entries[session.id] = session.to_dict()
+            self._entries.move_to_end(session.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._entries.pop(session_id, None) is not None
+
+    def stats(self):
+        return {"backend": "memory", "sessions": len(self._entries), "max": self.max_entries,
+                "evictions": self.evictions}
+
+
+class DiskSessionStore:
+    """
+    Sessões em disco, um JSON por sessão (gravação atômica). Expiram pelo mtime;
+    a cada `prune_every` gravações apaga as expiradas e as mais antigas acima de `max_entries`.
+    """
+
+    def __init__(self, path=SESSION_DIR, max_entries=SESSION_MAX, ttl=SESSION_TTL, prune_every=50):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.evictions = 0
+
+    def _file(self, session_id):
+        return os.path.join(self.path, f"{session_id}.json")
+
+    def get(self, session_id):
+        path = self._file(session_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                self.delete(session_id)
+                return None
+            with open(path, "r", encoding="utf-8") as fh:
+                return Session.from_dict(json.load(fh))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("⚠️ Sessão inválida em %s, descartando: %s", path, e)
+            self.delete(session_id)
+            return None
+
+    def put(self, session):
+        os.makedirs(self.path, exist_ok=True)
+        path = self._file(session.id)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(session.to_dict(), fh, ensure_ascii=False)
+        os.replace(tmp, path)
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.prune_every == 0
+        if prune:
+            self.prune()
+
+    def delete(self, session_id):
+        try:
+            os.remove(self._file(session_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _listing(self):
+        entries = []
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except FileNotFoundError:
+                        pass
+        return entries
+
+    def prune(self):
+        """Apaga sessões expiradas e, acima do limite, as menos recentes"""
+        if not os.path.isdir(self.path):
+            return 0
+        now = time.time()
+        entries = sorted(self._listing(), reverse=True)
+        doomed = [path for i, (mtime, path) in enumerate(entries) if i >= self.max_entries or now - mtime > self.ttl]
+        for path in doomed:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self.evictions += len(doomed)
+        return len(doomed)
+
+    def stats(self):
+        count = len(self._listing()) if os.path.isdir(self.path) else 0
+        return {"backend": "disk", "path": self.path, "sessions": count, "max": self.max_entries,
+                "evictions": self.evictions}
+
+
+def make_session_store(backend=SESSION_BACKEND):
+    if backend == "disk":
+        return DiskSessionStore()
+    if backend != "memory":
+        raise ValueError(f"SESSION_BACKEND inválido: {backend!r} (use memory ou disk)")
+    return MemorySessionStore()
+
+
+session_store = make_session_store()
@@ -0,0 +1,367 @@
+import os
+import logging
+import sys
+import json
+import mmap
+import time
+import shutil
+import argparse
+import threading
+
+import numpy as np
+
+from .deps import CHROMA_DIR, EMBEDDING_MODEL, collection_version
+from .partitions import SOURCE_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Snapshot somente-leitura dos embeddings para servir o chat com vários workers:
+# todos mapeiam os mesmos arquivos (uma cópia no page cache) em vez de abrir o Chroma
+SNAPSHOT_SERVING = os.getenv("SNAPSHOT_SERVING", "0") != "0"
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(CHROMA_DIR, "snapshots"))
+# Snapshots antigos mantidos além do atual (workers atrasados ainda podem estar neles)
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "2"))
+# De quanto em quanto tempo cada worker confere o ponteiro CURRENT
+SNAPSHOT_CHECK_SECONDS = float(os.getenv("SNAPSHOT_CHECK_SECONDS", "2"))
+# Linhas por bloco do produto matriz × query (float16 → float32 por bloco, memória constante)
+SNAPSHOT_BLOCK_ROWS = int(os.getenv("SNAPSHOT_BLOCK_ROWS", "65536"))
+
+CURRENT = "CURRENT"
+FORMAT = 1
+_UNKNOWN_TYPE = len(SOURCE_TYPES)  # chunks sem `source_type` (não entram em buscas filtradas)
+
+
+def _empty(nested, include):
+    wrap = (lambda v: [v]) if nested else (lambda v: v)
+    out = {"ids": wrap([])}
+    for key in include:
+        out[key] = wrap([])
+    return out
+
+
+class Snapshot:
+    """
+    Um snapshot publicado (diretório imutável), mapeado em memória:
+      embeddings.npy    float16 N×D
+      sq_norms.npy      float32 N (norma² de cada linha, para a distância L2)
+      source_types.npy  uint8 N (índice em SOURCE_TYPES; filtro das partições)
+      ids.npy           ids na ordem das linhas
+      sorted_ids.npy    ids ordenados + id_order.npy (linha de cada um), para busca binária
+      records.bin       JSON {document, metadata} por linha; offsets.npy int64 N+1
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as fh:
+            self.manifest = json.load(fh)
+        self.space = self.manifest.get("space", "l2")
+
+        def load(filename):
+            return np.load(os.path.join(path, filename), mmap_mode="r")
+
+        self.embeddings = load("embeddings.npy")
+        self.sq_norms = load("sq_norms.npy")
+        self.source_types = load("source_types.npy")
+        self.ids = load("ids.npy")
+        self.sorted_ids = load("sorted_ids.npy")
+        self.id_order = load("id_order.npy")
+        self.offsets = load("offsets.npy")
+
+        self._records_file = open(os.path.join(path, "records.bin"), "rb")
+        size = os.fstat(self._records_file.fileno()).st_size
+        self._records = mmap.mmap(self._records_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def count(self):
+        return int(self.embeddings.shape[0])
+
+    def version(self):
+        return self.name
+
+    def _record(self, row):
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(bytes(self._records[start:end]).decode("utf-8"))
+
+    def _mask(self, where):
+        """Linhas permitidas por um filtro `where` do formato usado no chat ({"source_type": ...})"""
+        if not where:
+            return None
+        if set(where) != {"source_type"}:
+            raise ValueError(f"Filtro não suportado pelo snapshot: {where}")
+        cond = where["source_type"]
+        wanted = cond["$in"] if isinstance(cond, dict) else [cond]
+        codes = [SOURCE_TYPES.index(t) for t in wanted if t in SOURCE_TYPES]
+        return np.isin(self.source_types, np.asarray(codes, dtype=np.uint8))
+
+    def _distances(self, query, rows=None):
+        """
+        Distância das linhas (todas ou só `rows`) à query, no espaço da coleção
+        (l2, cosine ou ip), em blocos convertidos para float32
+        """
+        q = np.asarray(query, dtype=np.float32)
+        n = self.count() if rows is None else len(rows)
+        dots = np.empty(n, dtype=np.float32)
+        for start in range(0, n, SNAPSHOT_BLOCK_ROWS):
+            if rows is None:
+                block = self.embeddings[start:start + SNAPSHOT_BLOCK_ROWS]
+            else:
+                block = self.embeddings[rows[start:start + SNAPSHOT_BLOCK_ROWS]]
+            dots[start:start + len(block)] = np.asarray(block, dtype=np.float32) @ q
+        sq_norms = np.asarray(self.sq_norms if rows is None else self.sq_norms[rows])
+        if self.space == "cosine":
+            norms = np.sqrt(sq_norms) * (np.linalg.norm(q) or 1.0)
+            return 1.0 - dots / np.maximum(norms, 1e-12)
+        if self.space == "ip":
+            return 1.0 - dots
+        return sq_norms - 2.0 * dots + float(q @ q)
+
+    def _rows_result(self, rows, include, distances=None):
+        out = {"ids": [str(self.ids[r]) for r in rows]}
+        records = [self._record(r) for r in rows] if {"documents", "metadatas"} & set(include) else None
+        if "documents" in include:
+            out["documents"] = [rec["document"] for rec in records]
+        if "metadatas" in include:
+            out["metadatas"] = [rec["metadata"] for rec in records]
+        if "embeddings" in include:
+            out["embeddings"] = [np.asarray(self.embeddings[r], dtype=np.float32) for r in rows]
+        if "distances" in include:
+            out["distances"] = [float(d) for d in distances]
+        return out
+
+    def query(self, embeddings, n_results, where=None, include=("documents", "metadatas", "distances")):
+        """Top-k exato (NumPy vetorizado); mesmo formato de resultado do `query` do Chroma"""
+        if hasattr(embeddings, "tolist"):
+            embeddings = embeddings.tolist()
+        if embeddings and not isinstance(embeddings[0], (list, tuple)):
+            embeddings = [embeddings]
+        results = [self._query_one(e, n_results, where, include) for e in embeddings]
+        return {key: [r[key] for r in results] for key in results[0]} if results else _empty(True, include)
+
+    def _query_one(self, embedding, n_results, where, include):
+        if self.count() == 0:
+            return _empty(False, include)
+        mask = self._mask(where)
+        candidates = np.flatnonzero(mask) if mask is not None else None
+        distances = self._distances(embedding, candidates)
+        k = min(n_results, len(distances))
+        if k == 0:
+            return _empty(False, include)
+        top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+        top = top[np.argsort(distances[top], kind="stable")]
+        rows = candidates[top] if candidates is not None else top
+        return self._rows_result(rows, include, distances[top])
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        """Busca por ids (busca binária no índice ordenado); ids inexistentes são ignorados"""
+        if ids is None:
+            raise ValueError("O snapshot só busca por ids")
+        ids = list(ids)
+        if not ids or self.count() == 0:
+            return _empty(False, include)
+        pos = np.searchsorted(self.sorted_ids, np.asarray(ids, dtype=self.sorted_ids.dtype))
+        rows = []
+        for i, p in zip(ids, pos):
+            if p < len(self.sorted_ids) and self.sorted_ids[p] == i:
+                rows.append(int(self.id_order[p]))
+        return self._rows_result(rows, include)
+
+    def close(self):
+        if isinstance(self._records, mmap.mmap):
+            self._records.close()
+        self._records_file.close()
+
+
+def _read_current(path):
+    try:
+        with open(os.path.join(path, CURRENT), "r", encoding="utf-8") as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def export_snapshot(store, path=SNAPSHOT_DIR, keep=None, page_size=1000):
+    """
+    Exporta a coleção inteira para um novo snapshot e o publica: escreve num
+    diretório temporário, renomeia e troca o ponteiro CURRENT de forma atômica.
+    Remove os snapshots mais antigos além de `keep`. Retorna o nome publicado.
+    """
+    keep = SNAPSHOT_KEEP if keep is None else keep
+    started = time.perf_counter()
+    version = collection_version()
+    name = f"s{time.time_ns()}"
+    tmp = os.path.join(path, f".{name}.tmp")
+    os.makedirs(tmp, exist_ok=True)
+
+    try:
+        ids, types, offsets, chunks = [], [], [0], []
+        with open(os.path.join(tmp, "records.bin"), "wb") as records:
+            for page in store.iter_pages(page_size=page_size, include=("documents", "metadatas", "embeddings")):
+                for chunk_id, doc, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+                    meta = meta or {}
+                    blob = json.dumps({"document": doc or "", "metadata": meta}, ensure_ascii=False).encode("utf-8")
+                    records.write(blob)
+                    offsets.append(offsets[-1] + len(blob))
+                    ids.append(chunk_id)
+                    source_type = meta.get("source_type")
+                    types.append(SOURCE_TYPES.index(source_type) if source_type in SOURCE_TYPES else _UNKNOWN_TYPE)
+                chunks.append(np.asarray(page["embeddings"], dtype=np.float32))
+
+        matrix = np.concatenate(chunks) if chunks else np.zeros((0, 0), dtype=np.float32)
+        id_array = np.asarray(ids, dtype=str) if ids else np.zeros(0, dtype="<U1")
+        np.save(os.path.join(tmp, "embeddings.npy"), matrix.astype(np.float16))
+        # norma da versão float16 (a que é usada na busca)
+        half = matrix.astype(np.float16).astype(np.float32)
+        np.save(os.path.join(tmp, "sq_norms.npy"), np.einsum("ij,ij->i", half, half).astype(np.float32))
+        np.save(os.path.join(tmp, "source_types.npy"), np.asarray(types, dtype=np.uint8))
+        order = np.argsort(id_array, kind="stable").astype(np.int64)
+        np.save(os.path.join(tmp, "ids.npy"), id_array)
+        np.save(os.path.join(tmp, "sorted_ids.npy"), id_array[order])
+        np.save(os.path.join(tmp, "id_order.npy"), order)
+        np.save(os.path.join(tmp, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+        space = (store.collection().metadata or {}).get("hnsw:space", "l2")
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as fh:
+            json.dump({
+                "format": FORMAT,
+                "count": len(ids),
+                "dim": int(matrix.shape[1]) if matrix.size else 0,
+                "space": space,
+                "embedding_model": EMBEDDING_MODEL,
+                "collection_version": version,
+                "created": time.time(),
+            }, fh)
+
+        final = os.path.join(path, name)
+        os.replace(tmp, final)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(path, f"{CURRENT}.tmp")
+    with open(pointer, "w", encoding="utf-8") as fh:
+        fh.write(name)
+    os.replace(pointer, os.path.join(path, CURRENT))
+
+    # Linux: quem ainda mapeia um snapshot apagado continua lendo até trocar
+    published = sorted(d for d in os.listdir(path) if d.startswith("s") and os.path.isdir(os.path.join(path, d)))
+    for old in published[:-(keep + 1)]:
+        shutil.rmtree(os.path.join(path, old), ignore_errors=True)
+
+    logger.info("📸 Snapshot %s publicado: %d chunks em %.1fs", name, len(ids), time.perf_counter() - started)
+    return name
+
+
+def publish_snapshot(store=None, path=SNAPSHOT_DIR):
+    """Ao fim de uma ingestão: publica um snapshot novo se o serving por snapshot estiver ligado e a coleção mudou"""
+    if not SNAPSHOT_SERVING:
+        return None
+    current = _read_current(path)
+    if current is not None:
+        try:
+            with open(os.path.join(path, current, "manifest.json"), "r", encoding="utf-8") as fh:
+                if json.load(fh).get("collection_version") == collection_version():
+                    return None
+        except (OSError, ValueError):
+            pass
+    if store is None:
+        from .vector_store import vector_store
+        store = vector_store
+    try:
+        name = export_snapshot(store, path)
+        if path == snapshot_index.path:
+            snapshot_index.refresh()  # leitores deste processo trocam já, sem esperar a checagem
+        return name
+    except Exception as e:
+        logger.exception("❌ Erro ao publicar o snapshot: %s", e)
+        return None
+
+
+def publish_snapshot_job(job):
+    """Ponto de entrada do job que publica o snapshot (ex.: após trocar a geração viva)"""
+    return {"snapshot": publish_snapshot()}
+
+
+class SnapshotIndex:
+    """
+    Snapshot atual de um worker: segue o ponteiro CURRENT (conferido a cada
+    `check_seconds`) e troca para o novo sem reiniciar. Consultas em andamento
+    terminam no snapshot antigo (a referência só é solta depois).
+    """
+
+    def __init__(self, path=SNAPSHOT_DIR, check_seconds=SNAPSHOT_CHECK_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked = 0.0
+        self.swaps = 0
+
+    def current(self):
+        """Snapshot em uso (None se nenhum foi publicado)"""
+        now = time.monotonic()
+        if now - self._checked >= self.check_seconds:
+            with self._lock:
+                if now - self._checked >= self.check_seconds:
+                    self._checked = now
+                    self._refresh()
+        return self._snapshot
+
+    def refresh(self):
+        """Confere o ponteiro agora (ex.: logo após publicar neste processo)"""
+        with self._lock:
+            self._checked = time.monotonic()
+            self._refresh()
+        return self._snapshot
+
+    def _refresh(self):
+        name = _read_current(self.path)
+        if name is None or (self._snapshot is not None and self._snapshot.name == name):
+            return
+        try:
+            snapshot = Snapshot(os.path.join(self.path, name))
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ Snapshot %s ilegível, mantendo o atual: %s", name, e)
+            return
+        self._snapshot = snapshot
+        self.swaps += 1
+        logger.info("📸 Usando snapshot %s (%d chunks)", name, snapshot.count())
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "enabled": SNAPSHOT_SERVING,
+            "path": self.path,
+            "current": snapshot.name if snapshot else None,
+            "count": snapshot.count() if snapshot else 0,
+            "manifest": snapshot.manifest if snapshot else None,
+            "swaps": self.swaps,
+        }
+
+
+snapshot_index = SnapshotIndex()
+
+
+def read_store():
+    """Onde o chat lê: o snapshot publicado (se ligado e existir) ou o Chroma"""
+    if SNAPSHOT_SERVING:
+        snapshot = snapshot_index.current()
+        if snapshot is not None:
+            return snapshot
+    from .vector_store import vector_store
+    return vector_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta a coleção do Chroma para um snapshot mapeável em memória")
+    parser.add_argument("--path", default=SNAPSHOT_DIR)
+    parser.add_argument("--keep", type=int, default=SNAPSHOT_KEEP)
+    args = parser.parse_args(argv)
+    from .metrics import setup_logging
+    from .vector_store import vector_store
+    setup_logging()
+    export_snapshot(vector_store, args.path, args.keep)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
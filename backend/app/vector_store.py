@@ -0,0 +1,155 @@
+import os
+import threading
+
+from .deps import CHROMA_DIR, COLLECTION_NAME, mark_collection_changed, collection_version
+
+# Lotes de escrita/remoção no Chroma
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "512"))
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", "500"))
+
+# Parâmetros do HNSW (valem só na criação da coleção; coleções existentes mantêm os seus)
+HNSW_SETTINGS = {
+    "hnsw:space": os.getenv("HNSW_SPACE", "l2"),
+    "hnsw:construction_ef": int(os.getenv("HNSW_CONSTRUCTION_EF", "100")),
+    "hnsw:search_ef": int(os.getenv("HNSW_SEARCH_EF", "50")),
+    "hnsw:M": int(os.getenv("HNSW_M", "16")),
+    "hnsw:batch_size": int(os.getenv("HNSW_BATCH_SIZE", "100")),
+    "hnsw:sync_threshold": int(os.getenv("HNSW_SYNC_THRESHOLD", "1000")),
+}
+
+
+class VectorStore:
+    """
+    Camada única sobre o Chroma: um cliente persistente por processo, uma coleção
+    (a geração viva de CHROMA_COLLECTION) e escritas/remoções sempre em lotes. Toda
+    escrita marca a coleção como alterada (cache de respostas e outros processos
+    percebem), exceto com `track_version=False` (geração sombra em construção).
+    """
+
+    def __init__(self, path=CHROMA_DIR, name=COLLECTION_NAME, hnsw=None, track_version=True):
+        self.path = path
+        self.name = name
+        self.hnsw = dict(HNSW_SETTINGS if hnsw is None else hnsw)
+        self.track_version = track_version
+        self._lock = threading.Lock()
+        self._client = None
+        self._collection = None
+
+    def is_open(self):
+        return self._client is not None
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import chromadb  # pesado: só no primeiro uso (aquecimento/ingestão)
+                    os.makedirs(self.path, exist_ok=True)
+                    self._client = chromadb.PersistentClient(path=self.path)
+        return self._client
+
+    def collection(self):
+        if self._collection is None:
+            client = self.client()
+            with self._lock:
+                if self._collection is None:
+                    self._collection = client.get_or_create_collection(self.name, metadata=self.hnsw)
+        return self._collection
+
+    def retarget(self, name):
+        """Passa a usar outra coleção (troca de geração); leituras em andamento terminam na anterior"""
+        with self._lock:
+            if name != self.name:
+                self.name = name
+                self._collection = None
+
+    def drop(self):
+        """Apaga a coleção inteira (coleta de gerações antigas)"""
+        client = self.client()
+        with self._lock:
+            client.delete_collection(self.name)
+            self._collection = None
+
+    def _changed(self):
+        if self.track_version:
+            mark_collection_changed()
+
+    def count(self):
+        return self.collection().count()
+
+    def version(self):
+        """Marca de versão da coleção (muda a cada escrita, inclusive de outros processos)"""
+        return collection_version()
+
+    def upsert(self, ids, documents, embeddings, metadatas, batch_size=None):
+        """Upsert em lotes; `embeddings` pode ser lista ou array NumPy"""
+        batch_size = batch_size or UPSERT_BATCH_SIZE
+        col = self.collection()
+        for i in range(0, len(ids), batch_size):
+            batch = embeddings[i:i + batch_size]
+            col.upsert(
+                ids=ids[i:i + batch_size],
+                documents=documents[i:i + batch_size],
+                embeddings=batch.tolist() if hasattr(batch, "tolist") else batch,
+                metadatas=metadatas[i:i + batch_size],
+            )
+        if ids:
+            self._changed()
+
+    def update_metadata(self, ids, metadatas, batch_size=None):
+        """Atualiza só metadados (mescla com os existentes), em lotes"""
+        ids = list(ids)
+        batch_size = batch_size or UPSERT_BATCH_SIZE
+        col = self.collection()
+        for i in range(0, len(ids), batch_size):
+            col.update(ids=ids[i:i + batch_size], metadatas=metadatas[i:i + batch_size])
+        if ids:
+            self._changed()
+
+    def delete(self, ids, batch_size=None):
+        """Remove ids em lotes (ids inexistentes são ignorados pelo Chroma)"""
+        ids = list(ids)
+        batch_size = batch_size or DELETE_BATCH_SIZE
+        col = self.collection()
+        for i in range(0, len(ids), batch_size):
+            col.delete(ids=ids[i:i + batch_size])
+        if ids:
+            self._changed()
+
+    def query(self, embeddings, n_results, where=None, include=("documents", "metadatas", "distances")):
+        """Busca vetorial; aceita um vetor ou uma lista de vetores"""
+        if hasattr(embeddings, "tolist"):
+            embeddings = embeddings.tolist()
+        if embeddings and not isinstance(embeddings[0], (list, tuple)):
+            embeddings = [embeddings]
+        return self.collection().query(
+            query_embeddings=embeddings,
+            n_results=n_results,
+            where=where,
+            include=list(include),
+        )
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        return self.collection().get(ids=ids, where=where, limit=limit, offset=offset, include=list(include))
+
+    def iter_pages(self, page_size=1000, include=("documents", "metadatas")):
+        """Percorre a coleção inteira em páginas (migrações e reconstrução de índices)"""
+        offset = 0
+        while True:
+            page = self.get(limit=page_size, offset=offset, include=include)
+            if not page["ids"]:
+                break
+            yield page
+            offset += len(page["ids"])
+
+    def stats(self):
+        col = self.collection()
+        return {
+            "path": self.path,
+            "collection": self.name,
+            "count": col.count(),
+            "version": collection_version(),
+            "metadata": col.metadata or {},
+        }
+
+
+vector_store = VectorStore()
@@ -0,0 +1,266 @@
+import os
+import logging
+import json
+import time
+import asyncio
+import threading
+from urllib.parse import urljoin, urldefrag, urlparse
+
+import httpx
+from bs4 import BeautifulSoup
+
+from .deps import CHROMA_DIR
+from .indexing import BatchIndexer, remover_chunks
+from .generations import generations, live_generation, sidecar
+from .pdf_chunker import make_splitter
+from .metrics import span
+from .snapshot import publish_snapshot
+
+CRAWL_STATE_PATH = os.getenv("CRAWL_STATE_PATH", os.path.join(CHROMA_DIR, "web_crawl_state.json"))
+CRAWL_CONCURRENCY_PER_HOST = int(os.getenv("CRAWL_CONCURRENCY_PER_HOST", "4"))
+CRAWL_MAX_CONNECTIONS = int(os.getenv("CRAWL_MAX_CONNECTIONS", "20"))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "200"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "15"))
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept-Language": "pt-BR,pt;q=0.9",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+}
+
+
+class CrawlState:
+    """
+    Estado persistido do crawler, por URL: ETag/Last-Modified da última resposta,
+    links encontrados (para seguir o crawl mesmo com 304) e ids dos chunks gravados.
+    Sem `path`, usa o estado da geração viva do índice.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or sidecar(generations.live(), CRAWL_STATE_PATH)
+        self.pages = {}
+        # validadores (ETag/Last-Modified) recebidos, confirmados só depois de indexar a página
+        self.pending = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as fh:
+                    self.pages = json.load(fh).get("pages", {})
+            except (OSError, ValueError) as e:
+                logger.warning("⚠️ Estado do crawler inválido em %s, recomeçando do zero: %s", self.path, e)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"updated_at": time.time(), "pages": self.pages}, fh, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def conditional_headers(self, url):
+        entry = self.pages.get(url, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+
+def host_allowed(url, allowed_domains):
+    host = (urlparse(url).hostname or "").lower()
+    return any(host == d or host.endswith("." + d) for d in allowed_domains)
+
+
+def extract_text_and_links(html, base_url):
+    """Texto limpo (preservando quebras de linha) e links absolutos da página"""
+    soup = BeautifulSoup(html, "html.parser")
+
+    links = []
+    for a in soup.find_all("a", href=True):
+        link, _ = urldefrag(urljoin(base_url, a["href"]))
+        if link.startswith(("http://", "https://")):
+            links.append(link)
+
+    # Remove scripts, estilos e metadados
+    for tag in soup(["script", "style", "noscript", "meta", "iframe"]):
+        tag.decompose()
+
+    lines = (" ".join(line.split()) for line in soup.get_text(separator="\n").splitlines())
+    text = "\n".join(line for line in lines if line)
+    return text, list(dict.fromkeys(links))
+
+
+def make_client():
+    """Cliente httpx assíncrono com pool de conexões para o crawl"""
+    return httpx.AsyncClient(
+        headers=HEADERS,
+        follow_redirects=True,
+        timeout=CRAWL_TIMEOUT,
+        limits=httpx.Limits(max_connections=CRAWL_MAX_CONNECTIONS, max_keepalive_connections=CRAWL_MAX_CONNECTIONS),
+    )
+
+
+async def crawl(seeds, depth=0, allowed_domains=None, client=None, state=None, max_pages=None, on_level=None,
+                cancel=None):
+    """
+    Crawl em largura a partir das `seeds`, até `depth` níveis de links, só nos domínios permitidos
+    (por padrão, os das seeds). Requisições condicionais (ETag/Last-Modified) evitam baixar de novo
+    páginas que não mudaram. A cada nível, `on_level(páginas)` recebe [(url, texto)] das páginas
+    novas/alteradas. Com o Event `cancel` acionado, para antes do próximo nível.
+    Retorna as estatísticas do crawl.
+    """
+    state = state or CrawlState()
+    max_pages = max_pages or CRAWL_MAX_PAGES
+    allowed = [d.lower() for d in (allowed_domains or [])] or [
+        (urlparse(u).hostname or "").lower() for u in seeds
+    ]
+
+    own_client = client is None
+    client = client or make_client()
+    host_limits = {}
+    stats = {"fetched": 0, "changed": 0, "not_modified": 0, "errors": 0, "skipped": 0}
+
+    async def fetch(url):
+        host = urlparse(url).hostname or ""
+        sem = host_limits.setdefault(host, asyncio.Semaphore(CRAWL_CONCURRENCY_PER_HOST))
+        async with sem:
+            try:
+                with span("web", "fetch"):
+                    response = await client.get(url, headers=state.conditional_headers(url))
+            except httpx.HTTPError as e:
+                logger.error("❌ Erro ao acessar %s: %s", url, e)
+                stats["errors"] += 1
+                return url, None, []
+
+        entry = state.pages.setdefault(url, {})
+        if response.status_code == 304:
+            stats["not_modified"] += 1
+            return url, None, entry.get("links", [])
+
+        if response.status_code >= 400:
+            logger.error("❌ HTTP %d em %s", response.status_code, url)
+            stats["errors"] += 1
+            return url, None, []
+
+        stats["fetched"] += 1
+        if "html" not in response.headers.get("content-type", "text/html"):
+            stats["skipped"] += 1
+            return url, None, []
+
+        # bytes para o BeautifulSoup detectar a codificação (meta charset / heurística)
+        with span("web", "extract"):
+            text, links = await asyncio.to_thread(extract_text_and_links, response.content, str(response.url))
+        entry.update({"links": links, "fetched_at": time.time()})
+        state.pending[url] = {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+        }
+        return url, text, links
+
+    visited = set()
+    frontier = [urldefrag(u.strip())[0] for u in seeds]
+    try:
+        for level in range(depth + 1):
+            if cancel is not None and cancel.is_set():
+                logger.info("⏹️ Crawl cancelado no nível %d", level)
+                break
+            batch = []
+            for url in frontier:
+                if url in visited or not host_allowed(url, allowed) or len(visited) >= max_pages:
+                    continue
+                visited.add(url)
+                batch.append(url)
+            if not batch:
+                break
+
+            logger.info("🌐 Nível %d: %d páginas", level, len(batch))
+            results = await asyncio.gather(*(fetch(u) for u in batch))
+
+            pages = [(url, text) for url, text, _ in results if text]
+            stats["changed"] += len(pages)
+            if pages and on_level is not None:
+                await on_level(pages)
+
+            frontier = [link for _, _, links in results for link in links]
+    finally:
+        if own_client:
+            await client.aclose()
+
+    stats["visited"] = len(visited)
+    return stats
+
+
+def index_pages(pages, state, store=None, embedder=None, min_chars=0, generation=None):
+    """
+    Divide as páginas em chunks e indexa em lote (embedding + upsert),
+    apagando os chunks antigos de cada página. Roda fora do event loop, uma vez por nível do crawl.
+    Grava na geração viva do índice, ou em `generation` (sombra da reconstrução completa).
+    """
+    generation = generation or live_generation()
+    store = store or generation.store
+    indexer = BatchIndexer(store, embedder, pipeline="web", registry=generation.registry,
+                           index=generation.code_index, inventory=generation.stats)
+    splitter = make_splitter(1000, 200)
+
+    written = []
+    for url, text in pages:
+        if len(text) < min_chars:
+            continue
+        with span("web", "split"):
+            chunks = [c for c in splitter.split_text(text) if c.strip()]
+        metas = [{"url": url, "name": url, "chunk_id": i} for i in range(len(chunks))]
+        ids = list(dict.fromkeys(indexer.add(chunks, metas, url, url)))
+        written.append((url, ids))
+    indexer.flush()
+
+    # Só depois do flush: solta chunks antigos (inclui ids legados: URL e f"{url}#chunk_{i}")
+    for url, ids in written:
+        old = set(state.pages.get(url, {}).get("chunk_ids", [])) | {url}
+        remover_chunks(store, old - set(ids), url, generation.registry, generation.code_index, generation.stats,
+                       save=False)
+        state.pages[url]["chunk_ids"] = ids
+        generation.stats.record_source(url, url, ids, kind="web", mime="text/html")
+        state.pages[url].update(state.pending.pop(url, {}))
+    # registro e índice de códigos gravados uma vez por nível, antes do estado do crawler
+    if written:
+        generation.code_index.save()
+        generation.registry.save()
+    state.save()
+
+    stats = indexer.stats()
+    stats["pages"] = len(written)
+    return stats
+
+
+async def crawl_and_index(seeds, depth=0, allowed_domains=None, max_pages=None, client=None, state=None, min_chars=0,
+                          job=None, generation=None):
+    """
+    Crawl + indexação nível a nível; retorna estatísticas combinadas (progresso no `job`, se houver).
+    Com `generation` (sombra da reconstrução completa) não publica snapshot: a sombra ainda não está no ar.
+    """
+    state = state or CrawlState(generation.sidecar(CRAWL_STATE_PATH) if generation else None)
+    totals = {"pages_indexed": 0, "chunks": 0}
+
+    async def on_level(pages):
+        stats = await asyncio.to_thread(index_pages, pages, state, None, None, min_chars, generation)
+        totals["pages_indexed"] += stats["pages"]
+        totals["chunks"] += stats["chunks"]
+        if job is not None:
+            job.update(files_done=stats["pages"], chunks_done=stats["chunks"])
+
+    cancel = job.cancel_event if job is not None else None
+    crawl_stats = await crawl(seeds, depth, allowed_domains, client, state, max_pages, on_level, cancel)
+    state.save()
+    if generation is None:
+        await asyncio.to_thread(publish_snapshot)
+    return {**crawl_stats, **totals}
+
+
+def crawl_job(job, seeds, depth=0, allowed_domains=None, max_pages=None, min_chars=0):
+    """Ponto de entrada do job de crawl (thread do JobManager, com event loop próprio)"""
+    return asyncio.run(crawl_and_index(seeds, depth, allowed_domains, max_pages, min_chars=min_chars, job=job))
@@ -0,0 +1 @@
+"""Benchmarks reprodutíveis da ingestão e do chat, com Drive e OpenAI locais (sem rede)."""
@@ -0,0 +1,50 @@
+import os
+import resource
+import subprocess
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """p50/p90/p99 (+ média, máximo e contagem) em milissegundos, a partir de segundos"""
+    if not values:
+        return {"count": 0}
+    ms = np.asarray(values, dtype=np.float64) * 1000.0
+    out = {f"p{p}_ms": round(float(np.percentile(ms, p)), 2) for p in points}
+    out.update({"mean_ms": round(float(ms.mean()), 2), "max_ms": round(float(ms.max()), 2), "count": len(values)})
+    return out
+
+
+def peak_rss_mb():
+    """
+    Pico de memória residente em MB: deste processo e do maior filho já encerrado
+    (ex.: workers do pool de parsing)
+    """
+    # ru_maxrss vem em KB no Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"self": round(own / 1024.0, 1), "largest_child": round(children / 1024.0, 1)}
+
+
+def process_peak_rss_mb(pid):
+    """Pico de memória (VmHWM) de outro processo; None fora do Linux"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    return None
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,164 @@
+import io
+import random
+
+PDF_MIME = "application/pdf"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+_SUBJECTS = [
+    "o condutor", "o proprietário do veículo", "o agente da autoridade de trânsito",
+    "o pedestre", "o órgão executivo de trânsito", "o motociclista", "o instrutor",
+]
+_ACTIONS = [
+    "dirigir sob a influência de álcool", "avançar o sinal vermelho do semáforo",
+    "estacionar em local proibido pela sinalização", "transitar em velocidade superior à máxima permitida",
+    "deixar de usar o cinto de segurança", "utilizar-se de telefone celular ao volante",
+    "conduzir veículo sem possuir Carteira Nacional de Habilitação", "ultrapassar pela contramão",
+    "deixar de dar preferência de passagem a pedestre na faixa", "transportar criança sem dispositivo de retenção",
+]
+_PENALTIES = [
+    "multa e suspensão do direito de dirigir por doze meses", "multa", "multa e remoção do veículo",
+    "multa e retenção do veículo até a regularização", "multa agravada três vezes",
+]
+_GRAVITY = ["gravíssima", "grave", "média", "leve"]
+_FILLER = [
+    "Aplica-se o disposto neste artigo sem prejuízo das sanções penais cabíveis.",
+    "A fiscalização observará os procedimentos estabelecidos pelo CONTRAN.",
+    "Considera-se reincidência a prática da mesma infração no período de doze meses.",
+    "O auto de infração deverá conter a tipificação, o local, a data e a hora do cometimento.",
+    "A notificação da autuação será expedida no prazo máximo de trinta dias.",
+    "O recurso deverá ser interposto perante a autoridade que impôs a penalidade.",
+]
+
+
+def article_text(rng, number):
+    """Um artigo no estilo do CTB/MBFT, com enquadramento (código) e penalidade"""
+    action = rng.choice(_ACTIONS)
+    code = f"{rng.randint(500, 799)}-{rng.randint(10, 99)}"
+    lines = [
+        f"Art. {number}. {rng.choice(_SUBJECTS).capitalize()} que {action}:",
+        f"Infração - {rng.choice(_GRAVITY)};",
+        f"Penalidade - {rng.choice(_PENALTIES)};",
+        f"Código do enquadramento: {code}.",
+    ]
+    lines += rng.sample(_FILLER, k=rng.randint(2, len(_FILLER)))
+    return "\n".join(lines), code, action
+
+
+def make_pdf(pages):
+    """PDF mínimo (Helvetica, WinAnsi) com uma página por texto; sem dependências externas"""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for text in pages:
+        page_id = len(objects) + 1
+        kids.append(f"{page_id} 0 R")
+        lines = []
+        for paragraph in text.split("\n"):
+            while paragraph:
+                lines.append(paragraph[:95])
+                paragraph = paragraph[95:]
+        body = " ".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") '" for line in lines
+        )
+        stream = f"BT /F1 9 Tf 36 806 Td 11 TL {body} ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream.encode('cp1252', 'replace'))} >>\nstream\n{stream}\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(out.tell())
+        out.write(f"{i + 1} 0 obj\n{obj}\nendobj\n".encode("cp1252", "replace"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def make_docx(paragraphs):
+    import docx
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def build_corpus(pdfs=20, docx_files=5, pages=20, articles_per_page=3, dup_ratio=0.2, seed=42):
+    """
+    Corpus jurídico sintético e determinístico (mesma semente → mesmos bytes).
+    Uma fração `dup_ratio` dos PDFs repete o texto de um PDF anterior (mesma lei
+    publicada em dois arquivos), para exercitar a deduplicação.
+    Retorna (arquivos, vocabulário) — arquivos como [(metadados_drive, bytes)] e o
+    vocabulário (artigos, códigos, assuntos) usado para gerar perguntas.
+    """
+    rng = random.Random(seed)
+    vocab = {"articles": [], "codes": [], "actions": []}
+    files = []
+    pdf_pages = []
+    article_no = 1
+
+    for i in range(pdfs):
+        if pdf_pages and rng.random() < dup_ratio:
+            content = rng.choice(pdf_pages)
+        else:
+            content = []
+            for _ in range(pages):
+                texts = []
+                for _ in range(articles_per_page):
+                    text, code, action = article_text(rng, article_no)
+                    vocab["articles"].append(article_no)
+                    vocab["codes"].append(code)
+                    vocab["actions"].append(action)
+                    texts.append(text)
+                    article_no += 1
+                content.append("\n".join(texts))
+            pdf_pages.append(content)
+        meta = {
+            "id": f"bench-pdf-{i:04d}", "name": f"lei_{i:04d}.pdf", "mimeType": PDF_MIME,
+            "modifiedTime": "2024-01-01T00:00:00.000Z",
+        }
+        files.append((meta, make_pdf(content)))
+
+    for i in range(docx_files):
+        paragraphs = []
+        for _ in range(articles_per_page * 2):
+            text, code, action = article_text(rng, article_no)
+            vocab["articles"].append(article_no)
+            vocab["codes"].append(code)
+            vocab["actions"].append(action)
+            paragraphs.extend(text.split("\n"))
+            article_no += 1
+        meta = {
+            "id": f"bench-docx-{i:04d}", "name": f"resolucao_{i:04d}.docx", "mimeType": DOCX_MIME,
+            "modifiedTime": "2024-01-01T00:00:00.000Z",
+        }
+        files.append((meta, make_docx(paragraphs)))
+
+    return files, vocab
+
+
+def sample_queries(vocab, n, seed=7):
+    """Perguntas variadas (artigo, código e texto livre) a partir do vocabulário do corpus"""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(n):
+        kind = i % 3
+        if kind == 0 and vocab["articles"]:
+            queries.append(f"O que diz o art. {rng.choice(vocab['articles'])}?")
+        elif kind == 1 and vocab["codes"]:
+            queries.append(f"Qual a penalidade do código {rng.choice(vocab['codes'])}?")
+        else:
+            queries.append(f"Qual a infração por {rng.choice(_ACTIONS)}?")
+    return queries
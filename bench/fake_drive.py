@@ -0,0 +1,125 @@
+import re
+import time
+import threading
+
+import httplib2
+
+FOLDER_ID = "bench-root"
+FOLDER_MIME = "application/vnd.google-apps.folder"
+_RANGE = re.compile(r"bytes=(\d+)-(\d+)")
+
+
+class _Request:
+    def __init__(self, result):
+        self._result = result
+
+    def execute(self):
+        return self._result
+
+
+class _MediaRequest:
+    """
+    Imita o HttpRequest do get_media: o MediaIoBaseDownload chama
+    `http.request(uri, headers={"range": ...})` e lê `content-range` da resposta.
+    """
+
+    def __init__(self, drive, file_id):
+        self.drive = drive
+        self.file_id = file_id
+        self.data = drive.blobs[file_id]
+        self.uri = f"fake-drive://{file_id}"
+        self.headers = {}
+        self.http = self
+
+    def request(self, uri, method="GET", headers=None, **kwargs):
+        start, end = (int(g) for g in _RANGE.match(headers["range"]).groups())
+        t0 = time.perf_counter()
+        if self.drive.latency:
+            time.sleep(self.drive.latency)
+        chunk = self.data[start:end + 1]
+        if self.drive.bandwidth:
+            time.sleep(len(chunk) / self.drive.bandwidth)
+        self.drive._record(self.file_id, start, start + len(chunk) >= len(self.data), time.perf_counter() - t0)
+        response = httplib2.Response({
+            "status": 206,
+            "content-range": f"bytes {start}-{start + len(chunk) - 1}/{len(self.data)}",
+        })
+        return response, chunk
+
+
+class _Files:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, q, fields=None, pageSize=100, pageToken=None):
+        parent = q.split("'")[1]
+        self.drive.listings.append((parent, pageToken))
+        items = self.drive.tree.get(parent, [])
+        start = int(pageToken or 0)
+        size = min(pageSize, self.drive.page_size)
+        result = {"files": items[start:start + size]}
+        if start + size < len(items):
+            result["nextPageToken"] = str(start + size)
+        return _Request(result)
+
+    def get_media(self, fileId):
+        return _MediaRequest(self.drive, fileId)
+
+
+class FakeDrive:
+    """
+    Serviço do Drive em memória, compatível com o que a ingestão usa
+    (`files().list` paginado e `files().get_media` com download em blocos).
+    `latency_ms` simula o RTT de cada bloco e `bandwidth_mbps` a banda.
+    Os `files` ficam na pasta raiz; `add_folder`, `put_file` e `remove_file` montam
+    subpastas e simulam edições entre sincronizações. `page_size` pequeno força a
+    paginação; cada listagem fica em `listings` como (pasta, pageToken).
+    Registra o tempo de cada bloco e de cada arquivo completo.
+    """
+
+    def __init__(self, files, page_size=100, latency_ms=0.0, bandwidth_mbps=None):
+        self.tree = {FOLDER_ID: [meta for meta, _ in files]}
+        self.blobs = {meta["id"]: data for meta, data in files}
+        self.listings = []
+        self.page_size = page_size
+        self.latency = latency_ms / 1000.0
+        self.bandwidth = bandwidth_mbps * 1024 * 1024 / 8 if bandwidth_mbps else None
+
+        self._lock = threading.Lock()
+        self._started = {}
+        self.chunk_seconds = []
+        self.file_seconds = []
+
+    def files(self):
+        return _Files(self)
+
+    def add_folder(self, folder_id, parent=FOLDER_ID, name=None):
+        """Cria uma subpasta (vazia) dentro de `parent`"""
+        self.tree.setdefault(parent, []).append({"id": folder_id, "name": name or folder_id, "mimeType": FOLDER_MIME})
+        self.tree.setdefault(folder_id, [])
+        return folder_id
+
+    def put_file(self, meta, data, parent=FOLDER_ID):
+        """Adiciona um arquivo em `parent`, ou substitui o de mesmo id (nova versão)"""
+        for items in self.tree.values():
+            for i, item in enumerate(items):
+                if item["id"] == meta["id"]:
+                    items[i] = meta
+                    self.blobs[meta["id"]] = data
+                    return
+        self.tree.setdefault(parent, []).append(meta)
+        self.blobs[meta["id"]] = data
+
+    def remove_file(self, file_id):
+        for parent, items in self.tree.items():
+            self.tree[parent] = [item for item in items if item["id"] != file_id]
+        self.blobs.pop(file_id, None)
+
+    def _record(self, file_id, start, finished, seconds):
+        now = time.perf_counter()
+        with self._lock:
+            self.chunk_seconds.append(seconds)
+            if start == 0:
+                self._started[file_id] = now - seconds
+            if finished and file_id in self._started:
+                self.file_seconds.append(now - self._started.pop(file_id))
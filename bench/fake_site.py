@@ -0,0 +1,130 @@
+import time
+import hashlib
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FakeSite:
+    """
+    Servidor HTTP local com páginas interligadas, para exercitar o crawler sem rede.
+    `pages` mapeia caminho → HTML. Cada página responde com ETag e Last-Modified e
+    devolve 304 às requisições condicionais (If-None-Match / If-Modified-Since) de
+    páginas que não mudaram; `set_page` troca o conteúdo (validadores novos).
+    Registra (caminho, status) de cada requisição em `hits`.
+    """
+
+    def __init__(self, pages=None, host="127.0.0.1", port=0):
+        self.hits = []
+        self._pages = {}
+        self._lock = threading.Lock()
+        # relógio próprio: cada versão ganha um Last-Modified estritamente maior
+        self._clock = int(time.time()) - 3600
+        for path, html in (pages or {}).items():
+            self.set_page(path, html)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def url(self, path="/"):
+        return self.base_url + path
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-site", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def set_page(self, path, html):
+        """Publica (ou altera) uma página; o ETag vem do conteúdo"""
+        body = html.encode("utf-8")
+        with self._lock:
+            self._clock += 1
+            self._pages[path] = {
+                "body": body,
+                "etag": '"' + hashlib.md5(body).hexdigest() + '"',
+                "last_modified": formatdate(self._clock, usegmt=True),
+                "mtime": self._clock,
+            }
+
+    def body(self, path):
+        """Bytes servidos hoje em `path`"""
+        with self._lock:
+            return self._pages[path]["body"]
+
+    def remove_page(self, path):
+        with self._lock:
+            self._pages.pop(path, None)
+
+    def requested(self, status=None):
+        """Caminhos requisitados (opcionalmente só os que tiveram `status`)"""
+        with self._lock:
+            return [path for path, code in self.hits if status is None or code == status]
+
+    def reset_hits(self):
+        with self._lock:
+            self.hits.clear()
+
+    def _not_modified(self, page, headers):
+        etag = headers.get("if-none-match")
+        if etag is not None:
+            return page["etag"] in (e.strip() for e in etag.split(","))
+        since = headers.get("if-modified-since")
+        if since is not None:
+            try:
+                return page["mtime"] <= parsedate_to_datetime(since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                with site._lock:
+                    page = site._pages.get(path)
+                    if page is None:
+                        status = 404
+                    elif site._not_modified(page, self.headers):
+                        status = 304
+                    else:
+                        status = 200
+                    site.hits.append((path, status))
+
+                if status == 404:
+                    self.send_response(404)
+                    self.send_header("content-length", "0")
+                    self.end_headers()
+                    return
+
+                self.send_response(status)
+                self.send_header("etag", page["etag"])
+                self.send_header("last-modified", page["last_modified"])
+                if status == 304:
+                    self.end_headers()
+                    return
+                self.send_header("content-type", "text/html; charset=utf-8")
+                self.send_header("content-length", str(len(page["body"])))
+                self.end_headers()
+                self.wfile.write(page["body"])
+
+        return Handler
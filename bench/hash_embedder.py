@@ -0,0 +1,26 @@
+import zlib
+
+import numpy as np
+
+
+class HashEmbedder:
+    """
+    Embedder determinístico sem modelo (hashing de palavras), com a mesma interface de
+    `encode` do SentenceTransformer. Serve para medir a ingestão e o chat sem baixar
+    modelo nenhum; os números de embedding não representam o modelo real.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                h = zlib.crc32(word.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.clip(norms, 1e-12, None)
+        return vectors[0] if single else vectors
@@ -0,0 +1,114 @@
+"""
+Orçamento de tempo de import da API (o que o cold start paga antes de abrir a porta):
+
+    python -m bench.import_time --role chat --budget-ms 1500
+
+Importa `backend.app.main` num processo limpo com `-X importtime`, soma o tempo
+próprio por pacote e confere que nada pesado foi carregado no import (torch,
+chromadb, openai, tiktoken...) nem, no worker de chat, os módulos de ingestão
+(Drive, crawler, PDF). Sai com código 1 se estourar o orçamento ou vazar módulo.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from .common import REPO_ROOT
+
+# Carregados só no aquecimento (thread em background) ou no primeiro uso
+HEAVY_MODULES = (
+    "torch", "transformers", "sentence_transformers", "onnxruntime", "optimum",
+    "chromadb", "openai", "tiktoken",
+)
+# Só a ingestão usa; nunca podem entrar num worker de chat
+INGEST_MODULES = (
+    "googleapiclient", "google.oauth2", "bs4", "pypdf", "docx", "langchain_text_splitters",
+    "backend.app.drive_sync", "backend.app.ingest_pipeline", "backend.app.pdf_chunker", "backend.app.web_crawler",
+)
+
+# Só o que o import da API carrega (o que já estava em sys.modules antes não conta)
+PROBE = (
+    "import json, sys; before = set(sys.modules); import backend.app.main; "
+    "print(json.dumps(sorted(set(sys.modules) - before)))"
+)
+TARGET = "backend.app.main"
+
+
+def measure(role):
+    """(módulos carregados pela API, segundos do import, {pacote: segundos próprios})"""
+    env = {
+        **os.environ,
+        "BABIX_ROLE": role,
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])),
+    }
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-4000:])
+        raise RuntimeError(f"import de {TARGET} falhou")
+    modules = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    # "import time: self [us] | cumulative | imported package"; filhos vêm antes do pai, indentados
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, int(own), int(cumulative), name.strip()))
+
+    idx = next(i for i, e in enumerate(entries) if e[3] == TARGET)
+    depth, _, total_us, _ = entries[idx]
+    by_package = {}
+    i = idx
+    while i >= 0 and (i == idx or entries[i][0] > depth):
+        name = entries[i][3]
+        package = name if name.startswith("backend.") else name.split(".")[0]  # módulos da API um a um
+        by_package[package] = by_package.get(package, 0.0) + entries[i][1] / 1e6
+        i -= 1
+    return modules, total_us / 1e6, by_package
+
+
+def loaded(modules, prefixes):
+    return sorted({p for p in prefixes for m in modules if m == p or m.startswith(p + ".")})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo de import da API e módulos pesados carregados no import")
+    parser.add_argument("--role", choices=("all", "chat", "ingest"), default="chat", help="BABIX_ROLE do processo")
+    parser.add_argument("--budget-ms", type=float, default=None, help="falha se o import total passar disso")
+    parser.add_argument("--top", type=int, default=15, help="pacotes mais caros no relatório")
+    args = parser.parse_args(argv)
+
+    modules, total, by_package = measure(args.role)
+    forbidden = HEAVY_MODULES + (INGEST_MODULES if args.role == "chat" else ())
+    leaked = loaded(modules, forbidden)
+
+    report = {
+        "role": args.role,
+        "import_ms": round(total * 1000, 1),
+        "budget_ms": args.budget_ms,
+        "modules": len(modules),
+        "top": [
+            {"package": name, "ms": round(seconds * 1000, 1)}
+            for name, seconds in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:args.top]
+        ],
+        "leaked": leaked,
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    ok = True
+    if leaked:
+        print(f"❌ Carregados no import: {', '.join(leaked)}", file=sys.stderr)
+        ok = False
+    if args.budget_ms is not None and total * 1000 > args.budget_ms:
+        print(f"❌ Import levou {total * 1000:.0f}ms (orçamento: {args.budget_ms:.0f}ms)", file=sys.stderr)
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
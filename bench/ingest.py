@@ -0,0 +1,122 @@
+"""
+Fase de ingestão do benchmark (roda num processo próprio para medir a memória):
+gera o corpus, sincroniza contra o FakeDrive com `baixar_arquivos_drive` e imprime
+as métricas em JSON na última linha. Use via `python -m bench.run`.
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+
+from .common import percentiles, peak_rss_mb
+from .corpus import build_corpus
+from .fake_drive import FakeDrive, FOLDER_ID
+
+
+class ProgressRecorder:
+    """Faz o papel de jobs.Job para a sincronização: guarda o instante de cada arquivo concluído"""
+
+    def __init__(self):
+        self.cancel_event = threading.Event()
+        self.files_total = None
+        self.file_done_at = []
+        self.chunks_done = 0
+
+    def update(self, files_total=None, files_done=None, chunks_done=None):
+        if files_total is not None:
+            self.files_total = files_total
+        if files_done:
+            self.file_done_at.append(time.perf_counter())
+        if chunks_done:
+            self.chunks_done += chunks_done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdfs", type=int, default=20)
+    parser.add_argument("--docx", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--dup-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--embedder", choices=("hash", "model"), default="hash")
+    parser.add_argument("--drive-latency-ms", type=float, default=20.0)
+    parser.add_argument("--drive-bandwidth-mbps", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    files, _ = build_corpus(args.pdfs, args.docx, args.pages, dup_ratio=args.dup_ratio, seed=args.seed)
+    corpus_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    from backend.app import indexing
+    from backend.app.drive_sync import baixar_arquivos_drive
+    from backend.app.deps import get_embedder
+    import_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    if args.embedder == "hash":
+        from .hash_embedder import HashEmbedder
+        embedder = HashEmbedder()
+    else:
+        embedder = get_embedder()
+        embedder.encode(["aquecimento"])
+    embedder_load_seconds = time.perf_counter() - t0
+
+    # tempo de cada lote (embedding + upsert)
+    batch_seconds = []
+    flush = indexing.BatchIndexer.flush
+
+    def timed_flush(self):
+        pending = len(self._ids)
+        started = time.perf_counter()
+        flush(self)
+        if pending:
+            batch_seconds.append(time.perf_counter() - started)
+
+    indexing.BatchIndexer.flush = timed_flush
+
+    drive = FakeDrive(files, latency_ms=args.drive_latency_ms, bandwidth_mbps=args.drive_bandwidth_mbps)
+    progress = ProgressRecorder()
+    started = time.perf_counter()
+    stats = baixar_arquivos_drive(svc=drive, embedder=embedder, folder_id=FOLDER_ID, job=progress)
+    sync_seconds = time.perf_counter() - started
+
+    # intervalo entre arquivos concluídos (vazão vista pelo pipeline)
+    marks = [started] + progress.file_done_at
+    file_intervals = [b - a for a, b in zip(marks, marks[1:])]
+
+    # segunda passada: nada mudou, mede só listagem + diff do manifesto
+    started = time.perf_counter()
+    resync = baixar_arquivos_drive(svc=drive, embedder=embedder, folder_id=FOLDER_ID)
+    resync_seconds = time.perf_counter() - started
+
+    corpus_bytes = sum(len(data) for _, data in files)
+    result = {
+        "files": len(files),
+        "corpus_mb": round(corpus_bytes / (1024 * 1024), 2),
+        "corpus_build_seconds": round(corpus_seconds, 3),
+        "import_seconds": round(import_seconds, 3),
+        "embedder_load_seconds": round(embedder_load_seconds, 3),
+        "sync_seconds": round(sync_seconds, 3),
+        "chunks": stats["chunks"],
+        "duplicates": stats.get("duplicates", 0),
+        "chunks_per_sec": round(stats["chunks"] / sync_seconds, 2) if sync_seconds > 0 else 0.0,
+        "embed_seconds": stats.get("embed_seconds"),
+        "write_seconds": stats.get("write_seconds"),
+        "stages": {
+            "download_chunk": percentiles(drive.chunk_seconds),
+            "download_file": percentiles(drive.file_seconds),
+            "embed_write_batch": percentiles(batch_seconds),
+            "file_completion_interval": percentiles(file_intervals),
+        },
+        "resync_seconds": round(resync_seconds, 3),
+        "resync_files_changed": resync["files_changed"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Benchmark reprodutível da Babix, sem rede e sem chaves reais:
+
+  1. ingestão: corpus sintético (PDF/DOCX) sincronizado contra um Drive em memória;
+  2. serving: sobe a API (cold start até /api/ready) com a OpenAI trocada por um
+     servidor local e dispara /api/chat e /api/chat/stream com concorrência fixa.
+
+    python -m bench.run --out bench/results/$(git rev-parse --short HEAD).json
+
+Cada fase roda em processo próprio (memória medida separadamente). O resultado é
+um JSON para comparar commits.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+from .common import REPO_ROOT, percentiles, process_peak_rss_mb, git_commit
+from .corpus import build_corpus, sample_queries
+from .stub_openai import StubOpenAI
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_ingest(args, env):
+    cmd = [
+        sys.executable, "-m", "bench.ingest",
+        "--pdfs", str(args.pdfs), "--docx", str(args.docx), "--pages", str(args.pages),
+        "--dup-ratio", str(args.dup_ratio), "--seed", str(args.seed), "--embedder", args.embedder,
+        "--drive-latency-ms", str(args.drive_latency_ms),
+    ]
+    if args.drive_bandwidth_mbps:
+        cmd += ["--drive-bandwidth-mbps", str(args.drive_bandwidth_mbps)]
+    print("📦 Ingestão...", flush=True)
+    proc = subprocess.run(cmd, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stdout[-4000:] + proc.stderr[-4000:])
+        raise RuntimeError("fase de ingestão falhou")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def wait_for(url, timeout, proc):
+    """Segundos até `url` responder 200 (None se o processo morrer ou estourar o tempo)"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if proc.poll() is not None:
+            return None
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    return None
+
+
+async def load(base_url, path, queries, total, concurrency, stream):
+    """Dispara `total` perguntas com no máximo `concurrency` em voo; mede latência e TTFT"""
+    latencies, first_token, statuses = [], [], {}
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        async def one(i):
+            body = {"message": queries[i % len(queries)]}
+            async with sem:
+                started = time.perf_counter()
+                try:
+                    if not stream:
+                        response = await client.post(path, json=body)
+                        status = response.status_code
+                    else:
+                        ttft = None
+                        async with client.stream("POST", path, json=body) as response:
+                            status = response.status_code
+                            async for line in response.aiter_lines():
+                                if ttft is None and line.startswith("event: token"):
+                                    ttft = time.perf_counter() - started
+                                elif line.startswith("event: error"):
+                                    status = "sse_error"
+                        if ttft is not None:
+                            first_token.append(ttft)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    result = {
+        "requests": total,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+        "status": statuses,
+        "latency": percentiles(latencies),
+    }
+    if stream:
+        result["time_to_first_token"] = percentiles(first_token)
+    return result
+
+
+def run_serving(args, env, queries):
+    stub = StubOpenAI(args.llm_latency_ms, args.llm_tokens, args.llm_token_interval_ms)
+    env = {**env, "OPENAI_API_KEY": "bench-key", "OPENAI_BASE_URL": stub.start()}
+    if args.no_answer_cache:
+        # toda pergunta vai ao LLM (mede o caminho completo, não o cache)
+        env["ANSWER_CACHE_SIZE"] = "0"
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    print("🚀 Subindo a API...", flush=True)
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "bench.serve", "--port", str(port), "--embedder", args.embedder],
+        cwd=REPO_ROOT, env=env,
+    )
+    try:
+        listening = wait_for(f"{base_url}/api/health", args.startup_timeout, proc)
+        ready = wait_for(f"{base_url}/api/ready", args.startup_timeout - (time.perf_counter() - started), proc)
+        if listening is None or ready is None:
+            raise RuntimeError("a API não ficou pronta")
+        result = {
+            "listening_seconds": round(listening, 3),
+            "cold_start_seconds": round(time.perf_counter() - started, 3),
+        }
+        rss_after_start = process_peak_rss_mb(proc.pid)
+
+        for name, path, stream in (("chat", "/api/chat", False), ("stream", "/api/chat/stream", True)):
+            if args.mode in (name, "both"):
+                print(f"💬 Carga em {path}...", flush=True)
+                result[name] = asyncio.run(load(base_url, path, queries, args.requests, args.concurrency, stream))
+
+        for name in ("cache", "embeddings"):
+            try:
+                result[f"debug_{name}"] = httpx.get(f"{base_url}/api/debug/{name}", timeout=5.0).json()
+            except (httpx.HTTPError, ValueError):
+                pass
+        result["llm_requests"] = stub.requests
+        result["peak_rss_mb"] = {"after_start": rss_after_start, "end": process_peak_rss_mb(proc.pid)}
+        return result
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        stub.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de ingestão e chat com Drive/OpenAI locais")
+    parser.add_argument("--pdfs", type=int, default=20, help="PDFs no corpus")
+    parser.add_argument("--docx", type=int, default=5, help="DOCX no corpus")
+    parser.add_argument("--pages", type=int, default=20, help="páginas por PDF")
+    parser.add_argument("--dup-ratio", type=float, default=0.2, help="fração de PDFs duplicados")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--embedder", choices=("hash", "model"), default="hash",
+                        help="hash: sem modelo (offline); model: EMBEDDING_MODEL/EMBEDDING_BACKEND do ambiente")
+    parser.add_argument("--drive-latency-ms", type=float, default=20.0, help="RTT simulado por bloco baixado")
+    parser.add_argument("--drive-bandwidth-mbps", type=float, default=None)
+    parser.add_argument("--mode", choices=("chat", "stream", "both", "none"), default="both")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--distinct-queries", type=int, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0, help="espera do stub até o 1º token")
+    parser.add_argument("--llm-tokens", type=int, default=60)
+    parser.add_argument("--llm-token-interval-ms", type=float, default=10.0)
+    parser.add_argument("--no-answer-cache", action="store_true", help="desliga o cache de respostas na API")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--skip-ingest", action="store_true", help="só serving, contra um índice vazio")
+    parser.add_argument("--keep", action="store_true", help="mantém o diretório de trabalho")
+    parser.add_argument("--out", default=None, help="arquivo JSON de saída (padrão: só imprime)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="babix_bench_")
+    env = {
+        **os.environ,
+        "CHROMA_DIR": os.path.join(workdir, "chroma"),
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])),
+    }
+    # caminhos derivados de CHROMA_DIR não podem vir de um .env do ambiente
+    for key in ("DRIVE_MANIFEST", "CODE_INDEX_PATH", "CRAWL_STATE_PATH", "DEDUP_PATH", "OPENAI_API_KEY"):
+        env.pop(key, None)
+
+    _, vocab = build_corpus(args.pdfs, args.docx, args.pages, dup_ratio=args.dup_ratio, seed=args.seed)
+    queries = sample_queries(vocab, args.distinct_queries)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "keep")},
+        "env": {k: os.environ.get(k) for k in (
+            "EMBEDDING_MODEL", "EMBEDDING_BACKEND", "PARSE_WORKERS", "DOWNLOAD_WORKERS",
+            "EMBED_BATCH_SIZE", "UPSERT_BATCH_SIZE", "LLM_MAX_CONCURRENCY", "ANSWER_CACHE_SIZE",
+        ) if os.environ.get(k)},
+    }
+    try:
+        if not args.skip_ingest:
+            report["ingest"] = run_ingest(args, env)
+        if args.mode != "none":
+            report["serving"] = run_serving(args, env, queries)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(output + "\n")
+        print(f"📝 Resultado salvo em {args.out}")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+"""
+Sobe a API para o benchmark (um worker uvicorn), opcionalmente com o HashEmbedder
+no lugar do modelo. Use via `python -m bench.run`.
+"""
+import sys
+import argparse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--embedder", choices=("hash", "model"), default="hash")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    from backend.app import deps
+
+    if args.embedder == "hash":
+        from .hash_embedder import HashEmbedder
+        deps._embedder = HashEmbedder()
+
+    from backend.app.main import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
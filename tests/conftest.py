@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+# O backend lê CHROMA_DIR (e os caminhos derivados) no import: diretório descartável
+# antes de importar qualquer módulo do app, para os testes nunca tocarem em ./dados
+os.environ["CHROMA_DIR"] = tempfile.mkdtemp(prefix="babix_tests_")
+os.environ["PARSE_WORKERS"] = "0"
+os.environ["SNAPSHOT_SERVING"] = "0"
+
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def embedder():
+    """Embedder por hashing (bench/): sem baixar modelo"""
+    from backend.app import deps
+    from bench.hash_embedder import HashEmbedder
+    deps._embedder = HashEmbedder()
+    return deps._embedder
+
+
+@pytest.fixture
+def generation():
+    """Geração própria do índice (coleção e arquivos auxiliares), apagada no fim do teste"""
+    from backend.app.generations import generations, open_generation, _drop
+    name = generations.begin()
+    yield open_generation(name)
+    _drop(name)
@@ -0,0 +1,94 @@
+import pytest
+
+from backend.app.drive_manifest import SyncManifest
+from backend.app.drive_sync import MANIFEST_PATH, baixar_arquivos_drive
+from bench.corpus import PDF_MIME, build_corpus, make_pdf
+from bench.fake_drive import FOLDER_ID, FakeDrive
+
+
+@pytest.fixture
+def drive():
+    """
+    raiz: 2 PDFs + sub/ (página de 2 itens: a raiz vem em 2 páginas)
+    sub/: 1 DOCX + 1 arquivo não suportado + subsub/
+    subsub/: 1 PDF
+    """
+    files, _ = build_corpus(pdfs=3, docx_files=1, pages=2, dup_ratio=0, seed=3)
+    pdfs, docx = files[:3], files[3]
+    drive = FakeDrive(pdfs[:2], page_size=2)
+    drive.add_folder("sub")
+    drive.add_folder("subsub", parent="sub")
+    drive.put_file(*docx, parent="sub")
+    drive.put_file({"id": "notas", "name": "notas.txt", "mimeType": "text/plain"}, b"x", parent="sub")
+    drive.put_file(*pdfs[2], parent="subsub")
+    return drive
+
+
+def sync(drive, generation, **kwargs):
+    stats = baixar_arquivos_drive(svc=drive, folder_id=FOLDER_ID, generation=generation, **kwargs)
+    return stats, SyncManifest(generation.sidecar(MANIFEST_PATH))
+
+
+def assert_index_matches(generation, manifest):
+    """Os chunks do índice são exatamente os registrados no manifesto"""
+    ids = {cid for file_id in manifest.files for cid in manifest.chunk_ids(file_id)}
+    assert ids
+    assert generation.store.count() == len(ids)
+    assert len(generation.store.get(ids=sorted(ids), include=())["ids"]) == len(ids)
+
+
+def test_first_sync_walks_subfolders_and_pages(drive, generation):
+    stats, manifest = sync(drive, generation)
+
+    assert stats["files_listed"] == 5
+    assert stats["files_changed"] == 4
+    assert set(manifest.files) == {"bench-pdf-0000", "bench-pdf-0001", "bench-pdf-0002", "bench-docx-0000"}
+    # raiz em duas páginas e as duas subpastas
+    assert {parent for parent, _ in drive.listings} == {FOLDER_ID, "sub", "subsub"}
+    assert (FOLDER_ID, "2") in drive.listings
+    assert_index_matches(generation, manifest)
+
+
+def test_resync_handles_new_changed_unchanged_and_removed(drive, generation):
+    sync(drive, generation)
+    stats, _ = sync(drive, generation)
+    assert stats["files_changed"] == 0 and stats["files_unchanged"] == 4 and stats["files_removed"] == 0
+    assert stats["chunks"] == 0
+
+    changed, _ = build_corpus(pdfs=1, docx_files=0, pages=1, dup_ratio=0, seed=11)
+    drive.put_file({"id": "bench-pdf-0001", "name": "lei_0001.pdf", "mimeType": PDF_MIME,
+                    "modifiedTime": "2024-02-01T00:00:00.000Z"}, changed[0][1])
+    drive.put_file({"id": "novo", "name": "novo.pdf", "mimeType": PDF_MIME,
+                    "modifiedTime": "2024-02-01T00:00:00.000Z"},
+                   make_pdf(["Resolução nova sobre placas de identificação veicular e lacres de segurança."]),
+                   parent="subsub")
+    removed = SyncManifest(generation.sidecar(MANIFEST_PATH)).chunk_ids("bench-pdf-0002")
+    drive.remove_file("bench-pdf-0002")
+
+    stats, manifest = sync(drive, generation)
+    assert stats["files_changed"] == 2
+    assert stats["files_unchanged"] == 2
+    assert stats["files_removed"] == 1
+    assert set(manifest.files) == {"bench-pdf-0000", "bench-pdf-0001", "bench-docx-0000", "novo"}
+    assert manifest.files["bench-pdf-0001"]["modifiedTime"] == "2024-02-01T00:00:00.000Z"
+    assert generation.store.get(ids=removed, include=())["ids"] == []
+    assert_index_matches(generation, manifest)
+
+
+def test_empty_listing_keeps_the_index_unless_allowed(drive, generation):
+    _, manifest = sync(drive, generation)
+    count = generation.store.count()
+    for file_id in ("bench-pdf-0000", "bench-pdf-0001", "bench-pdf-0002", "bench-docx-0000", "notas"):
+        drive.remove_file(file_id)
+
+    stats, after = sync(drive, generation)
+    assert stats["files_listed"] == 0
+    assert stats["files_removed"] == 0
+    assert stats["removals_skipped"] == 4
+    assert set(after.files) == set(manifest.files)
+    assert generation.store.count() == count
+
+    stats, after = sync(drive, generation, allow_empty=True)
+    assert stats["files_removed"] == 4
+    assert after.files == {}
+    assert generation.store.count() == 0
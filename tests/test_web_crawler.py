@@ -0,0 +1,103 @@
+import asyncio
+import random
+
+import pytest
+
+from backend.app.pdf_chunker import make_splitter
+from backend.app.web_crawler import CRAWL_STATE_PATH, CrawlState, crawl_and_index, extract_text_and_links
+from bench.fake_site import FakeSite
+
+_WORDS = [
+    "condutor", "veículo", "sinalização", "fiscalização", "habilitação", "pedestre", "rodovia", "penalidade",
+    "notificação", "recurso", "velocidade", "estacionamento", "semáforo", "faixa", "retenção", "remoção",
+]
+
+
+def page(title, links=(), words=400):
+    """HTML com texto próprio da página (sem quase-duplicatas entre páginas) e links"""
+    rng = random.Random(title)
+    text = " ".join(f"{rng.choice(_WORDS)}{rng.randrange(10_000)}" for _ in range(words))
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return f"<html><head><title>{title}</title></head><body><h1>{title}</h1><p>{text}</p>{anchors}</body></html>"
+
+
+@pytest.fixture
+def site():
+    """/ → /a, /b e /fora (outro host); /a → /c"""
+    site = FakeSite()
+    site.start()
+    site.set_page("/", page("inicio", ["/a", "/b", f"http://localhost:{site.port}/fora"]))
+    site.set_page("/a", page("a", ["/c"]))
+    site.set_page("/b", page("b"))
+    site.set_page("/c", page("c"))
+    site.set_page("/fora", page("fora"))
+    yield site
+    site.stop()
+
+
+def crawl(site, generation, depth, **kwargs):
+    state = CrawlState(generation.sidecar(CRAWL_STATE_PATH))
+    stats = asyncio.run(crawl_and_index([site.url("/")], depth, state=state, generation=generation, **kwargs))
+    return stats, state
+
+
+def expected_chunks(site, paths):
+    splitter = make_splitter(1000, 200)
+    total = 0
+    for path in paths:
+        text, _ = extract_text_and_links(site.body(path), site.url(path))
+        total += len([c for c in splitter.split_text(text) if c.strip()])
+    return total
+
+
+def test_depth_and_allowlist_limit_the_crawl(site, generation):
+    stats, _ = crawl(site, generation, depth=1)
+
+    # /c está a dois níveis e /fora em outro host (fora dos domínios das seeds)
+    assert sorted(site.requested()) == ["/", "/a", "/b"]
+    assert stats["visited"] == 3
+    assert stats["pages_indexed"] == 3
+
+
+def test_allowed_domains_and_max_pages(site, generation):
+    stats, _ = crawl(site, generation, depth=1, allowed_domains=["127.0.0.1", "localhost"])
+    assert "/fora" in site.requested()
+    assert stats["visited"] == 4
+
+    site.reset_hits()
+    stats, _ = crawl(site, generation, depth=2, max_pages=2)
+    assert stats["visited"] == 2
+    assert len(site.requested()) == 2
+
+
+def test_chunk_count(site, generation):
+    stats, state = crawl(site, generation, depth=2)
+
+    expected = expected_chunks(site, ["/", "/a", "/b", "/c"])
+    assert expected > 4  # páginas maiores que um chunk
+    assert stats["chunks"] == expected
+    assert generation.store.count() == expected
+    assert sum(len(state.pages[site.url(p)]["chunk_ids"]) for p in ("/", "/a", "/b", "/c")) == expected
+
+
+def test_recrawl_gets_304_and_reindexes_only_changed_pages(site, generation):
+    crawl(site, generation, depth=2)
+    count = generation.store.count()
+
+    site.reset_hits()
+    stats, _ = crawl(site, generation, depth=2)
+    # links guardados no estado: o crawl segue até /c mesmo só com 304
+    assert sorted(site.requested(304)) == ["/", "/a", "/b", "/c"]
+    assert site.requested(200) == []
+    assert stats["not_modified"] == 4
+    assert stats["pages_indexed"] == 0 and stats["chunks"] == 0
+    assert generation.store.count() == count
+
+    site.set_page("/b", page("b-revisada", words=200))
+    site.reset_hits()
+    stats, state = crawl(site, generation, depth=2)
+    assert site.requested(200) == ["/b"]
+    assert stats["pages_indexed"] == 1
+    # chunks antigos de /b saem do índice
+    assert generation.store.count() == expected_chunks(site, ["/", "/a", "/b", "/c"])
+    assert len(state.pages[site.url("/b")]["chunk_ids"]) == expected_chunks(site, ["/b"])